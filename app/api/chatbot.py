@@ -1,13 +1,52 @@
-from fastapi import APIRouter, HTTPException
-from app.models.chatbot import ChatRequest, ChatResponse, Message
+from fastapi import APIRouter, HTTPException, Query
+from app.services.fast_json import FastJSONResponse
+from app.models.chatbot import ChatRequest, ChatResponse, Message, RetrievalBatchRequest, RetrievalBatchResponse, RetrievalBatchItem, RetrievedEntry
 from app.services.chatbot_service import chatbot_service
+from app.services.agriculture_kb import RETRIEVAL_MODES
+from app.services.conversation_store import create_conversation_store_from_env
+from app.services.metrics import metrics, stage_timer
 from datetime import datetime
+from typing import Optional
+import os
+import time
 import uuid
 
 router = APIRouter(prefix="/api/chatbot", tags=["chatbot"])
 
-# Store conversations (in production, use database)
-conversations = {}
+# Bounded per-user conversation history
+conversations = create_conversation_store_from_env()
+
+def _cache_lookup_samples():
+    cache = chatbot_service.response_cache
+    if cache is not None:
+        yield ("hit",), cache.hits
+        yield ("miss",), cache.misses
+
+def _conversation_cache_samples():
+    # Only the SQLite store has a read cache
+    if hasattr(conversations, "cache_hits"):
+        yield ("hit",), conversations.cache_hits
+        yield ("miss",), conversations.cache_misses
+
+# Read from the existing counters when /metrics is scraped; nothing is added to the request path
+metrics.callback(
+    "agriconnect_chatbot_cache_lookups_total", "Chatbot answer cache lookups by result",
+    _cache_lookup_samples, kind="counter", labelnames=["result"]
+)
+metrics.callback(
+    "agriconnect_conversation_cache_lookups_total", "Conversation history cache lookups by result",
+    _conversation_cache_samples, kind="counter", labelnames=["result"]
+)
+metrics.callback(
+    "agriconnect_conversation_write_queue_depth", "Conversation turns waiting for the background writer",
+    lambda: [((), getattr(conversations, "pending_turns", 0))]
+)
+
+# The chatbot only looks at the most recent turns for context
+CONTEXT_TURNS = 5
+
+# Upper bound on queries per batch retrieval request
+RETRIEVE_BATCH_MAX_QUERIES = int(os.getenv("KB_BATCH_MAX_QUERIES", "10000"))
 
 @router.post("/message", response_model=ChatResponse)
 async def send_message(chat_request: ChatRequest):
@@ -19,7 +58,7 @@ async def send_message(chat_request: ChatRequest):
     try:
         # Get conversation history
         user_id = chat_request.user_id or "default"
-        history = conversations.get(user_id, [])
+        history = conversations.get(user_id, limit=CONTEXT_TURNS)
         
         # Get chatbot response
         result = chatbot_service.get_response(
@@ -39,13 +78,15 @@ async def send_message(chat_request: ChatRequest):
         )
         
         # Store conversation
-        conversations[user_id] = history + [{
+        conversations.append(user_id, {
             "user_message": chat_request.message,
             "bot_response": result["bot_response"],
             "timestamp": datetime.now().isoformat()
-        }]
+        })
         
-        return response
+        # Serialized here in one pydantic pass (same body as response_model) so the stage timer can see it
+        with stage_timer("serialize"):
+            return FastJSONResponse(response.model_dump_json().encode())
         
     except Exception as e:
         raise HTTPException(
@@ -54,23 +95,34 @@ async def send_message(chat_request: ChatRequest):
         )
 
 @router.get("/conversation/{user_id}")
-async def get_conversation(user_id: str):
-    """Get conversation history for a user"""
+async def get_conversation(
+    user_id: str,
+    cursor: Optional[int] = Query(None, description="Return messages after this cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit for the full history")
+):
+    """Get conversation history for a user, optionally paginated with a cursor"""
     
-    history = conversations.get(user_id, [])
+    if limit is None and cursor is None:
+        history = conversations.get(user_id)
+        return {
+            "user_id": user_id,
+            "message_count": len(history),
+            "messages": history
+        }
     
+    messages, next_cursor = conversations.page(user_id, cursor=cursor, limit=limit or 50)
     return {
         "user_id": user_id,
-        "message_count": len(history),
-        "messages": history
+        "message_count": conversations.count(user_id),
+        "messages": messages,
+        "next_cursor": next_cursor
     }
 
 @router.delete("/conversation/{user_id}")
 async def clear_conversation(user_id: str):
     """Clear conversation history"""
     
-    if user_id in conversations:
-        del conversations[user_id]
+    if conversations.clear(user_id):
         return {"message": "Conversation cleared", "user_id": user_id}
     
     raise HTTPException(status_code=404, detail="Conversation not found")
@@ -87,6 +139,61 @@ async def health_check():
         "openai_enabled": chatbot_service.use_openai
     }
 
+@router.get("/conversations/stats")
+async def get_conversation_stats():
+    """Get users, turns and bytes held by the conversation store"""
+    return conversations.stats()
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get answer cache hit ratio and latency saved"""
+    if chatbot_service.response_cache is None:
+        return {"enabled": False}
+    
+    return {"enabled": True, **chatbot_service.response_cache.stats()}
+
+@router.delete("/cache")
+async def clear_cache():
+    """Clear all cached chatbot answers"""
+    if chatbot_service.response_cache is None:
+        raise HTTPException(status_code=404, detail="Response cache is disabled")
+    
+    chatbot_service.response_cache.clear()
+    return {"message": "Response cache cleared"}
+
+# Plain def: scoring is CPU-bound, so FastAPI runs it in the threadpool instead of on the event loop
+@router.post("/retrieve/batch", response_model=RetrievalBatchResponse)
+def retrieve_batch(batch_request: RetrievalBatchRequest):
+    """Rank knowledge-base entries for many queries in one call (no answer generation)"""
+    
+    kb = chatbot_service.agriculture_kb
+    mode = (batch_request.mode or kb.retrieval_mode).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode: {mode}. Must be one of: {', '.join(RETRIEVAL_MODES)}")
+    if len(batch_request.queries) > RETRIEVE_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {RETRIEVE_BATCH_MAX_QUERIES} queries per batch")
+    
+    started = time.perf_counter()
+    with stage_timer("kb_retrieval_batch"):
+        results = kb.retrieve_batch(batch_request.queries, batch_request.k, mode)
+    items = [
+        RetrievalBatchItem(
+            query=result.query,
+            entries=[
+                RetrievedEntry(id=entry_id, score=round(score, 4), text=rendered if batch_request.include_text else None)
+                for entry_id, rendered, score in result.entries
+            ]
+        )
+        for result in results
+    ]
+    # The models were validated as they were built; encode them without FastAPI validating them again
+    return FastJSONResponse(RetrievalBatchResponse(
+        mode=mode,
+        count=len(items),
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+        results=items
+    ).model_dump_json().encode())
+
 @router.get("/topics")
 async def get_topics():
     """Get available agriculture topics the chatbot handles"""
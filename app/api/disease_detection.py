@@ -1,19 +1,32 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
-from transformers import pipeline
-from PIL import Image
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import List
+from app.services.detection_jobs import create_detection_jobs_from_env
+from app.services.disease_advice import DiseaseAdviceIndex
+from app.services.fast_json import FastJSONResponse
+from app.services.metrics import metrics, stage_timer
+from app.services.startup import startup_report
+from PIL import Image, UnidentifiedImageError
+import asyncio
 import io
 import os
+import threading
 
 router = APIRouter(prefix="/api/disease-detection", tags=["disease-detection"])
 
+# Local model directory (benchmarks/stub_models.py builds a tiny stand-in for load tests)
+MODEL_PATH = os.getenv("DISEASE_MODEL_PATH", "./disease-detection-model")
+
 # Load model once on startup
 print("🔄 Loading disease detection model...")
 try:
-    classifier = pipeline(
-        "image-classification",
-        model="./disease-detection-model"
-    )
+    with startup_report.phase("import transformers"):
+        from transformers import pipeline
+    with startup_report.phase(f"load {os.path.basename(os.path.normpath(MODEL_PATH))}", kind="model_load"):
+        classifier = pipeline(
+            "image-classification",
+            model=MODEL_PATH
+        )
     print("✅ Disease detection model loaded!")
 except Exception as e:
     print(f"❌ Error loading model: {e}")
@@ -31,8 +44,97 @@ LABEL_MAP = {
     "LABEL_7": "Corn_(maize)___Cercospora_leaf_spot_Gray_leaf_spot"
 }
 
+def _model_labels() -> list:
+    """Disease names the classifier can return: LABEL_MAP plus the model's own id2label"""
+    names = list(LABEL_MAP.values())
+    if classifier is not None:
+        names += [LABEL_MAP.get(label, label) for label in classifier.model.config.id2label.values()]
+    return names
+
+# Treatment advice per disease name, joined from the knowledge base on first use (see disease_advice.py),
+# so disease-only deployments never load the knowledge base or start its watcher
+_advice_index = None
+_advice_lock = threading.Lock()
+
+def get_advice_index() -> DiseaseAdviceIndex:
+    global _advice_index
+    if _advice_index is None:
+        with _advice_lock:
+            if _advice_index is None:
+                from app.services.agriculture_kb import agriculture_kb
+                index = DiseaseAdviceIndex(agriculture_kb, _model_labels())
+                stats = index.stats()
+                print(f"✅ Disease advice index: {stats['with_advice']}/{stats['labels']} labels matched in the knowledge base")
+                _advice_index = index
+    return _advice_index
+
+def _with_advice(prediction: dict) -> dict:
+    """Prediction with the knowledge-base advice for its top disease inlined"""
+    return {**prediction, "advice": get_advice_index().get(prediction["disease"])}
+
+ALLOWED_CONTENT_TYPES = ["image/jpeg", "image/png", "image/jpg"]
+
+# Upper bound on images in one job
+MAX_JOB_IMAGES = int(os.getenv("DETECTION_JOB_MAX_IMAGES", "32"))
+
+# Longest GET /jobs/{job_id}?wait= long-poll, in seconds
+MAX_JOB_WAIT_SECONDS = 30
+
+def _predict(contents: bytes) -> dict:
+    """Classify one image; raises ValueError if it cannot be decoded"""
+    with stage_timer("image_decode"):
+        try:
+            image = Image.open(io.BytesIO(contents))
+            # Decode now so the pixel work is timed here rather than inside the classifier
+            image.load()
+        except (UnidentifiedImageError, OSError) as e:
+            raise ValueError(f"Cannot decode image: {e}")
+        
+        # Convert to RGB if needed
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    
+    # Run inference
+    with stage_timer("classifier_forward"):
+        results = classifier(image)
+    
+    # Format response
+    predicted_label = results[0]['label']
+    return {
+        "success": True,
+        "disease": LABEL_MAP.get(predicted_label, predicted_label),
+        "label": predicted_label,
+        "confidence": round(results[0]['score'] * 100, 2),
+        "all_predictions": [
+            {
+                "disease": LABEL_MAP.get(r['label'], r['label']),
+                "label": r['label'],
+                "confidence": round(r['score'] * 100, 2)
+            }
+            for r in results
+        ]
+    }
+
+# Background detection jobs: images are stored in SQLite and classified by local worker threads
+detection_jobs = create_detection_jobs_from_env(_predict)
+if classifier is not None:
+    detection_jobs.start()
+
+metrics.callback(
+    "agriconnect_detection_job_queue_depth", "Images waiting for a detection worker",
+    lambda: [((), detection_jobs.queue_depth())]
+)
+metrics.callback(
+    "agriconnect_detection_job_images_total", "Images finished by this process's detection workers",
+    lambda: [(("done",), detection_jobs.processed), (("failed",), detection_jobs.failed), (("retried",), detection_jobs.retried)],
+    kind="counter", labelnames=["outcome"]
+)
+
 @router.post("/upload")
-async def detect_disease_upload(file: UploadFile = File(...)):
+async def detect_disease_upload(
+    file: UploadFile = File(...),
+    include_advice: bool = Query(False, description="Inline treatment advice from the knowledge base")
+):
     """
     Upload image and detect plant disease
     
@@ -40,6 +142,7 @@ async def detect_disease_upload(file: UploadFile = File(...)):
         - disease: Name of detected disease
         - confidence: Confidence percentage
         - all_predictions: Top 3 predictions
+        - advice: Crop info and matching treatments (only with include_advice)
     """
     try:
         if classifier is None:
@@ -49,7 +152,7 @@ async def detect_disease_upload(file: UploadFile = File(...)):
             )
         
         # Validate file type
-        if file.content_type not in ["image/jpeg", "image/png", "image/jpg"]:
+        if file.content_type not in ALLOWED_CONTENT_TYPES:
             raise HTTPException(
                 status_code=400, 
                 detail="File must be JPEG or PNG image"
@@ -57,33 +160,13 @@ async def detect_disease_upload(file: UploadFile = File(...)):
         
         # Read image file
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Run inference
-        results = classifier(image)
+        prediction = _predict(contents)
+        if include_advice:
+            # The first request loads the knowledge base: keep that off the event loop
+            prediction = await run_in_threadpool(_with_advice, prediction)
         
-        # Format response
-        predicted_label = results[0]['label']
-        disease_name = LABEL_MAP.get(predicted_label, predicted_label)
-        
-        return JSONResponse({
-            "success": True,
-            "disease": disease_name,
-            "label": predicted_label,
-            "confidence": round(results[0]['score'] * 100, 2),
-            "all_predictions": [
-                {
-                    "disease": LABEL_MAP.get(r['label'], r['label']),
-                    "label": r['label'],
-                    "confidence": round(r['score'] * 100, 2)
-                }
-                for r in results
-            ]
-        })
+        with stage_timer("serialize"):
+            return FastJSONResponse(prediction)
         
     except HTTPException:
         raise
@@ -105,4 +188,74 @@ async def health_check():
 @router.get("/labels")
 async def get_labels():
     """Get all disease labels"""
-    return {"labels": LABEL_MAP}
\ No newline at end of file
+    return {"labels": LABEL_MAP}
+
+@router.get("/advice/{disease}")
+def get_disease_advice(disease: str):
+    """Knowledge-base crop info and treatments for a disease name (e.g. Tomato___Early_blight)"""
+    return FastJSONResponse({"disease": disease, **get_advice_index().get(disease)})
+
+@router.post("/jobs", status_code=202)
+async def submit_detection_job(
+    files: List[UploadFile] = File(...),
+    priority: int = Query(0, ge=-100, le=100, description="Higher runs first")
+):
+    """
+    Queue one or more images for detection and return the job id at once
+    
+    Poll GET /jobs/{job_id} (optionally with ?wait=) for the results.
+    """
+    if not files or len(files) > MAX_JOB_IMAGES:
+        raise HTTPException(status_code=400, detail=f"A job takes 1 to {MAX_JOB_IMAGES} images")
+    for file in files:
+        if file.content_type not in ALLOWED_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail=f"{file.filename}: file must be JPEG or PNG image")
+    images = [(file.filename, await file.read()) for file in files]
+    # The job store is blocking SQLite: keep it off the event loop
+    job = await run_in_threadpool(detection_jobs.submit, images, priority=priority)
+    if classifier is None:
+        job["warning"] = "Model not loaded: the job will run once the server restarts with a model"
+    return job
+
+@router.get("/jobs/stats")
+def detection_job_stats():
+    """Job and image counts by status, and this process's worker counters"""
+    return detection_jobs.stats()
+
+@router.get("/jobs/{job_id}")
+async def get_detection_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=MAX_JOB_WAIT_SECONDS, description="Seconds to wait for the job to finish"),
+    include_advice: bool = Query(False, description="Inline treatment advice for each finished image")
+):
+    """Job status and per-image results; with wait, returns as soon as the job finishes or the time is up"""
+    job = await run_in_threadpool(detection_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    deadline = asyncio.get_running_loop().time() + wait
+    version = detection_jobs.job_version(job_id)
+    recheck = 0.0
+    while job["status"] in ("queued", "running") and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.05)
+        recheck += 0.05
+        # Local workers bump the in-memory version (no database read); images finished
+        # by other processes show up on the periodic re-read
+        if detection_jobs.job_version(job_id) != version or recheck >= 1.0:
+            version = detection_jobs.job_version(job_id)
+            recheck = 0.0
+            job = await run_in_threadpool(detection_jobs.get, job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail="Job not found")
+    if include_advice:
+        await run_in_threadpool(get_advice_index)
+        for item in job["results"]:
+            if item["result"] is not None:
+                item["result"] = _with_advice(item["result"])
+    return FastJSONResponse(job)
+
+@router.delete("/jobs/{job_id}")
+def cancel_detection_job(job_id: str):
+    """Cancel the images of a job that have not started yet"""
+    if not detection_jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return detection_jobs.get(job_id)
@@ -1,155 +1,366 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from typing import List
-import uuid
+from typing import List, Optional
+import hashlib
 from app.models.fertilizer import (
     FertilizerSchedule, 
     FertilizerScheduleCreate, 
     FertilizerScheduleUpdate
 )
+from app.services.schedule_store import COLUMNS, ChangesExpired, create_schedule_store_from_env, new_schedule, VALID_STATUSES
+from app.services.schedule_engine import create_due_engine_from_env
+from app.services.schedule_dosage import AGGREGATE_DIMENSIONS
+from app.services.metrics import metrics
+from app.services.fast_json import FastJSONResponse, create_body_cache_from_env, dumps
+from app.services.schedule_bulk import (
+    FORMATS as BULK_FORMATS,
+    MEDIA_TYPES as BULK_MEDIA_TYPES,
+    detect_format,
+    export_schedules as bulk_export_schedules,
+    import_schedules as bulk_import_schedules
+)
 
 router = APIRouter(prefix="/api/fertilizer", tags=["fertilizer"])
 
-# In-memory database (replace with real database later)
-fertilizer_db = {
-    "1": {
-        "id": "1",
-        "fertilizer_type": "NPK 10:26:26",
-        "amount": "50kg/acre",
-        "target_field": "Field A - Wheat",
-        "scheduled_date": datetime(2025, 12, 3, 6, 0),
-        "status": "PENDING",
-        "created_at": datetime.now(),
-        "updated_at": datetime.now()
-    },
-    "2": {
-        "id": "2",
-        "fertilizer_type": "Urea",
-        "amount": "30kg/acre",
-        "target_field": "Field B - Tomatoes",
-        "scheduled_date": datetime(2025, 12, 10, 7, 0),
-        "status": "SCHEDULED",
-        "created_at": datetime.now(),
-        "updated_at": datetime.now()
-    },
-    "3": {
-        "id": "3",
-        "fertilizer_type": "Organic Compost",
-        "amount": "100kg/acre",
-        "target_field": "Field C - Rice",
-        "scheduled_date": datetime(2026, 1, 3, 6, 30),
-        "status": "SCHEDULED",
-        "created_at": datetime.now(),
-        "updated_at": datetime.now()
-    }
-}
+# Indexed in-memory store, or SQLite shared by all workers (FERTILIZER_STORE_BACKEND=sqlite).
+# Store calls can block on SQLite, so every route here is a plain def run in the threadpool.
+fertilizer_db = create_schedule_store_from_env()
+
+# Routes return stored schedules through FastJSONResponse without re-validating them,
+# which is only sound while the store keeps exactly the response model's fields
+if tuple(FertilizerSchedule.model_fields) != COLUMNS:
+    raise RuntimeError("FertilizerSchedule fields and schedule store COLUMNS are out of sync")
+
+# Encoded GET /schedules bodies for the current store version
+list_body_cache = create_body_cache_from_env("FERTILIZER")
+
+# Upper bound on one page of GET /schedules
+MAX_PAGE_SIZE = 1000
+
+# Upper bound on one page of GET /schedules/changes
+MAX_CHANGES_PAGE_SIZE = 5000
+
+def _seed_schedules():
+    """Demo schedules for an empty store"""
+    if len(fertilizer_db):
+        return
+    for schedule_id, fertilizer_type, amount, target_field, scheduled_date, status in [
+        ("1", "NPK 10:26:26", "50kg/acre", "Field A - Wheat", datetime(2025, 12, 3, 6, 0), "PENDING"),
+        ("2", "Urea", "30kg/acre", "Field B - Tomatoes", datetime(2025, 12, 10, 7, 0), "SCHEDULED"),
+        ("3", "Organic Compost", "100kg/acre", "Field C - Rice", datetime(2026, 1, 3, 6, 30), "SCHEDULED")
+    ]:
+        fertilizer_db.create({
+            "id": schedule_id,
+            "fertilizer_type": fertilizer_type,
+            "amount": amount,
+            "target_field": target_field,
+            "scheduled_date": scheduled_date,
+            "status": status,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now()
+        })
+
+_seed_schedules()
+
+# Moves SCHEDULED entries to PENDING when their date passes (FERTILIZER_DUE_ENGINE=false disables)
+due_engine = create_due_engine_from_env(fertilizer_db)
+if due_engine is not None:
+    due_engine.load()
+    due_engine.start()
+
+metrics.callback(
+    "agriconnect_fertilizer_due_queue_depth", "Schedules waiting in the due-schedule heap",
+    lambda: [((), due_engine.stats()["tracked"])] if due_engine is not None else []
+)
+metrics.callback(
+    "agriconnect_fertilizer_list_body_cache_total", "GET /schedules body cache lookups",
+    lambda: [(("hit",), list_body_cache.hits), (("miss",), list_body_cache.misses)],
+    kind="counter", labelnames=["result"]
+)
+metrics.callback(
+    "agriconnect_fertilizer_due_transitions_total", "Schedules moved to the due status",
+    lambda: [((), due_engine.transitioned)] if due_engine is not None else [], kind="counter"
+)
+
+def _track(schedule):
+    """Keep the due engine in step with a created or changed schedule"""
+    if due_engine is not None:
+        due_engine.track(schedule)
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match matches etag (weak comparison, as for GET)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
 
 @router.get("/schedules", response_model=List[FertilizerSchedule])
-async def get_all_schedules(status: str = Query(None)):
-    """Get all fertilizer schedules, optionally filtered by status"""
-    schedules = list(fertilizer_db.values())
+def get_all_schedules(
+    request: Request,
+    status: str = Query(None),
+    target_field: Optional[str] = Query(None, description="Only schedules for this field"),
+    date_from: Optional[datetime] = Query(None, alias="from", description="Scheduled on or after"),
+    date_to: Optional[datetime] = Query(None, alias="to", description="Scheduled on or before"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for all matches")
+):
+    """Get fertilizer schedules sorted by scheduled_date, optionally filtered and paginated
+    
+    When a page is cut short by `limit`, the cursor for the next page is returned
+    in the X-Next-Cursor header. The ETag changes whenever any schedule is written;
+    send it back in If-None-Match to get a 304 instead of the same page again.
+    """
+    # Read the version before the data: a write in between only makes the ETag stale, never wrong
+    query_hash = hashlib.blake2b(str(request.query_params).encode(), digest_size=6).hexdigest()
+    version = fertilizer_db.version
+    etag = f'W/"{version}-{query_hash}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    cached = list_body_cache.get(version, query_hash)
+    if cached is not None:
+        body, headers = cached
+        return FastJSONResponse(body, headers=headers)
+    
+    try:
+        schedules, next_cursor = fertilizer_db.list(
+            status=status.upper() if status else None,
+            target_field=target_field,
+            date_from=date_from,
+            date_to=date_to,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {"ETag": etag, "X-Store-Version": str(version)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    body = dumps(schedules)
+    list_body_cache.put(version, query_hash, body, headers)
+    return FastJSONResponse(body, headers=headers)
+
+@router.get("/schedules/changes")
+def get_schedule_changes(
+    since: int = Query(0, ge=0, description="Store version from the previous sync (0 for everything still retained)"),
+    limit: int = Query(1000, ge=1, le=MAX_CHANGES_PAGE_SIZE)
+):
+    """Schedules created, updated or deleted after a store version, oldest first
+    
+    Each change is {"op": "upsert", "id", "version", "schedule"} or
+    {"op": "delete", "id", "version"}. Pass next_since back as since until has_more
+    is false. 410 means the version is older than the retained deletes: reload the
+    full list and continue from its X-Store-Version header.
+    """
+    version = fertilizer_db.version
+    try:
+        changes, has_more = fertilizer_db.changes(since, limit)
+    except ChangesExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    
+    return FastJSONResponse({
+        "version": version,
+        "since": since,
+        "changes": changes,
+        "has_more": has_more,
+        # Changes committed after `version` was read are included, so never go back behind them
+        "next_since": changes[-1]["version"] if has_more else max([version, since] + [c["version"] for c in changes[-1:]])
+    })
+
+# Bulk routes are plain def: parsing and inserting are blocking, so they run in the threadpool
+@router.post("/schedules/import")
+def import_schedules(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="ndjson or csv; inferred from the file name if omitted"),
+    batch_size: int = Query(1000, ge=1, le=10000, description="Rows validated and inserted per transaction")
+):
+    """Bulk-create schedules from an NDJSON or CSV upload (FertilizerScheduleCreate fields per row)
+    
+    Invalid rows are skipped and reported with their row number; valid rows are
+    still imported.
+    """
+    fmt = (format or detect_format(file.filename, file.content_type) or "").lower()
+    if fmt not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Must be one of: {', '.join(BULK_FORMATS)}")
     
-    if status:
-        schedules = [s for s in schedules if s["status"] == status.upper()]
+    return bulk_import_schedules(
+        fertilizer_db, file.file, fmt, batch_size=batch_size,
+        on_created=due_engine.track_many if due_engine is not None else None
+    )
+
+@router.get("/schedules/export")
+def export_schedules(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    status: str = Query(None),
+    target_field: Optional[str] = Query(None),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to")
+):
+    """Stream schedules sorted by scheduled_date as NDJSON or CSV"""
+    fmt = format.lower()
+    if fmt not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Must be one of: {', '.join(BULK_FORMATS)}")
     
-    # Sort by scheduled_date
-    schedules.sort(key=lambda x: x["scheduled_date"])
-    return schedules
+    rows = bulk_export_schedules(
+        fertilizer_db, fmt,
+        status=status.upper() if status else None,
+        target_field=target_field,
+        date_from=date_from,
+        date_to=date_to
+    )
+    return StreamingResponse(
+        rows,
+        media_type=BULK_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="fertilizer_schedules.{fmt}"'}
+    )
 
 @router.get("/schedules/{schedule_id}", response_model=FertilizerSchedule)
-async def get_schedule(schedule_id: str):
-    """Get a specific fertilizer schedule"""
-    if schedule_id not in fertilizer_db:
+def get_schedule(schedule_id: str, request: Request):
+    """Get a specific fertilizer schedule (ETag / If-None-Match supported)"""
+    version = fertilizer_db.item_version(schedule_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    etag = f'"{schedule_id}-{version}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    schedule = fertilizer_db.get(schedule_id)
+    if schedule is None:
         raise HTTPException(status_code=404, detail="Schedule not found")
     
-    return fertilizer_db[schedule_id]
+    return FastJSONResponse(schedule, headers={"ETag": etag})
 
 @router.post("/schedules", response_model=FertilizerSchedule)
-async def create_schedule(schedule: FertilizerScheduleCreate):
+def create_schedule(schedule: FertilizerScheduleCreate):
     """Create a new fertilizer schedule"""
-    schedule_id = str(uuid.uuid4())
-    
-    new_schedule = {
-        "id": schedule_id,
-        "fertilizer_type": schedule.fertilizer_type,
-        "amount": schedule.amount,
-        "target_field": schedule.target_field,
-        "scheduled_date": schedule.scheduled_date,
-        "status": "SCHEDULED",
-        "created_at": datetime.now(),
-        "updated_at": datetime.now()
-    }
-    
-    fertilizer_db[schedule_id] = new_schedule
-    return new_schedule
+    created = fertilizer_db.create(new_schedule(
+        schedule.fertilizer_type, schedule.amount, schedule.target_field, schedule.scheduled_date
+    ))
+    _track(created)
+    return FastJSONResponse(created)
 
 @router.put("/schedules/{schedule_id}", response_model=FertilizerSchedule)
-async def update_schedule(schedule_id: str, schedule: FertilizerScheduleUpdate):
+def update_schedule(schedule_id: str, schedule: FertilizerScheduleUpdate):
     """Update an existing fertilizer schedule"""
-    if schedule_id not in fertilizer_db:
-        raise HTTPException(status_code=404, detail="Schedule not found")
-    
-    existing = fertilizer_db[schedule_id]
-    
+    changes = {}
     if schedule.fertilizer_type is not None:
-        existing["fertilizer_type"] = schedule.fertilizer_type
+        changes["fertilizer_type"] = schedule.fertilizer_type
     if schedule.amount is not None:
-        existing["amount"] = schedule.amount
+        changes["amount"] = schedule.amount
     if schedule.target_field is not None:
-        existing["target_field"] = schedule.target_field
+        changes["target_field"] = schedule.target_field
     if schedule.scheduled_date is not None:
-        existing["scheduled_date"] = schedule.scheduled_date
+        changes["scheduled_date"] = schedule.scheduled_date
     if schedule.status is not None:
-        existing["status"] = schedule.status.upper()
+        changes["status"] = schedule.status.upper()
+    changes["updated_at"] = datetime.now()
     
-    existing["updated_at"] = datetime.now()
-    fertilizer_db[schedule_id] = existing
+    updated = fertilizer_db.update(schedule_id, changes)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
     
-    return existing
+    _track(updated)
+    return FastJSONResponse(updated)
 
 @router.delete("/schedules/{schedule_id}")
-async def delete_schedule(schedule_id: str):
+def delete_schedule(schedule_id: str):
     """Delete a fertilizer schedule"""
-    if schedule_id not in fertilizer_db:
+    if not fertilizer_db.delete(schedule_id):
         raise HTTPException(status_code=404, detail="Schedule not found")
     
-    del fertilizer_db[schedule_id]
+    if due_engine is not None:
+        due_engine.untrack(schedule_id)
     return {"message": "Schedule deleted successfully", "id": schedule_id}
 
 @router.patch("/schedules/{schedule_id}/status")
-async def update_status(schedule_id: str, status: str):
+def update_status(schedule_id: str, status: str):
     """Update schedule status (PENDING, SCHEDULED, COMPLETED, CANCELLED)"""
     if schedule_id not in fertilizer_db:
         raise HTTPException(status_code=404, detail="Schedule not found")
     
-    valid_statuses = ["PENDING", "SCHEDULED", "COMPLETED", "CANCELLED"]
-    if status.upper() not in valid_statuses:
+    if status.upper() not in VALID_STATUSES:
         raise HTTPException(
             status_code=400, 
-            detail=f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
+            detail=f"Invalid status. Must be one of: {', '.join(VALID_STATUSES)}"
         )
     
-    fertilizer_db[schedule_id]["status"] = status.upper()
-    fertilizer_db[schedule_id]["updated_at"] = datetime.now()
+    updated = fertilizer_db.update(schedule_id, {"status": status.upper(), "updated_at": datetime.now()})
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
     
-    return fertilizer_db[schedule_id]
+    _track(updated)
+    return FastJSONResponse(updated)
 
 @router.post("/schedules/{schedule_id}/apply")
-async def apply_schedule(schedule_id: str):
+def apply_schedule(schedule_id: str):
     """Mark a schedule as applied/completed"""
-    if schedule_id not in fertilizer_db:
+    updated = fertilizer_db.update(schedule_id, {"status": "COMPLETED", "updated_at": datetime.now()})
+    if updated is None:
         raise HTTPException(status_code=404, detail="Schedule not found")
     
-    fertilizer_db[schedule_id]["status"] = "COMPLETED"
-    fertilizer_db[schedule_id]["updated_at"] = datetime.now()
-    
-    return {
+    _track(updated)
+    return FastJSONResponse({
         "message": "Schedule marked as completed",
-        "schedule": fertilizer_db[schedule_id]
-    }
+        "schedule": updated
+    })
+
+@router.get("/due/events")
+def get_due_events(
+    after: int = Query(0, ge=0, description="Only events with a higher seq (last seq you saw)"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Recent automatic SCHEDULED -> PENDING transitions, oldest first"""
+    if due_engine is None:
+        raise HTTPException(status_code=404, detail="Due-schedule engine is disabled")
+    
+    return {"events": due_engine.events_after(after, limit)}
+
+@router.get("/due/stats")
+def get_due_stats():
+    """Tracked schedules, next due date and transition counts of the due engine"""
+    if due_engine is None:
+        return {"enabled": False}
+    
+    return {"enabled": True, **due_engine.stats()}
+
+@router.get("/aggregates")
+def get_aggregates(
+    request: Request,
+    by: Optional[str] = Query(None, description=f"Comma-separated dimensions: {', '.join(AGGREGATE_DIMENSIONS)} (default all)"),
+    status: Optional[str] = Query(None, description="Comma-separated statuses to include (default all)")
+):
+    """Schedule counts and dosage totals per field, crop, fertilizer type and month
+    
+    Totals are grouped by normalized unit ("kg/ha", "l/ha", "kg", ...); schedules
+    whose amount could not be parsed are only counted, under "unparsed". The
+    aggregates are maintained on every write, so this costs O(groups), not O(schedules).
+    """
+    dimensions = [d.strip() for d in by.split(",") if d.strip()] if by else list(AGGREGATE_DIMENSIONS)
+    unknown = [d for d in dimensions if d not in AGGREGATE_DIMENSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid dimension(s): {', '.join(unknown)}. Must be one of: {', '.join(AGGREGATE_DIMENSIONS)}"
+        )
+    statuses = [s.strip().upper() for s in status.split(",") if s.strip()] if status else None
+    if statuses and any(s not in VALID_STATUSES for s in statuses):
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {', '.join(VALID_STATUSES)}")
+    
+    version = fertilizer_db.version
+    query_hash = hashlib.blake2b(str(request.query_params).encode(), digest_size=6).hexdigest()
+    etag = f'W/"{version}-{query_hash}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return FastJSONResponse({"version": version, "by": fertilizer_db.aggregates(dimensions, statuses)}, headers={"ETag": etag})
 
 @router.get("/health")
-async def health_check():
+def health_check():
     """Health check for fertilizer service"""
     return {
         "status": "healthy",
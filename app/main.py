@@ -1,6 +1,38 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import disease_detection, fertilizer, chatbot
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.services.metrics import MetricsMiddleware, metrics, metrics_enabled
+from app.services.profiling import ProfilingMiddleware, create_profiler_from_env
+from app.services.sqlite_pool import PoolExhausted
+from app.services.startup import startup_report
+from typing import Optional
+import importlib
+import os
+
+# Routers are imported only for enabled services so each deployment
+# pays for just the ML stacks it serves (e.g. fertilizer-only pods skip torch)
+SERVICES = {
+    "disease_detection": ("app.api.disease_detection", "/api/disease-detection/health"),
+    "fertilizer": ("app.api.fertilizer", "/api/fertilizer/health"),
+    "chatbot": ("app.api.chatbot", "/api/chatbot/health")
+}
+
+def get_enabled_services() -> list:
+    """Read AGRICONNECT_SERVICES (comma-separated service names, default all)"""
+    value = os.getenv("AGRICONNECT_SERVICES", "all").strip().lower()
+    if value in ("", "all"):
+        return list(SERVICES)
+
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SERVICES]
+    if unknown:
+        raise ValueError(
+            f"Unknown service(s) in AGRICONNECT_SERVICES: {', '.join(unknown)}. "
+            f"Must be one of: {', '.join(SERVICES)}"
+        )
+    return names
+
+enabled_services = get_enabled_services()
 
 # Create FastAPI app
 app = FastAPI(
@@ -18,10 +50,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include all routers
-app.include_router(disease_detection.router)
-app.include_router(fertilizer.router)
-app.include_router(chatbot.router)
+# Opt-in cProfile of selected requests, downloadable from /profiles (AGRICONNECT_PROFILING=1 enables)
+profiler = create_profiler_from_env()
+if profiler is not None:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Per-route latency and in-flight requests for GET /metrics (AGRICONNECT_METRICS=0 disables)
+if metrics_enabled():
+    app.add_middleware(MetricsMiddleware)
+
+# Every pooled SQLite connection stayed busy: ask the client to retry instead of a bare 500
+@app.exception_handler(PoolExhausted)
+async def pool_exhausted_handler(request, exc: PoolExhausted):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# Include enabled routers
+for service_name in enabled_services:
+    module_path, _ = SERVICES[service_name]
+    with startup_report.phase(f"import {module_path}"):
+        module = importlib.import_module(module_path)
+    app.include_router(module.router)
+
+startup_report.print_report()
 
 @app.get("/")
 async def root():
@@ -29,14 +79,56 @@ async def root():
     return {
         "message": "AgriConnect Disease Detection API",
         "docs": "/docs",
-        "services": {
-            "disease_detection": "/api/disease-detection/health",
-            "fertilizer": "/api/fertilizer/health",
-            "chatbot": "/api/chatbot/health"
-        }
+        "services": {name: SERVICES[name][1] for name in enabled_services}
     }
 
 @app.get("/health")
 async def health():
     """Global health check"""
-    return {"status": "running"}
\ No newline at end of file
+    return {"status": "running"}
+
+@app.get("/startup")
+async def startup():
+    """Startup time broken down by import and model load"""
+    return {"services": enabled_services, **startup_report.summary()}
+
+if metrics_enabled():
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def prometheus_metrics():
+        """Prometheus text exposition of request, stage, cache and queue metrics"""
+        # Plain def: queue callbacks read SQLite, which must stay off the event loop
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+if profiler is not None:
+    def _require_profiling_token(header_token: Optional[str], query_token: Optional[str]) -> None:
+        if not profiler.authorized(header_token or query_token):
+            raise HTTPException(status_code=403, detail="Profiling token required")
+
+    @app.get("/profiles", include_in_schema=False)
+    async def list_profiles(x_profile: Optional[str] = Header(None), profile: Optional[str] = Query(None)):
+        """Stored request profiles, newest first, plus sampling counters"""
+        _require_profiling_token(x_profile, profile)
+        return {**profiler.stats(), "profiles": profiler.summaries()}
+
+    @app.get("/profiles/{profile_id}", include_in_schema=False)
+    async def get_profile(profile_id: str, x_profile: Optional[str] = Header(None), profile: Optional[str] = Query(None)):
+        """Spans and top functions of one profiled request"""
+        _require_profiling_token(x_profile, profile)
+        stored = profiler.get(profile_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return {key: value for key, value in stored.items() if key != "pstats"}
+
+    @app.get("/profiles/{profile_id}/pstats", include_in_schema=False)
+    async def download_profile(profile_id: str, x_profile: Optional[str] = Header(None), profile: Optional[str] = Query(None)):
+        """Raw cProfile data, loadable with pstats.Stats(path) or snakeviz"""
+        _require_profiling_token(x_profile, profile)
+        stored = profiler.get(profile_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return Response(
+            stored["pstats"],
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'}
+        )
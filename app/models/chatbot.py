@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, List
 
@@ -18,4 +18,25 @@ class ChatResponse(BaseModel):
     user_message: str
     bot_response: str
     timestamp: datetime
-    confidence: Optional[float] = None
\ No newline at end of file
+    confidence: Optional[float] = None
+
+class RetrievalBatchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    k: int = Field(3, ge=1, le=20)
+    mode: Optional[str] = None  # bm25, semantic or keyword; defaults to KB_RETRIEVAL_MODE
+    include_text: bool = False
+
+class RetrievedEntry(BaseModel):
+    id: str
+    score: float
+    text: Optional[str] = None
+
+class RetrievalBatchItem(BaseModel):
+    query: str
+    entries: List[RetrievedEntry]
+
+class RetrievalBatchResponse(BaseModel):
+    mode: str
+    count: int
+    elapsed_ms: float
+    results: List[RetrievalBatchItem]
@@ -11,6 +11,12 @@ class FertilizerSchedule(BaseModel):
     status: str  # PENDING, SCHEDULED, COMPLETED, CANCELLED
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    # Parsed from amount and target_field when the schedule is written
+    quantity: Optional[float] = None  # kg or l (per ha when per_area is set)
+    unit: Optional[str] = None  # kg or l; None if the amount was not recognized
+    per_area: Optional[str] = None  # ha, or None for a flat amount
+    field: Optional[str] = None
+    crop: Optional[str] = None
 
 class FertilizerScheduleCreate(BaseModel):
     fertilizer_type: str
@@ -0,0 +1,59 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List
+
+class ClimateRequirements(BaseModel):
+    temp_min: float
+    temp_max: float
+    rain_min: float
+    rain_max: float
+    humidity_min: float
+    humidity_max: float
+
+class SoilRequirements(BaseModel):
+    type: List[str]
+    ph_min: float
+    ph_max: float
+    drainage_required: bool
+    organic_matter: str
+
+class WaterRequirements(BaseModel):
+    requirement: str
+    irrigation_cycle: str
+
+class FertilizerStage(BaseModel):
+    stage: str
+    type: str
+    quantity: str
+
+class CropEntry(BaseModel):
+    """One file in knowledge_base/crops/<crop_key>.json"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    name: str
+    season: str
+    planting_months: List[int]
+    harvest_months: List[int]
+    cycle_length: int
+    climate: ClimateRequirements
+    soil: SoilRequirements
+    water: WaterRequirements
+    yield_: str = Field(alias="yield")
+    profitability: str
+    practices: List[str]
+    pest_management: Optional[List[str]] = None
+    fertilizer: Optional[List[FertilizerStage]] = None
+
+class PestEntry(BaseModel):
+    """One file in knowledge_base/pests/<pest_key>.json"""
+    crop: str
+    category: str
+    severity: str  # low, medium, high
+    summary: str
+    immediate: Optional[List[str]] = None
+    treatment: Optional[List[str]] = None
+    prevention: Optional[List[str]] = None
+    organic_alternatives: Optional[List[str]] = None
+
+class GeneralTopic(BaseModel):
+    """One file in knowledge_base/general/<topic>.json"""
+    facts: List[str]
@@ -1,319 +1,446 @@
 """
 Comprehensive Agriculture Knowledge Base for RAG-enhanced chatbot
+
+Entries live as JSON files under KB_DATA_DIR (one file per crop, pest and
+general-knowledge topic) and are validated against app.models.knowledge_base on
+load. A background watcher picks up edited, added or removed files and swaps in
+a new snapshot without a restart, re-rendering only the entries that changed.
 """
-from typing import List, Dict, Any
-import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from pydantic import ValidationError
+from app.models.knowledge_base import CropEntry, PestEntry, GeneralTopic
+from app.services.startup import startup_report
+from app.services.kb_index import KnowledgeBaseIndex
+from app.services.kb_bm25 import BM25Index, Passage, entry_passages
+from app.services.kb_semantic import SemanticIndex
+from app.services.kb_snippets import KnowledgeBaseSnippets
 
-class AgricultureKnowledgeBase:
-    """Agriculture knowledge base for retrieval-augmented generation"""
+# Retrieval strategies: "bm25" (ranked), "semantic" (hashed char n-gram similarity)
+# or "keyword" (first match in KB order)
+RETRIEVAL_MODES = ("bm25", "semantic", "keyword")
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "knowledge_base")
+
+# Subdirectory, entry kind and schema of each knowledge file type
+ENTRY_TYPES = (
+    ("crops", "crop", CropEntry),
+    ("pests", "pest", PestEntry),
+    ("general", "topic", GeneralTopic)
+)
+
+# Bump when the pickled snapshot layout or any rendering changes
+SNAPSHOT_FORMAT = 1
+
+EntryKey = Tuple[str, str]  # (kind, key), e.g. ("crop", "tomato")
+
+@dataclass(frozen=True)
+class RetrievalResult:
+    """Outcome of one retrieval, computed once per request and shared by generation and fallback"""
+    query: str
+    mode: str
+    entries: Tuple[Tuple[str, str, float], ...]  # ranked (entry_id, rendered context, score)
+    context: str                                 # entries joined for the prompt
+    crops: Tuple[str, ...]                       # crop keys mentioned in the message
+    pests: Tuple[str, ...]                       # pest keys matched (only when the message is about pests/disease)
+    topics: Tuple[str, ...]                      # general-knowledge topics mentioned
+    # Snippet tables of the snapshot that produced this result, so a concurrent reload cannot mix versions
+    snippets: Optional[KnowledgeBaseSnippets] = field(default=None, repr=False, compare=False)
+
+def load_entry(path: str, kind: str) -> Any:
+    """Read and validate one knowledge file; raises ValueError if it is malformed"""
+    schema = next(model for _, entry_kind, model in ENTRY_TYPES if entry_kind == kind)
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        schema.model_validate(raw)
+    except (OSError, json.JSONDecodeError, ValidationError) as e:
+        raise ValueError(f"Invalid knowledge file {path}: {e}") from e
+    # Keep the file's own values (ints stay ints in rendered text); the schema only guards the shape
+    return raw["facts"] if kind == "topic" else raw
+
+def check_renders(kind: str, key: str, value: Any) -> None:
+    """Render one validated entry's snippets and passages; raises ValueError if that fails"""
+    tables = {entry_kind: {} for _, entry_kind, _ in ENTRY_TYPES}
+    tables[kind][key] = value
+    try:
+        snippets = KnowledgeBaseSnippets(tables["crop"], tables["pest"], tables["topic"])
+        entry_passages(kind, key, value, snippets)
+    except Exception as e:
+        raise ValueError(f"Cannot render {kind}:{key}: {e!r}") from e
+
+class KnowledgeState:
+    """One immutable snapshot of the knowledge base and every index derived from it"""
     
-    def __init__(self):
-        self.crop_database = self._load_crop_database()
-        self.pest_database = self._load_pest_database()
-        self.general_knowledge = self._load_general_knowledge()
+    def __init__(
+        self,
+        crop_database: Dict[str, Any],
+        pest_database: Dict[str, Any],
+        general_knowledge: Dict[str, List[str]],
+        previous: "KnowledgeState" = None,
+        changes: Dict[EntryKey, Optional[Any]] = None
+    ):
+        self.crop_database = crop_database
+        self.pest_database = pest_database
+        self.general_knowledge = general_knowledge
+        incremental = previous is not None and changes is not None
+        
+        # Keyword indexes so retrieval is a single pass over the message (cheap, always rebuilt)
+        self.index = KnowledgeBaseIndex(crop_database, pest_database, general_knowledge)
+        # Every text rendering of every entry; on reload only changed entries are re-rendered
+        if incremental:
+            self.snippets = previous.snippets.updated(changes)
+        else:
+            self.snippets = KnowledgeBaseSnippets(crop_database, pest_database, general_knowledge)
+        
+        # Ranked retrieval over chunked passages, kept per entry so unchanged entries are reused
+        self.passages_by_entry: Dict[EntryKey, List[Passage]] = {}
+        for kind, entries in self._entry_tables():
+            for key, value in entries.items():
+                if incremental and (kind, key) not in changes:
+                    self.passages_by_entry[(kind, key)] = previous.passages_by_entry[(kind, key)]
+                else:
+                    self.passages_by_entry[(kind, key)] = entry_passages(kind, key, value, self.snippets)
+        self.passages = [p for passages in self.passages_by_entry.values() for p in passages]
+        self.bm25 = BM25Index(self.passages, token_cache=previous.bm25.token_cache if previous else None)
+        # Built lazily: only the semantic mode needs the memory-mapped matrix
+        self._semantic = None
     
-    def _load_crop_database(self) -> Dict[str, Any]:
-        """Load comprehensive crop information"""
-        return {
-            "tomato": {
-                "name": "Tomato",
-                "season": "Summer/Monsoon",
-                "planting_months": [3, 4, 5, 9, 10],
-                "harvest_months": [6, 7, 8, 12, 1],
-                "cycle_length": 90,
-                "climate": {
-                    "temp_min": 20, "temp_max": 30,
-                    "rain_min": 600, "rain_max": 1000,
-                    "humidity_min": 50, "humidity_max": 80
-                },
-                "soil": {
-                    "type": ["Loamy", "Sandy Loam"],
-                    "ph_min": 6.0, "ph_max": 7.0,
-                    "drainage_required": True,
-                    "organic_matter": "High"
-                },
-                "water": {"requirement": "High", "irrigation_cycle": "Every 2-3 days"},
-                "yield": "40-50 tons/hectare",
-                "profitability": "Very High",
-                "practices": [
-                    "Use drip irrigation", "Stake plants for support",
-                    "Mulch to retain moisture", "Regular pruning for better air circulation",
-                    "Rotate crops annually"
-                ],
-                "pest_management": [
-                    "Install insect nets", "Use neem oil spray",
-                    "Yellow sticky traps for whiteflies", "Remove infected plants immediately"
-                ],
-                "fertilizer": [
-                    {"stage": "Pre-planting", "type": "FYM", "quantity": "25-30 t/ha"},
-                    {"stage": "Planting", "type": "NPK 12:32:16", "quantity": "500 kg/ha"},
-                    {"stage": "Flowering", "type": "Urea", "quantity": "250 kg/ha"},
-                    {"stage": "Fruiting", "type": "Potassium", "quantity": "200 kg/ha"}
-                ]
-            },
-            "wheat": {
-                "name": "Wheat",
-                "season": "Winter/Rabi",
-                "planting_months": [10, 11, 12],
-                "harvest_months": [3, 4, 5],
-                "cycle_length": 120,
-                "climate": {
-                    "temp_min": 15, "temp_max": 25,
-                    "rain_min": 400, "rain_max": 800,
-                    "humidity_min": 40, "humidity_max": 70
-                },
-                "soil": {
-                    "type": ["Loam", "Clay Loam"],
-                    "ph_min": 6.0, "ph_max": 7.5,
-                    "drainage_required": True,
-                    "organic_matter": "Medium to High"
-                },
-                "water": {"requirement": "Medium", "irrigation_cycle": "Every 10-15 days"},
-                "yield": "4-5 tons/hectare",
-                "profitability": "High",
-                "practices": [
-                    "Timely sowing is crucial", "Use certified seeds",
-                    "Proper weed management", "Crop rotation with legumes"
-                ],
-                "fertilizer": [
-                    {"stage": "Pre-planting", "type": "FYM", "quantity": "10-15 t/ha"},
-                    {"stage": "Planting", "type": "NPK 10:26:26", "quantity": "150 kg/ha"},
-                    {"stage": "Tillering", "type": "Urea", "quantity": "100 kg/ha"}
-                ]
-            },
-            "rice": {
-                "name": "Rice",
-                "season": "Kharif/Monsoon",
-                "planting_months": [6, 7, 8],
-                "harvest_months": [10, 11, 12],
-                "cycle_length": 120,
-                "climate": {
-                    "temp_min": 20, "temp_max": 35,
-                    "rain_min": 1000, "rain_max": 2000,
-                    "humidity_min": 70, "humidity_max": 90
-                },
-                "soil": {
-                    "type": ["Clay", "Clay Loam"],
-                    "ph_min": 5.5, "ph_max": 7.0,
-                    "drainage_required": False,
-                    "organic_matter": "High"
-                },
-                "water": {"requirement": "Very High", "irrigation_cycle": "Continuous flooding"},
-                "yield": "5-6 tons/hectare",
-                "profitability": "High",
-                "practices": [
-                    "Transplanting method", "Proper water management",
-                    "Integrated pest management", "Use of bio-fertilizers"
-                ],
-                "fertilizer": [
-                    {"stage": "Pre-planting", "type": "FYM", "quantity": "10-12 t/ha"},
-                    {"stage": "Planting", "type": "NPK 10:26:26", "quantity": "100 kg/ha"},
-                    {"stage": "Tillering", "type": "Urea", "quantity": "50 kg/ha"},
-                    {"stage": "Panicle initiation", "type": "Urea", "quantity": "50 kg/ha"}
-                ]
-            },
-            "potato": {
-                "name": "Potato",
-                "season": "Winter/Rabi",
-                "planting_months": [9, 10, 11],
-                "harvest_months": [1, 2, 3],
-                "cycle_length": 120,
-                "climate": {
-                    "temp_min": 10, "temp_max": 20,
-                    "rain_min": 500, "rain_max": 800,
-                    "humidity_min": 60, "humidity_max": 90
-                },
-                "soil": {
-                    "type": ["Sandy Loam", "Loam"],
-                    "ph_min": 5.5, "ph_max": 7.0,
-                    "drainage_required": True,
-                    "organic_matter": "Medium to High"
-                },
-                "water": {"requirement": "Medium", "irrigation_cycle": "Every 7-10 days"},
-                "yield": "20-25 tons/hectare",
-                "profitability": "High",
-                "practices": [
-                    "Ridge and furrow method", "Use certified seed potatoes",
-                    "Earthing up during growth", "Mulching reduces disease"
-                ],
-                "fertilizer": [
-                    {"stage": "Pre-planting", "type": "FYM", "quantity": "20-25 t/ha"},
-                    {"stage": "Planting", "type": "NPK 10:26:26", "quantity": "500 kg/ha"},
-                    {"stage": "Growth", "type": "Urea", "quantity": "200 kg/ha"}
-                ]
-            },
-            "corn": {
-                "name": "Corn/Maize",
-                "season": "Kharif/Summer",
-                "planting_months": [5, 6, 7],
-                "harvest_months": [9, 10, 11],
-                "cycle_length": 90,
-                "climate": {
-                    "temp_min": 18, "temp_max": 27,
-                    "rain_min": 500, "rain_max": 1000,
-                    "humidity_min": 50, "humidity_max": 80
-                },
-                "soil": {
-                    "type": ["Loam", "Sandy Loam"],
-                    "ph_min": 5.8, "ph_max": 7.0,
-                    "drainage_required": True,
-                    "organic_matter": "Medium"
-                },
-                "water": {"requirement": "Medium to High", "irrigation_cycle": "Every 5-7 days"},
-                "yield": "6-8 tons/hectare",
-                "profitability": "Medium to High",
-                "practices": [
-                    "Proper spacing (60-75 cm)", "Timely weeding",
-                    "Earthing up", "Crop rotation"
-                ],
-                "fertilizer": [
-                    {"stage": "Pre-planting", "type": "FYM", "quantity": "10-15 t/ha"},
-                    {"stage": "Planting", "type": "NPK 10:26:26", "quantity": "120 kg/ha"},
-                    {"stage": "Knee high", "type": "Urea", "quantity": "100 kg/ha"}
-                ]
-            }
-        }
+    def _entry_tables(self) -> Tuple[Tuple[str, Dict[str, Any]], ...]:
+        return (("crop", self.crop_database), ("pest", self.pest_database), ("topic", self.general_knowledge))
     
-    def _load_pest_database(self) -> Dict[str, Any]:
-        """Load pest and disease information"""
-        return {
-            "tomato_late_blight": {
-                "crop": "Tomato",
-                "category": "fungal disease",
-                "severity": "high",
-                "summary": "Late blight spreads rapidly under humid/wet conditions and can wipe out tomato foliage within days if untreated.",
-                "immediate": [
-                    "Isolate infected plots and destroy heavily infected plants/leaves.",
-                    "Avoid overhead irrigation to reduce leaf wetness.",
-                    "Improve ventilation and drainage in the plot."
-                ],
-                "treatment": [
-                    "Spray Copper Oxychloride 50% WP @ 2.5 g/litre or Mancozeb 75% WP @ 2 g/litre every 7 days.",
-                    "Rotate fungicides with different FRAC codes to delay resistance.",
-                    "Use systemic options like Metalaxyl + Mancozeb for severe outbreaks."
-                ],
-                "prevention": [
-                    "Plant certified disease-free seed/seedlings.",
-                    "Maintain 45-60 cm spacing for airflow.",
-                    "Adopt drip irrigation and mulch to reduce humidity."
-                ],
-                "organic_alternatives": [
-                    "5% Neem seed kernel extract spray every 5 days.",
-                    "Bio-fungicide containing Trichoderma harzianum @ 5 g/litre."
-                ]
-            },
-            "tomato_early_blight": {
-                "crop": "Tomato",
-                "category": "fungal disease",
-                "severity": "medium",
-                "summary": "Early blight causes characteristic concentric rings on leaves and leads to defoliation when unchecked.",
-                "treatment": [
-                    "Spray Mancozeb 75% WP @ 2.5 g/litre every 7-10 days.",
-                    "Copper-based fungicides as preventive measure."
-                ],
-                "prevention": [
-                    "Remove infected leaves early",
-                    "Maintain proper plant spacing",
-                    "Avoid overhead irrigation"
-                ]
-            }
-        }
+    @property
+    def semantic(self) -> SemanticIndex:
+        """Hashed n-gram passage index, built or memory-mapped on first use"""
+        if self._semantic is None:
+            self._semantic = SemanticIndex(self.passages)
+        return self._semantic
     
-    def _load_general_knowledge(self) -> Dict[str, List[str]]:
-        """Load general agriculture knowledge"""
-        return {
-            "fertilizer": [
-                "NPK ratios vary by crop. For wheat, NPK 10:26:26 is common. For tomatoes, NPK 12:32:16 is recommended.",
-                "Organic fertilizers (FYM, compost) improve soil health long-term and should be applied before planting.",
-                "Urea is a nitrogen source applied during growth stages. Apply 50-100 kg/ha depending on crop.",
-                "Phosphorus is crucial for root development. Apply during planting stage.",
-                "Potassium improves fruit quality and disease resistance. Apply during flowering/fruiting stage."
-            ],
-            "irrigation": [
-                "Drip irrigation is 30-50% more efficient than flood irrigation and reduces disease spread.",
-                "Water requirements vary: Rice needs continuous flooding, while wheat needs periodic irrigation every 10-15 days.",
-                "Monitor soil moisture using tensiometers or simple finger test. Water when top 2-3 cm is dry.",
-                "Early morning irrigation reduces evaporation and disease risk.",
-                "Mulching reduces water requirement by 30-40% and controls weeds."
-            ],
-            "soil_management": [
-                "Soil pH between 6.0-7.5 is ideal for most crops. Test soil every 2-3 years.",
-                "Crop rotation with legumes improves soil nitrogen naturally.",
-                "Organic matter (FYM, compost) should be 2-3% of soil for optimal crop growth.",
-                "Proper drainage prevents waterlogging which causes root rot.",
-                "Soil testing before each season helps determine exact fertilizer requirements."
-            ],
-            "pest_management": [
-                "Integrated Pest Management (IPM) combines biological, cultural, and chemical methods.",
-                "Early detection is key - inspect crops weekly for signs of pests or diseases.",
-                "Neem oil is an effective organic pesticide. Use 5ml per liter of water.",
-                "Crop rotation breaks pest cycles. Don't plant same crop in same field consecutively.",
-                "Beneficial insects like ladybugs and spiders help control pests naturally."
-            ],
-            "post_harvest": [
-                "After harvesting, prepare land for next crop by removing crop residues and plowing.",
-                "Store harvested crops in cool, dry places to prevent spoilage.",
-                "Proper drying is essential for grains - moisture content should be below 14%.",
-                "Crop residues can be composted or used as mulch for next season.",
-                "Plan next crop based on season, market demand, and soil health."
-            ]
-        }
+    def __getstate__(self) -> Dict[str, Any]:
+        # The memory-mapped semantic matrix is re-opened from its own cache file
+        state = self.__dict__.copy()
+        state["_semantic"] = None
+        return state
+
+class AgricultureKnowledgeBase:
+    """Agriculture knowledge base for retrieval-augmented generation"""
     
-    def retrieve_relevant_info(self, user_message: str, max_results: int = 5) -> str:
-        """Retrieve relevant agriculture information for RAG"""
-        user_lower = user_message.lower()
-        relevant_info = []
+    def __init__(self, retrieval_mode: str = None, data_dir: str = None, watch_interval_seconds: float = None):
+        self.retrieval_mode = (retrieval_mode or os.getenv("KB_RETRIEVAL_MODE", "bm25")).lower()
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Invalid retrieval mode: {self.retrieval_mode}. Must be one of: {', '.join(RETRIEVAL_MODES)}")
         
-        # Check for crop mentions
-        for crop_key, crop_data in self.crop_database.items():
-            if crop_key in user_lower or crop_data["name"].lower() in user_lower:
-                info = f"Crop: {crop_data['name']}\n"
-                info += f"Season: {crop_data['season']}, Cycle: {crop_data['cycle_length']} days\n"
-                info += f"Yield: {crop_data['yield']}, Profitability: {crop_data['profitability']}\n"
-                info += f"Soil: pH {crop_data['soil']['ph_min']}-{crop_data['soil']['ph_max']}, {', '.join(crop_data['soil']['type'])}\n"
-                info += f"Water: {crop_data['water']['requirement']}, Irrigation: {crop_data['water']['irrigation_cycle']}\n"
-                info += f"Key Practices: {', '.join(crop_data['practices'][:3])}\n"
-                if 'fertilizer' in crop_data:
-                    fert_info = "; ".join([f"{f['stage']}: {f['type']} {f['quantity']}" for f in crop_data['fertilizer'][:2]])
-                    info += f"Fertilizer: {fert_info}\n"
-                relevant_info.append(info)
-                if len(relevant_info) >= max_results:
-                    break
+        self.data_dir = data_dir or os.getenv("KB_DATA_DIR", DEFAULT_DATA_DIR)
+        if watch_interval_seconds is None:
+            watch_interval_seconds = float(os.getenv("KB_WATCH_INTERVAL_SECONDS", "5"))
+        self.watch_interval_seconds = watch_interval_seconds
+        self.snapshot_enabled = os.getenv("KB_SNAPSHOT", "false").lower() == "true"
+        self.cache_dir = os.getenv("KB_CACHE_DIR", ".kb_cache")
         
-        # Check for pest/disease mentions
-        if any(word in user_lower for word in ["disease", "pest", "infection", "blight", "rot"]):
-            for pest_key, pest_data in self.pest_database.items():
-                if pest_data["crop"].lower() in user_lower or any(word in pest_key for word in user_lower.split()):
-                    info = f"Disease: {pest_key.replace('_', ' ').title()}\n"
-                    info += f"Crop: {pest_data['crop']}, Severity: {pest_data['severity']}\n"
-                    info += f"Summary: {pest_data['summary']}\n"
-                    if 'treatment' in pest_data:
-                        info += f"Treatment: {pest_data['treatment'][0]}\n"
-                    if 'prevention' in pest_data:
-                        info += f"Prevention: {pest_data['prevention'][0]}\n"
-                    relevant_info.append(info)
-                    if len(relevant_info) >= max_results:
-                        break
+        # Bumped whenever the knowledge changes so dependent caches can invalidate
+        self.version = 1
+        self._reload_lock = threading.Lock()
+        # Files rejected by the last reload; a snapshot is only written for a fully valid tree
+        self._invalid_files: Set[str] = set()
+        self._file_stats = self._scan_files()
+        self._state = self._load_snapshot() or self._load_state()
+        self._save_snapshot()
         
-        # Check for general topics
-        topic_keywords = {
-            "fertilizer": ["fertilizer", "npk", "urea", "nutrient", "fertilization"],
-            "irrigation": ["water", "irrigation", "drainage", "moisture", "watering"],
-            "soil_management": ["soil", "ph", "organic", "compost", "fym"],
-            "pest_management": ["pest", "insect", "spray", "pesticide", "ipm"],
-            "post_harvest": ["harvest", "after farming", "post harvest", "storage", "drying"]
-        }
+        self._watcher = None
+        if self.watch_interval_seconds > 0:
+            self._watcher = threading.Thread(target=self._watch, name="kb-watcher", daemon=True)
+            self._watcher.start()
+    
+    # Read-through views of the current snapshot
+    @property
+    def crop_database(self) -> Dict[str, Any]:
+        return self._state.crop_database
+    
+    @property
+    def pest_database(self) -> Dict[str, Any]:
+        return self._state.pest_database
+    
+    @property
+    def general_knowledge(self) -> Dict[str, List[str]]:
+        return self._state.general_knowledge
+    
+    @property
+    def index(self) -> KnowledgeBaseIndex:
+        return self._state.index
+    
+    @property
+    def snippets(self) -> KnowledgeBaseSnippets:
+        return self._state.snippets
+    
+    @property
+    def passages(self) -> List[Passage]:
+        return self._state.passages
+    
+    @property
+    def bm25(self) -> BM25Index:
+        return self._state.bm25
+    
+    @property
+    def semantic(self) -> SemanticIndex:
+        return self._state.semantic
+    
+    def _scan_files(self) -> Dict[str, Tuple[int, int]]:
+        """Relative path -> (mtime_ns, size) of every knowledge file"""
+        stats = {}
+        for subdir, _, _ in ENTRY_TYPES:
+            directory = os.path.join(self.data_dir, subdir)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".json"):
+                    st = os.stat(os.path.join(directory, name))
+                    stats[f"{subdir}/{name}"] = (st.st_mtime_ns, st.st_size)
+        return stats
+    
+    @staticmethod
+    def _entry_key(rel_path: str) -> EntryKey:
+        subdir, name = rel_path.split("/", 1)
+        kind = next(kind for entry_subdir, kind, _ in ENTRY_TYPES if entry_subdir == subdir)
+        return kind, name[:-len(".json")]
+    
+    def _load_state(self) -> KnowledgeState:
+        """Load and validate every knowledge file; any invalid file fails startup"""
+        tables: Dict[str, Dict[str, Any]] = {"crop": {}, "pest": {}, "topic": {}}
+        for rel_path in self._file_stats:
+            kind, key = self._entry_key(rel_path)
+            tables[kind][key] = load_entry(os.path.join(self.data_dir, rel_path), kind)
+            check_renders(kind, key, tables[kind][key])
+        if not tables["crop"]:
+            raise ValueError(f"No crop entries found in {self.data_dir}")
+        return KnowledgeState(tables["crop"], tables["pest"], tables["topic"])
+    
+    def reload(self) -> List[str]:
+        """Apply added, edited and removed knowledge files; returns the changed entry ids"""
+        with self._reload_lock:
+            stats = self._scan_files()
+            changed_paths = [p for p in stats if self._file_stats.get(p) != stats[p]]
+            removed_paths = [p for p in self._file_stats if p not in stats]
+            if not changed_paths and not removed_paths:
+                return []
+            
+            state = self._state
+            tables = {"crop": dict(state.crop_database), "pest": dict(state.pest_database), "topic": dict(state.general_knowledge)}
+            changes: Dict[EntryKey, Optional[Any]] = {}
+            self._invalid_files -= set(changed_paths) | set(removed_paths)
+            for rel_path in changed_paths:
+                kind, key = self._entry_key(rel_path)
+                try:
+                    value = load_entry(os.path.join(self.data_dir, rel_path), kind)
+                    check_renders(kind, key, value)
+                except ValueError as e:
+                    # Keep serving the previous version of the entry until the file is fixed
+                    print(f"❌ Knowledge base reload skipped {rel_path}: {e}")
+                    self._invalid_files.add(rel_path)
+                    continue
+                if tables[kind].get(key) != value:
+                    tables[kind][key] = value
+                    changes[(kind, key)] = value
+            for rel_path in removed_paths:
+                kind, key = self._entry_key(rel_path)
+                if tables[kind].pop(key, None) is not None:
+                    changes[(kind, key)] = None
+            
+            if not changes:
+                # Record the new stats even for skipped files so a broken file is reported once, not every poll
+                self._file_stats = stats
+                return []
+            
+            # Same ordering as a full load
+            for kind in tables:
+                tables[kind] = dict(sorted(tables[kind].items()))
+            started = time.perf_counter()
+            try:
+                new_state = KnowledgeState(tables["crop"], tables["pest"], tables["topic"], previous=state, changes=changes)
+            except Exception as e:
+                # Keep the previous snapshot; the stats stay unrecorded so the next poll tries again
+                failed = [p for p in changed_paths if p not in self._invalid_files]
+                print(f"❌ Knowledge base reload failed building indexes for {', '.join(failed)}: {e!r}")
+                self._invalid_files.update(failed)
+                return []
+            # Only now is the edit applied, so only now does it count as seen
+            self._file_stats = stats
+            self._state = new_state
+            self.version += 1
+            self._save_snapshot()
+            
+            changed_ids = [f"{kind}:{key}" for kind, key in changes]
+            print(f"🔄 Knowledge base reloaded ({len(changed_ids)} entries changed) in {(time.perf_counter() - started) * 1000:.1f}ms: {', '.join(changed_ids)}")
+            return changed_ids
+    
+    def _watch(self) -> None:
+        """Poll the data directory for changes"""
+        while True:
+            time.sleep(self.watch_interval_seconds)
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"❌ Knowledge base watcher error: {e}")
+    
+    def mark_changed(self) -> None:
+        """Signal that the in-memory knowledge base content has changed and rebuild the indexes"""
+        with self._reload_lock:
+            state = self._state
+            self._state = KnowledgeState(state.crop_database, state.pest_database, state.general_knowledge)
+            self.version += 1
+    
+    def _snapshot_prefix(self) -> str:
+        """File name prefix shared by every snapshot of this data directory"""
+        return f"kb_snapshot_{hashlib.sha1(os.path.abspath(self.data_dir).encode('utf-8')).hexdigest()[:8]}_"
+    
+    def _snapshot_path(self) -> str:
+        """Snapshot file keyed by the knowledge files and the code that renders them"""
+        digest = hashlib.sha1(f"{SNAPSHOT_FORMAT}|{os.path.abspath(self.data_dir)}".encode("utf-8"))
+        for rel_path, (mtime_ns, size) in self._file_stats.items():
+            digest.update(f"{rel_path}|{mtime_ns}|{size}\n".encode("utf-8"))
+        services_dir = os.path.dirname(__file__)
+        for module in ("agriculture_kb.py", "kb_index.py", "kb_bm25.py", "kb_snippets.py"):
+            digest.update(str(os.stat(os.path.join(services_dir, module)).st_mtime_ns).encode("utf-8"))
+        return os.path.join(self.cache_dir, f"{self._snapshot_prefix()}{digest.hexdigest()[:16]}.pkl")
+    
+    def _load_snapshot(self) -> Optional[KnowledgeState]:
+        """Load the pickled snapshot for the current files, skipping JSON parsing and index building"""
+        if not self.snapshot_enabled:
+            return None
+        path = self._snapshot_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            print(f"✅ Knowledge base loaded from snapshot {path}")
+            return state
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable knowledge base snapshot {path}: {e}")
+            return None
+    
+    def _save_snapshot(self) -> None:
+        if not self.snapshot_enabled or self._invalid_files:
+            return
+        path = self._snapshot_path()
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temp file first so concurrent workers never read a partial snapshot
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self._state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write knowledge base snapshot: {e}")
+            return
+        # One snapshot per reload would pile up; keep only the current one for this data directory
+        prefix = self._snapshot_prefix()
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith(".pkl") and os.path.join(self.cache_dir, name) != path:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+    
+    def retrieve(self, user_message: str, max_results: int = 5, mode: str = None) -> RetrievalResult:
+        """Run retrieval once and return everything downstream steps need"""
+        mode = mode or self.retrieval_mode
+        # Read the snapshot once so a concurrent reload cannot mix two versions
+        state = self._state
+        matches = state.index.match(user_message)
+        if mode == "bm25":
+            entries = self._rank_bm25(state, user_message, max_results)
+        elif mode == "semantic":
+            entries = self._rank_semantic(state, user_message, max_results)
+        else:
+            entries = self._rank_keyword(state, matches, max_results)
+        return self._result(state, user_message, mode, entries, matches)
+    
+    def retrieve_batch(self, queries: List[str], max_results: int = 5, mode: str = None, chunk_size: int = 1024) -> List[RetrievalResult]:
+        """Retrieve for many queries at once, in input order
+        
+        The whole batch reads one snapshot, duplicate queries are scored once, and
+        bm25/semantic scoring runs as one vectorized pass per chunk of queries.
+        """
+        mode = mode or self.retrieval_mode
+        state = self._state
+        unique = list(dict.fromkeys(queries))
+        by_query: Dict[str, RetrievalResult] = {}
+        for start in range(0, len(unique), chunk_size):
+            chunk = unique[start:start + chunk_size]
+            if mode == "bm25":
+                ranked = state.bm25.top_k_batch(chunk, max_results)
+            elif mode == "semantic":
+                ranked = state.semantic.top_k_batch(chunk, max_results)
+            else:
+                ranked = None
+            for i, query in enumerate(chunk):
+                matches = state.index.match(query)
+                if ranked is None:
+                    entries = self._rank_keyword(state, matches, max_results)
+                else:
+                    entries = [(f"{p.kind}:{p.key}", p.rendered, score) for p, score in ranked[i]]
+                by_query[query] = self._result(state, query, mode, entries, matches)
+        return [by_query[query] for query in queries]
+    
+    @staticmethod
+    def _result(state: KnowledgeState, query: str, mode: str, entries: List[Tuple[str, str, float]], matches: Dict[str, List[str]]) -> RetrievalResult:
+        return RetrievalResult(
+            query=query,
+            mode=mode,
+            entries=tuple(entries),
+            context="\n\n".join(rendered for _, rendered, _ in entries),
+            crops=tuple(matches["crops"]),
+            pests=tuple(matches["pests"]),
+            topics=tuple(matches["topics"]),
+            snippets=state.snippets
+        )
+    
+    def retrieve_relevant_info(self, user_message: str, max_results: int = 5, mode: str = None) -> str:
+        """Retrieve relevant agriculture information for RAG"""
+        return self.retrieve(user_message, max_results, mode).context
+    
+    def rank(self, user_message: str, max_results: int = 5, mode: str = None) -> List[Tuple[str, str]]:
+        """Ranked (entry_id, rendered_text) pairs, e.g. ("pest:tomato_early_blight", "Disease: ...")"""
+        return [(entry_id, rendered) for entry_id, rendered, _ in self.retrieve(user_message, max_results, mode).entries]
+    
+    def _rank_semantic(self, state: KnowledgeState, user_message: str, max_results: int) -> List[Tuple[str, str, float]]:
+        """Top passages by cosine similarity of hashed character n-grams"""
+        return [
+            (f"{passage.kind}:{passage.key}", passage.rendered, score)
+            for passage, score in state.semantic.top_k(user_message, max_results)
+        ]
+    
+    def _rank_bm25(self, state: KnowledgeState, user_message: str, max_results: int) -> List[Tuple[str, str, float]]:
+        """Top passages by BM25 score"""
+        return [
+            (f"{passage.kind}:{passage.key}", passage.rendered, score)
+            for passage, score in state.bm25.top_k(user_message, max_results)
+        ]
+    
+    def _rank_keyword(self, state: KnowledgeState, matches: Dict[str, List[str]], max_results: int) -> List[Tuple[str, str, float]]:
+        """Keyword matches in knowledge-base order: crops, then pests, then topics"""
+        context = state.snippets.context
+        relevant_info = [(f"crop:{key}", context[f"crop:{key}"], 1.0) for key in matches["crops"]]
+        relevant_info += [(f"pest:{key}", context[f"pest:{key}"], 1.0) for key in matches["pests"]]
         
-        for topic, keywords in topic_keywords.items():
-            if any(keyword in user_lower for keyword in keywords):
-                if topic in self.general_knowledge:
-                    for fact in self.general_knowledge[topic][:2]:
-                        relevant_info.append(f"{topic.replace('_', ' ').title()}: {fact}")
-                    if len(relevant_info) >= max_results:
-                        break
+        # General topics contribute their first two facts each
+        for topic in matches["topics"]:
+            if len(relevant_info) >= max_results:
+                break
+            for i in range(min(2, len(state.general_knowledge[topic]))):
+                relevant_info.append((f"topic:{topic}", context[f"topic:{topic}:{i}"], 1.0))
         
-        return "\n\n".join(relevant_info[:max_results]) if relevant_info else ""
+        return relevant_info[:max_results]
 
 # Global instance
-agriculture_kb = AgricultureKnowledgeBase()
+with startup_report.phase("build agriculture knowledge base", kind="model_load"):
+    agriculture_kb = AgricultureKnowledgeBase()
 
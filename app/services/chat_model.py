@@ -0,0 +1,176 @@
+"""
+CPU-optimized loading of the local chat model (DialoGPT)
+
+Settings come from environment variables:
+    CHATBOT_MODEL_NAME            Hugging Face model id or local path (default microsoft/DialoGPT-medium)
+    CHATBOT_DEVICE                "cpu" (default) or "cuda"
+    CHATBOT_QUANTIZE              "int8" for dynamic int8 quantization of linear layers, "none" to disable
+    CHATBOT_DTYPE                 "fp32" (default) or "bf16"; ignored when int8 quantization is on
+    CHATBOT_TORCH_THREADS         torch intra-op threads (default: torch's choice)
+    CHATBOT_TORCH_INTEROP_THREADS torch inter-op threads (default: torch's choice)
+    CHATBOT_SELF_BENCHMARK        "1" to log tokens/sec for the selected config at startup
+
+tests/test_chat_model.py checks the int8 and bf16 paths offline on a tiny GPT-2.
+"""
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+import os
+import time
+
+import torch
+
+
+@dataclass
+class ChatModelConfig:
+    """Runtime settings for the local chat model"""
+    model_name: str = "microsoft/DialoGPT-medium"
+    device: str = "cpu"
+    quantize: str = "int8"
+    dtype: str = "fp32"
+    intra_op_threads: Optional[int] = None
+    inter_op_threads: Optional[int] = None
+    self_benchmark: bool = False
+
+    @classmethod
+    def from_env(cls) -> "ChatModelConfig":
+        def optional_int(name: str) -> Optional[int]:
+            value = os.getenv(name)
+            return int(value) if value else None
+
+        return cls(
+            model_name=os.getenv("CHATBOT_MODEL_NAME", cls.model_name),
+            device=os.getenv("CHATBOT_DEVICE", cls.device).lower(),
+            quantize=os.getenv("CHATBOT_QUANTIZE", cls.quantize).lower(),
+            dtype=os.getenv("CHATBOT_DTYPE", cls.dtype).lower(),
+            intra_op_threads=optional_int("CHATBOT_TORCH_THREADS"),
+            inter_op_threads=optional_int("CHATBOT_TORCH_INTEROP_THREADS"),
+            self_benchmark=os.getenv("CHATBOT_SELF_BENCHMARK", "0").lower() in ("1", "true", "yes")
+        )
+
+
+def configure_threads(config: ChatModelConfig) -> None:
+    """Apply torch thread settings (inter-op can only be set once per process)"""
+    if config.intra_op_threads:
+        torch.set_num_threads(config.intra_op_threads)
+    if config.inter_op_threads:
+        try:
+            torch.set_num_interop_threads(config.inter_op_threads)
+        except RuntimeError as e:
+            print(f"⚠️  Could not set inter-op threads: {e}")
+
+
+def _conv1d_to_linear(model: torch.nn.Module) -> torch.nn.Module:
+    """Swap GPT-2 style Conv1D layers for equivalent nn.Linear so dynamic quantization covers them
+
+    GPT-2/DialoGPT implement attention and MLP projections with transformers' Conv1D,
+    which stores the weight transposed; quantize_dynamic only recognizes nn.Linear.
+    """
+    from transformers.pytorch_utils import Conv1D
+
+    for name, child in model.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight = torch.nn.Parameter(child.weight.data.t().contiguous())
+            linear.bias = torch.nn.Parameter(child.bias.data.clone())
+            setattr(model, name, linear)
+        else:
+            _conv1d_to_linear(child)
+    return model
+
+
+def optimize_for_cpu(model: torch.nn.Module, config: ChatModelConfig) -> torch.nn.Module:
+    """Apply int8 dynamic quantization or bf16 casting for CPU inference"""
+    model.eval()
+
+    if config.device != "cpu":
+        return model
+
+    if config.quantize == "int8":
+        # Tied embedding/lm_head weights must be untied before the head is quantized
+        if hasattr(model, "lm_head") and hasattr(model, "get_input_embeddings"):
+            embeddings = model.get_input_embeddings()
+            if model.lm_head.weight is embeddings.weight:
+                model.lm_head.weight = torch.nn.Parameter(embeddings.weight.detach().clone())
+        model = _conv1d_to_linear(model)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif config.quantize not in ("", "none"):
+        raise ValueError(f"Invalid CHATBOT_QUANTIZE: {config.quantize}. Must be one of: int8, none")
+    elif config.dtype == "bf16":
+        model = model.to(torch.bfloat16)
+    elif config.dtype != "fp32":
+        raise ValueError(f"Invalid CHATBOT_DTYPE: {config.dtype}. Must be one of: fp32, bf16")
+
+    return model
+
+
+def model_size_bytes(model: torch.nn.Module) -> int:
+    """Approximate bytes held by parameters, buffers and packed quantized weights"""
+    total = sum(t.numel() * t.element_size() for t in model.parameters())
+    total += sum(t.numel() * t.element_size() for t in model.buffers())
+    for module in model.modules():
+        packed = getattr(module, "_packed_params", None)
+        if hasattr(packed, "_weight_bias"):
+            weight, _ = packed._weight_bias()
+            total += weight.numel() * weight.element_size()
+    return total
+
+
+def benchmark_generation(model: torch.nn.Module, input_ids: torch.Tensor, new_tokens: int = 32, eos_token_id: Optional[int] = None) -> Dict[str, Any]:
+    """Greedy-generate a fixed number of tokens and report throughput"""
+    with torch.no_grad():
+        # Warm up kernels and allocator
+        model.generate(input_ids, max_new_tokens=2, min_new_tokens=2, do_sample=False, pad_token_id=eos_token_id)
+        started = time.perf_counter()
+        output = model.generate(
+            input_ids,
+            max_new_tokens=new_tokens,
+            min_new_tokens=new_tokens,
+            do_sample=False,
+            pad_token_id=eos_token_id
+        )
+        elapsed = time.perf_counter() - started
+
+    generated = output.shape[1] - input_ids.shape[1]
+    return {
+        "tokens": generated,
+        "seconds": round(elapsed, 4),
+        "tokens_per_second": round(generated / elapsed, 2) if elapsed > 0 else None,
+        "ms_per_token": round(elapsed * 1000 / generated, 2) if generated else None
+    }
+
+
+def describe(config: ChatModelConfig) -> str:
+    """Short label of the active device/precision/thread configuration"""
+    precision = "int8-dynamic" if config.device == "cpu" and config.quantize == "int8" else config.dtype
+    return f"{config.device}/{precision}/threads={torch.get_num_threads()}"
+
+
+def load_chat_model(config: ChatModelConfig):
+    """Load tokenizer and model, apply CPU optimizations and optionally self-benchmark"""
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    configure_threads(config)
+
+    tokenizer = AutoTokenizer.from_pretrained(config.model_name)
+    tokenizer.pad_token = tokenizer.eos_token
+
+    model = AutoModelForCausalLM.from_pretrained(config.model_name)
+    fp32_bytes = model_size_bytes(model)
+    device = torch.device(config.device)
+    model = optimize_for_cpu(model.to(device), config)
+    print(
+        f"📦 Chat model {config.model_name} [{describe(config)}]: "
+        f"{fp32_bytes / 1e6:.0f} MB fp32 -> {model_size_bytes(model) / 1e6:.0f} MB"
+    )
+
+    if config.self_benchmark:
+        from app.services.startup import startup_report
+
+        input_ids = tokenizer.encode("User: What fertilizer should I use for wheat?\nBot:", return_tensors="pt").to(device)
+        with startup_report.phase(f"warmup {config.model_name}", kind="warmup"):
+            result = benchmark_generation(model, input_ids, eos_token_id=tokenizer.eos_token_id)
+        print(f"⏱️  Chat model self-benchmark [{describe(config)}]: {result['tokens_per_second']} tokens/sec, {result['ms_per_token']} ms/token")
+
+    return tokenizer, model, device
+
@@ -1,9 +1,11 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
-import torch
 from typing import List, Tuple, Optional
 import re
 import os
-from app.services.agriculture_kb import agriculture_kb
+import time
+from app.services.agriculture_kb import agriculture_kb, RetrievalResult
+from app.services.metrics import stage_timer
+from app.services.startup import startup_report
+from app.services.response_cache import create_response_cache_from_env
 
 class ChatbotService:
     def __init__(self):
@@ -13,32 +15,29 @@ class ChatbotService:
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.use_openai = self.openai_api_key is not None
         
+        # Agriculture knowledge base for RAG
+        self.agriculture_kb = agriculture_kb
+        
+        # Legacy agriculture_qa for backward compatibility
+        self.agriculture_qa = self._load_agriculture_kb()
+        
         try:
             if not self.use_openai:
-                # Using DialoGPT-medium for local inference
-                self.model_name = "microsoft/DialoGPT-medium"
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
-                
-                # Add special tokens
-                self.tokenizer.pad_token = self.tokenizer.eos_token
+                # Using DialoGPT-medium for local inference (int8 + tuned threads on CPU)
+                # torch/transformers are only imported when the local model is used
+                with startup_report.phase("import torch + transformers"):
+                    from app.services.chat_model import ChatModelConfig, load_chat_model
+                self.model_config = ChatModelConfig.from_env()
+                self.model_name = self.model_config.model_name
+                with startup_report.phase(f"load {self.model_name}", kind="model_load"):
+                    self.tokenizer, self.model, self.device = load_chat_model(self.model_config)
                 
-                # Set device
-                self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-                self.model = self.model.to(self.device)
-                
-                print("✅ Chatbot AI Model (DialoGPT-medium) loaded!")
+                print(f"✅ Chatbot AI Model ({self.model_name}) loaded!")
             else:
                 print("✅ OpenAI API configured - will use GPT for better responses!")
                 self.model = None
                 self.tokenizer = None
             
-            # Agriculture knowledge base for RAG
-            self.agriculture_kb = agriculture_kb
-            
-            # Legacy agriculture_qa for backward compatibility
-            self.agriculture_qa = self._load_agriculture_kb()
-            
             self.model_loaded = True
             
         except Exception as e:
@@ -46,6 +45,9 @@ class ChatbotService:
             print("⚠️  Falling back to knowledge base only mode")
             self.model_loaded = False
             self.use_openai = False
+        
+        # Answer cache for repeated questions (None when disabled)
+        self.response_cache = create_response_cache_from_env()
     
     def _load_agriculture_kb(self) -> dict:
         """Load agriculture knowledge base for context"""
@@ -104,14 +106,14 @@ class ChatbotService:
         
         return None, 0.0
     
-    def _get_agriculture_context(self, user_message: str) -> str:
-        """Get agriculture context using RAG (Retrieval Augmented Generation)"""
-        # Use the comprehensive knowledge base for better context
-        retrieved_info = self.agriculture_kb.retrieve_relevant_info(user_message, max_results=3)
-        return retrieved_info
+    def _retrieve(self, user_message: str) -> RetrievalResult:
+        """Get agriculture context using RAG (Retrieval Augmented Generation) - once per request"""
+        with stage_timer("kb_retrieval"):
+            return self.agriculture_kb.retrieve(user_message, max_results=3)
     
-    def _generate_ai_response_openai(self, user_message: str, conversation_history: List[dict], agri_context: str) -> Tuple[str, bool]:
+    def _generate_ai_response_openai(self, user_message: str, conversation_history: List[dict], retrieval: RetrievalResult) -> Tuple[str, bool]:
         """Generate AI response using OpenAI API (better quality)"""
+        agri_context = retrieval.context
         try:
             import openai
             
@@ -141,38 +143,37 @@ class ChatbotService:
             
             # Call OpenAI API
             client = openai.OpenAI(api_key=self.openai_api_key)
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",  # or "gpt-4" for better quality
-                messages=messages,
-                temperature=0.7,
-                max_tokens=300
-            )
+            with stage_timer("openai_call"):
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",  # or "gpt-4" for better quality
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=300
+                )
             
             ai_response = response.choices[0].message.content.strip()
             return ai_response, True
             
         except ImportError:
             print("⚠️  OpenAI library not installed. Install with: pip install openai")
-            return self._get_fallback_response(user_message), False
+            return self._get_fallback_response(user_message, retrieval), False
         except Exception as e:
             print(f"❌ Error calling OpenAI API: {e}")
-            return self._get_fallback_response(user_message), False
+            return self._get_fallback_response(user_message, retrieval), False
     
-    def _generate_ai_response(self, user_message: str, conversation_history: List[dict]) -> Tuple[str, bool]:
+    def _generate_ai_response(self, user_message: str, conversation_history: List[dict], retrieval: RetrievalResult) -> Tuple[str, bool]:
         """Generate AI response using DialoGPT or OpenAI with RAG-enhanced agriculture context
         Returns: (response, is_ai_generated) where is_ai_generated is True if AI succeeded
         """
+        agri_context = retrieval.context
         try:
-            # Get agriculture context using RAG
-            agri_context = self._get_agriculture_context(user_message)
-            
             # Use OpenAI if available (better quality)
             if self.use_openai and self.openai_api_key:
-                return self._generate_ai_response_openai(user_message, conversation_history, agri_context)
+                return self._generate_ai_response_openai(user_message, conversation_history, retrieval)
             
             # Fall back to DialoGPT for local inference
             if not self.model or not self.tokenizer:
-                fallback = self._get_fallback_response(user_message)
+                fallback = self._get_fallback_response(user_message, retrieval)
                 return fallback, False
             
             # Build conversation context
@@ -196,15 +197,17 @@ Based on this information, provide helpful, practical advice to the farmer."""
             full_input = f"{context_prompt}\n\n{conversation_text}User: {user_message}\nBot:"
             
             # Tokenize
-            input_ids = self.tokenizer.encode(
-                full_input,
-                return_tensors='pt',
-                max_length=512,
-                truncation=True
-            ).to(self.device)
+            with stage_timer("tokenization"):
+                input_ids = self.tokenizer.encode(
+                    full_input,
+                    return_tensors='pt',
+                    max_length=512,
+                    truncation=True
+                ).to(self.device)
             
             # Generate response
-            with torch.no_grad():
+            import torch
+            with torch.no_grad(), stage_timer("generation"):
                 output = self.model.generate(
                     input_ids,
                     max_length=input_ids.shape[1] + 100,  # Generate up to 100 new tokens
@@ -239,7 +242,7 @@ Based on this information, provide helpful, practical advice to the farmer."""
             
             # If response is too short, empty, or similar to input, use fallback
             if len(response) < 10 or response.lower() == user_message.lower() or not response:
-                fallback = self._get_fallback_response(user_message)
+                fallback = self._get_fallback_response(user_message, retrieval)
                 return fallback, False
             
             # Limit response length
@@ -252,50 +255,23 @@ Based on this information, provide helpful, practical advice to the farmer."""
             print(f"❌ Error generating AI response: {e}")
             import traceback
             traceback.print_exc()
-            fallback = self._get_fallback_response(user_message)
+            fallback = self._get_fallback_response(user_message, retrieval)
             return fallback, False
     
-    def _get_fallback_response(self, user_message: str) -> str:
-        """Fallback response using RAG knowledge base"""
-        # Use RAG to get relevant agriculture information
-        agri_info = self._get_agriculture_context(user_message)
+    def _get_fallback_response(self, user_message: str, retrieval: RetrievalResult) -> str:
+        """Fallback response using the request's RAG retrieval result (no further KB scans)"""
+        agri_info = retrieval.context
         
         if agri_info:
-            # Format the retrieved information as a helpful response
-            user_lower = user_message.lower()
+            fallback_snippets = (retrieval.snippets or self.agriculture_kb.snippets).fallback
             
-            # Check for specific crop questions
-            for crop_key, crop_data in self.agriculture_kb.crop_database.items():
-                if crop_key in user_lower or crop_data["name"].lower() in user_lower:
-                    response = f"Here's information about growing {crop_data['name']}:\n\n"
-                    response += f"**Season:** {crop_data['season']} (Cycle: {crop_data['cycle_length']} days)\n"
-                    response += f"**Soil:** pH {crop_data['soil']['ph_min']}-{crop_data['soil']['ph_max']}, {', '.join(crop_data['soil']['type'])}\n"
-                    response += f"**Water:** {crop_data['water']['requirement']} - {crop_data['water']['irrigation_cycle']}\n"
-                    response += f"**Expected Yield:** {crop_data['yield']}\n\n"
-                    response += f"**Key Practices:**\n"
-                    for practice in crop_data['practices'][:4]:
-                        response += f"• {practice}\n"
-                    if 'fertilizer' in crop_data:
-                        response += f"\n**Fertilizer Schedule:**\n"
-                        for fert in crop_data['fertilizer'][:3]:
-                            response += f"• {fert['stage']}: {fert['type']} {fert['quantity']}\n"
-                    return response
+            # Specific crop questions
+            if retrieval.crops:
+                return fallback_snippets[f"crop:{retrieval.crops[0]}"]
             
-            # Check for pest/disease questions
-            if any(word in user_lower for word in ["disease", "pest", "infection", "blight"]):
-                for pest_key, pest_data in self.agriculture_kb.pest_database.items():
-                    if pest_data["crop"].lower() in user_lower or any(word in pest_key for word in user_lower.split()):
-                        response = f"**{pest_key.replace('_', ' ').title()}** ({pest_data['crop']})\n\n"
-                        response += f"{pest_data['summary']}\n\n"
-                        if 'treatment' in pest_data:
-                            response += f"**Treatment:**\n"
-                            for treatment in pest_data['treatment'][:2]:
-                                response += f"• {treatment}\n"
-                        if 'prevention' in pest_data:
-                            response += f"\n**Prevention:**\n"
-                            for prevention in pest_data['prevention'][:2]:
-                                response += f"• {prevention}\n"
-                        return response
+            # Pest/disease questions
+            if retrieval.pests:
+                return fallback_snippets[f"pest:{retrieval.pests[0]}"]
             
             # Use retrieved info as context
             return f"Based on agriculture best practices:\n\n{agri_info}\n\nWould you like more specific information about any aspect?"
@@ -318,45 +294,83 @@ Based on this information, provide helpful, practical advice to the farmer."""
         conversation_history: List[dict] = None
     ) -> dict:
         """Get chatbot response - ALWAYS use AI first, RAG knowledge base as fallback"""
+        if not conversation_history:
+            conversation_history = []
+        
+        # Retrieve once; generation, fallback and the cache key all share this result
+        retrieval = self._retrieve(user_message)
+        
+        cache_key = None
+        if self.response_cache is not None:
+            self.response_cache.check_kb_version(self.agriculture_kb.version)
+            cache_key = self.response_cache.make_key(user_message, retrieval.context)
+            # LLM answers depend on the conversation, so only reuse them for fresh conversations
+            cached = self.response_cache.get(cache_key, allow_ai_generated=not conversation_history)
+            if cached is not None:
+                return {**cached, "user_message": user_message}
+        
+        started = time.perf_counter()
+        
         if not self.model_loaded:
             # If model not loaded, use RAG-enhanced knowledge base
-            fallback_response = self._get_fallback_response(user_message)
-            return {
+            fallback_response = self._get_fallback_response(user_message, retrieval)
+            result = {
                 "success": True,
                 "user_message": user_message,
                 "bot_response": fallback_response,
                 "confidence": 0.7
             }
-        
-        if not conversation_history:
-            conversation_history = []
+            self._cache_response(cache_key, result, False, retrieval.context, conversation_history, started)
+            return result
         
         try:
             # ALWAYS try AI first for natural, contextual responses
-            response, is_ai_generated = self._generate_ai_response(user_message, conversation_history)
+            response, is_ai_generated = self._generate_ai_response(user_message, conversation_history, retrieval)
             
             # Set confidence based on whether AI generated the response
             confidence = 0.85 if is_ai_generated else 0.7
             
-            return {
+            result = {
                 "success": True,
                 "user_message": user_message,
                 "bot_response": response,
                 "confidence": confidence
             }
+            self._cache_response(cache_key, result, is_ai_generated, retrieval.context, conversation_history, started)
+            return result
             
         except Exception as e:
             print(f"❌ Error in get_response: {e}")
             import traceback
             traceback.print_exc()
             # Fallback to RAG-enhanced knowledge base on error
-            fallback_response = self._get_fallback_response(user_message)
+            fallback_response = self._get_fallback_response(user_message, retrieval)
             return {
                 "success": True,
                 "user_message": user_message,
                 "bot_response": fallback_response,
                 "confidence": 0.7
             }
+    
+    def _cache_response(
+        self,
+        cache_key: Optional[str],
+        result: dict,
+        is_ai_generated: bool,
+        agri_context: str,
+        conversation_history: List[dict],
+        started: float
+    ) -> None:
+        """Store a computed answer in the response cache when it is safe to reuse"""
+        if cache_key is None:
+            return
+        # Generic replies without KB context are picked at random - not worth pinning
+        if not is_ai_generated and not agri_context:
+            return
+        # LLM answers generated mid-conversation depend on the history
+        if is_ai_generated and conversation_history:
+            return
+        self.response_cache.put(cache_key, result, is_ai_generated, time.perf_counter() - started)
 
 # Initialize chatbot service
 chatbot_service = ChatbotService()
\ No newline at end of file
@@ -0,0 +1,453 @@
+"""
+Conversation stores for the chatbot: bounded in-memory and durable SQLite
+"""
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Tuple
+import atexit
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+
+def _turn_size(turn: Dict[str, Any]) -> int:
+    """Approximate bytes held by one turn (string payloads only)"""
+    return sum(len(value.encode("utf-8")) for value in turn.values() if isinstance(value, str))
+
+
+class _UserConversation:
+    """Ring buffer of one user's turns plus bookkeeping"""
+
+    __slots__ = ("turns", "sizes", "bytes", "last_access", "next_seq")
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.sizes = deque(maxlen=max_turns)
+        self.bytes = 0
+        self.last_access = time.monotonic()
+        # Sequence number of the next appended turn, used as pagination cursor
+        self.next_seq = 1
+
+
+class InMemoryConversationStore:
+    """Per-user ring buffers with LRU/TTL eviction of idle users and a global memory cap"""
+
+    def __init__(
+        self,
+        max_turns: int = 50,
+        max_users: int = 10000,
+        idle_ttl_seconds: float = 24 * 3600,
+        max_bytes: int = 64 * 1024 * 1024
+    ):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_bytes = max_bytes
+        # Least recently used user first
+        self._users: "OrderedDict[str, _UserConversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_turns = 0
+        self._total_bytes = 0
+        self.evicted_users = 0
+
+    def get(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return a user's turns, oldest first (only the last `limit` if given)"""
+        with self._lock:
+            convo = self._touch(user_id)
+            if convo is None:
+                return []
+            if limit is None or limit >= len(convo.turns):
+                return list(convo.turns)
+            return list(itertools.islice(convo.turns, len(convo.turns) - limit, None))
+
+    def page(self, user_id: str, cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return up to `limit` turns after `cursor`, oldest first, and the next cursor"""
+        with self._lock:
+            convo = self._touch(user_id)
+            if convo is None:
+                return [], None
+            first_seq = convo.next_seq - len(convo.turns)
+            start = 0 if cursor is None else max(0, cursor + 1 - first_seq)
+            turns = list(itertools.islice(convo.turns, start, start + limit))
+            end = start + len(turns)
+            next_cursor = first_seq + end - 1 if turns and end < len(convo.turns) else None
+            return turns, next_cursor
+
+    def count(self, user_id: str) -> int:
+        """Number of turns held for a user"""
+        with self._lock:
+            convo = self._touch(user_id)
+            return len(convo.turns) if convo is not None else 0
+
+    def append(self, user_id: str, turn: Dict[str, Any]) -> None:
+        """Append one turn in O(1); the oldest turn drops off once the buffer is full"""
+        size = _turn_size(turn)
+        with self._lock:
+            convo = self._touch(user_id)
+            if convo is None:
+                convo = _UserConversation(self.max_turns)
+                self._users[user_id] = convo
+
+            if len(convo.turns) == convo.turns.maxlen:
+                dropped = convo.sizes[0]
+                convo.bytes -= dropped
+                self._total_bytes -= dropped
+                self._total_turns -= 1
+
+            convo.turns.append(turn)
+            convo.sizes.append(size)
+            convo.next_seq += 1
+            convo.bytes += size
+            self._total_bytes += size
+            self._total_turns += 1
+
+            self._evict(keep=user_id)
+
+    def clear(self, user_id: str) -> bool:
+        """Drop a user's conversation. Returns False if there was none."""
+        with self._lock:
+            convo = self._users.pop(user_id, None)
+            if convo is None:
+                return False
+            self._forget(convo)
+            return True
+
+    def __contains__(self, user_id: str) -> bool:
+        with self._lock:
+            return self._touch(user_id) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        """Users, turns and bytes currently held"""
+        with self._lock:
+            self._expire_idle()
+            return {
+                "backend": "memory",
+                "users": len(self._users),
+                "turns": self._total_turns,
+                "bytes": self._total_bytes,
+                "max_turns_per_user": self.max_turns,
+                "max_users": self.max_users,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "evicted_users": self.evicted_users
+            }
+
+    def _touch(self, user_id: str) -> Optional[_UserConversation]:
+        """Look up a user, expiring it if idle, and mark it most recently used"""
+        convo = self._users.get(user_id)
+        if convo is None:
+            return None
+        now = time.monotonic()
+        if now - convo.last_access > self.idle_ttl_seconds:
+            del self._users[user_id]
+            self._forget(convo)
+            self.evicted_users += 1
+            return None
+        convo.last_access = now
+        self._users.move_to_end(user_id)
+        return convo
+
+    def _forget(self, convo: _UserConversation) -> None:
+        self._total_turns -= len(convo.turns)
+        self._total_bytes -= convo.bytes
+
+    def _expire_idle(self) -> None:
+        """Drop idle users from the LRU end; stops at the first non-idle user"""
+        now = time.monotonic()
+        while self._users:
+            user_id, convo = next(iter(self._users.items()))
+            if now - convo.last_access <= self.idle_ttl_seconds:
+                break
+            del self._users[user_id]
+            self._forget(convo)
+            self.evicted_users += 1
+
+    def _evict(self, keep: str) -> None:
+        """Enforce idle TTL, user count and global byte cap, oldest users first"""
+        self._expire_idle()
+        while self._users and (len(self._users) > self.max_users or self._total_bytes > self.max_bytes):
+            user_id, convo = next(iter(self._users.items()))
+            if user_id == keep:
+                # Never evict the active user; trim its own history instead
+                if len(self._users) == 1:
+                    while convo.turns and self._total_bytes > self.max_bytes and len(convo.turns) > 1:
+                        convo.turns.popleft()
+                        dropped = convo.sizes.popleft()
+                        convo.bytes -= dropped
+                        self._total_bytes -= dropped
+                        self._total_turns -= 1
+                    break
+                self._users.move_to_end(user_id)
+                continue
+            del self._users[user_id]
+            self._forget(convo)
+            self.evicted_users += 1
+
+
+class SQLiteConversationStore:
+    """Durable conversation history in SQLite (WAL) with write-behind batching
+
+    Appends go to an in-memory buffer and a hot cache of each user's last turns;
+    a background thread writes the buffer in one transaction when the flush
+    interval elapses or the batch size is reached, so chat responses never wait
+    on disk. Other workers see new turns once they are flushed.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "conversations.db",
+        flush_interval_seconds: float = 1.0,
+        flush_batch_size: int = 100,
+        cache_turns: int = 20,
+        cache_users: int = 1000,
+        cache_ttl_seconds: float = 5.0
+    ):
+        self.db_path = db_path
+        self.flush_interval_seconds = flush_interval_seconds
+        self.flush_batch_size = flush_batch_size
+        self.cache_turns = cache_turns
+        self.cache_users = cache_users
+        self.cache_ttl_seconds = cache_ttl_seconds
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only syncs at checkpoints instead of on every commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                user_message TEXT NOT NULL,
+                bot_response TEXT NOT NULL,
+                timestamp TEXT
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversation_turns_user ON conversation_turns (user_id, id)"
+        )
+
+        # _lock guards the in-memory buffer and cache; _db_lock serializes the connection
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._pending: List[Tuple[str, Dict[str, Any]]] = []
+        # user_id -> (loaded_at, deque of recent turns)
+        self._cache: "OrderedDict[str, Tuple[float, deque]]" = OrderedDict()
+
+        self.flushes = 0
+        self.flushed_turns = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="conversation-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def get(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return a user's turns, oldest first (only the last `limit` if given)"""
+        if limit is not None and limit <= self.cache_turns:
+            with self._lock:
+                cached = self._cached_turns(user_id)
+                if cached is not None:
+                    self.cache_hits += 1
+                    return list(cached)[-limit:] if limit < len(cached) else list(cached)
+            self.cache_misses += 1
+
+        # Always read enough to fill the hot cache for later short reads
+        read_limit = None if limit is None else max(limit, self.cache_turns)
+        turns = self._read_tail(user_id, read_limit)
+        return turns[-limit:] if limit is not None else turns
+
+    def append(self, user_id: str, turn: Dict[str, Any]) -> None:
+        """Buffer a turn for the background writer; never touches disk"""
+        with self._lock:
+            cached = self._cached_turns(user_id)
+            if cached is not None:
+                cached.append(turn)
+            self._pending.append((user_id, turn))
+            should_flush = len(self._pending) >= self.flush_batch_size
+        if should_flush:
+            self._wakeup.set()
+
+    def page(self, user_id: str, cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return up to `limit` turns after `cursor`, oldest first, and the next cursor"""
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT id, user_message, bot_response, timestamp FROM conversation_turns "
+                "WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (user_id, cursor or 0, limit + 1)
+            ).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = rows[-1][0] if has_more else None
+        return [self._row_to_turn(row) for row in rows], next_cursor
+
+    @property
+    def pending_turns(self) -> int:
+        """Turns buffered for the background writer"""
+        return len(self._pending)
+
+    def count(self, user_id: str) -> int:
+        """Number of turns stored for a user"""
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM conversation_turns WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+
+    def clear(self, user_id: str) -> bool:
+        """Delete a user's conversation. Returns False if there was none."""
+        with self._db_lock:
+            with self._lock:
+                pending_before = len(self._pending)
+                self._pending = [(uid, turn) for uid, turn in self._pending if uid != user_id]
+                had_pending = len(self._pending) != pending_before
+                self._cache.pop(user_id, None)
+            deleted = self._conn.execute(
+                "DELETE FROM conversation_turns WHERE user_id = ?", (user_id,)
+            ).rowcount
+        return deleted > 0 or had_pending
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.count(user_id) > 0
+
+    def flush(self) -> int:
+        """Write all buffered turns in a single transaction. Returns rows written."""
+        with self._db_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO conversation_turns (user_id, user_message, bot_response, timestamp) VALUES (?, ?, ?, ?)",
+                    [
+                        (uid, turn.get("user_message", ""), turn.get("bot_response", ""), turn.get("timestamp"))
+                        for uid, turn in batch
+                    ]
+                )
+            self.flushes += 1
+            self.flushed_turns += len(batch)
+            return len(batch)
+
+    def close(self) -> None:
+        """Stop the background writer and flush what is left"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self._flusher.join(timeout=self.flush_interval_seconds + 5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Users, turns and bytes stored plus write-behind and cache counters"""
+        self.flush()
+        with self._db_lock:
+            users, turns, size = self._conn.execute(
+                "SELECT COUNT(DISTINCT user_id), COUNT(*), "
+                "COALESCE(SUM(LENGTH(CAST(user_message AS BLOB)) + LENGTH(CAST(bot_response AS BLOB))), 0) "
+                "FROM conversation_turns"
+            ).fetchone()
+        with self._lock:
+            cached_users = len(self._cache)
+        return {
+            "backend": "sqlite",
+            "db_path": self.db_path,
+            "users": users,
+            "turns": turns,
+            "bytes": size,
+            "cached_users": cached_users,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "flushes": self.flushes,
+            "flushed_turns": self.flushed_turns,
+            "flush_interval_seconds": self.flush_interval_seconds,
+            "flush_batch_size": self.flush_batch_size
+        }
+
+    def _flush_loop(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Error flushing conversation history: {e}")
+
+    def _read_tail(self, user_id: str, limit: Optional[int]) -> List[Dict[str, Any]]:
+        """Read the last turns from disk merged with this worker's unflushed turns, and cache them"""
+        with self._db_lock:
+            if limit is None:
+                rows = self._conn.execute(
+                    "SELECT id, user_message, bot_response, timestamp FROM conversation_turns "
+                    "WHERE user_id = ? ORDER BY id", (user_id,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, user_message, bot_response, timestamp FROM conversation_turns "
+                    "WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit)
+                ).fetchall()
+                rows.reverse()
+            # Holding _db_lock keeps flush from moving pending turns to disk after the read.
+            # Snapshotting pending and filling the cache under the same _lock as append means
+            # a turn appended concurrently is either in the snapshot or added to the new cache.
+            with self._lock:
+                pending = [turn for uid, turn in self._pending if uid == user_id]
+                turns = [self._row_to_turn(row) for row in rows] + pending
+                self._cache_put(user_id, turns[-self.cache_turns:])
+        return turns[-limit:] if limit is not None else turns
+
+    def _cached_turns(self, user_id: str) -> Optional[deque]:
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        loaded_at, turns = entry
+        # Bounded staleness: other workers may have appended since we loaded
+        if time.monotonic() - loaded_at > self.cache_ttl_seconds:
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return turns
+
+    def _cache_put(self, user_id: str, turns: List[Dict[str, Any]]) -> None:
+        self._cache[user_id] = (time.monotonic(), deque(turns, maxlen=self.cache_turns))
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_users:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _row_to_turn(row: Tuple) -> Dict[str, Any]:
+        return {"user_message": row[1], "bot_response": row[2], "timestamp": row[3]}
+
+
+def create_conversation_store_from_env():
+    """Build the conversation store from CHATBOT_HISTORY_* environment variables"""
+    backend = os.getenv("CHATBOT_HISTORY_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteConversationStore(
+            db_path=os.getenv("CHATBOT_HISTORY_DB_PATH", "conversations.db"),
+            flush_interval_seconds=float(os.getenv("CHATBOT_HISTORY_FLUSH_INTERVAL_SECONDS", "1.0")),
+            flush_batch_size=int(os.getenv("CHATBOT_HISTORY_FLUSH_BATCH_SIZE", "100")),
+            cache_turns=int(os.getenv("CHATBOT_HISTORY_CACHE_TURNS", "20")),
+            cache_users=int(os.getenv("CHATBOT_HISTORY_CACHE_USERS", "1000")),
+            cache_ttl_seconds=float(os.getenv("CHATBOT_HISTORY_CACHE_TTL_SECONDS", "5"))
+        )
+    if backend != "memory":
+        raise ValueError(f"Invalid CHATBOT_HISTORY_BACKEND: {backend}. Must be one of: memory, sqlite")
+
+    return InMemoryConversationStore(
+        max_turns=int(os.getenv("CHATBOT_HISTORY_MAX_TURNS", "50")),
+        max_users=int(os.getenv("CHATBOT_HISTORY_MAX_USERS", "10000")),
+        idle_ttl_seconds=float(os.getenv("CHATBOT_HISTORY_IDLE_TTL_SECONDS", str(24 * 3600))),
+        max_bytes=int(os.getenv("CHATBOT_HISTORY_MAX_BYTES", str(64 * 1024 * 1024)))
+    )
@@ -0,0 +1,375 @@
+"""
+Asynchronous disease-detection jobs persisted in SQLite
+
+A job holds one or more uploaded images. Submitting a job stores the images and
+returns at once; a local pool of worker threads claims images highest priority
+first (oldest first within a priority) and stores each result as it finishes, so
+work survives a dropped client connection and results can be fetched later.
+
+An image is claimed with a lease. If the worker dies (or the process restarts)
+before finishing, the lease runs out and another worker retries the image, up to
+max_attempts. Images that cannot be decoded fail at once. Jobs and their results
+are deleted once they expire. The database is shared by all uvicorn workers,
+each of which runs its own pool.
+"""
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+import uuid
+
+from app.services.sqlite_pool import SQLiteConnectionPool
+
+JOB_STATUSES = ("queued", "running", "completed", "cancelled")
+ITEM_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+# classify(image bytes) -> result dict; raises ValueError for images that can never succeed
+Classifier = Callable[[bytes], Dict[str, Any]]
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+
+
+class DetectionJobQueue:
+    """SQLite-backed job store plus the worker threads that process it"""
+
+    def __init__(
+        self,
+        classify: Classifier,
+        db_path: str = "detection_jobs.db",
+        workers: int = 1,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        ttl_seconds: float = 24 * 3600,
+        poll_interval_seconds: float = 1.0
+    ):
+        self.classify = classify
+        self.db_path = db_path
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.ttl_seconds = ttl_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+
+        # Opened on first use, so importing the API never creates a database file
+        self._pool_instance: Optional[SQLiteConnectionPool] = None
+        self._open_lock = threading.Lock()
+
+        self._wakeup = threading.Condition()
+        # Bumped whenever a local worker finishes an image of the job, for long-polling
+        self._job_versions: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        self._next_cleanup = 0.0
+
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def _pool(self) -> SQLiteConnectionPool:
+        if self._pool_instance is None:
+            with self._open_lock:
+                if self._pool_instance is None:
+                    self._pool_instance = self._open()
+        return self._pool_instance
+
+    def _open(self) -> SQLiteConnectionPool:
+        """Create the database and its tables if needed"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        pool = SQLiteConnectionPool(self.db_path, size=max(2, self.workers + 1))
+        with pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS detection_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS detection_job_items (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    filename TEXT,
+                    image BLOB,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    result TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, idx)
+                )
+            """)
+            # Claim order for queued images, and lookup of expired leases
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_detection_job_items_queue "
+                "ON detection_job_items (status, priority DESC, created_at, idx)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_detection_job_items_lease ON detection_job_items (status, lease_until)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_detection_jobs_expiry ON detection_jobs (expires_at)")
+        return pool
+
+    def submit(self, images: List[Tuple[Optional[str], bytes]], priority: int = 0) -> Dict[str, Any]:
+        """Store a job of (filename, image bytes) and wake a worker; returns the queued job"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._pool.transaction() as conn:
+            conn.execute(
+                "INSERT INTO detection_jobs (id, status, priority, total, created_at, updated_at, expires_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, priority, len(images), now, now, now + self.ttl_seconds)
+            )
+            conn.executemany(
+                "INSERT INTO detection_job_items (job_id, idx, filename, image, status, priority, created_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                [(job_id, i, filename, data, priority, now) for i, (filename, data) in enumerate(images)]
+            )
+        with self._wakeup:
+            self._wakeup.notify(len(images))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status with every image's status, attempts and result"""
+        with self._pool.connection() as conn:
+            job = conn.execute(
+                "SELECT id, status, priority, total, done, failed, created_at, updated_at, expires_at "
+                "FROM detection_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            items = conn.execute(
+                "SELECT idx, filename, status, attempts, result, error FROM detection_job_items WHERE job_id = ? ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "priority": job["priority"],
+            "total": job["total"],
+            "done": job["done"],
+            "failed": job["failed"],
+            "created_at": _iso(job["created_at"]),
+            "updated_at": _iso(job["updated_at"]),
+            "expires_at": _iso(job["expires_at"]),
+            "results": [
+                {
+                    "index": item["idx"],
+                    "filename": item["filename"],
+                    "status": item["status"],
+                    "attempts": item["attempts"],
+                    "result": json.loads(item["result"]) if item["result"] else None,
+                    "error": item["error"]
+                }
+                for item in items
+            ]
+        }
+
+    def job_version(self, job_id: str) -> int:
+        """Changes whenever a worker in this process finishes an image of the job"""
+        return self._job_versions.get(job_id, 0)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel the job's queued images (running ones finish); False if the job does not exist"""
+        now = time.time()
+        with self._pool.transaction() as conn:
+            if conn.execute("SELECT 1 FROM detection_jobs WHERE id = ?", (job_id,)).fetchone() is None:
+                return False
+            conn.execute(
+                "UPDATE detection_job_items SET status = 'cancelled', image = NULL WHERE job_id = ? AND status = 'queued'",
+                (job_id,)
+            )
+            conn.execute(
+                "UPDATE detection_jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (now, job_id)
+            )
+        self._job_versions[job_id] = self.job_version(job_id) + 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._pool.connection() as conn:
+            items = dict(conn.execute("SELECT status, COUNT(*) FROM detection_job_items GROUP BY status").fetchall())
+            jobs = dict(conn.execute("SELECT status, COUNT(*) FROM detection_jobs GROUP BY status").fetchall())
+        return {
+            "workers": self.workers,
+            "jobs": jobs,
+            "images": items,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "running": any(thread.is_alive() for thread in self._threads)
+        }
+
+    def queue_depth(self) -> int:
+        """Images waiting for a worker (0 before the database is first used)"""
+        if self._pool_instance is None:
+            return 0
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM detection_job_items WHERE status = 'queued'").fetchone()[0]
+
+    def start(self) -> None:
+        self._pool  # open the database before the workers poll it
+        self._stopped = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"detection-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def run_once(self) -> bool:
+        """Claim and process one image; False if nothing was waiting"""
+        claimed = self._claim()
+        if claimed is None:
+            return False
+        job_id, idx, image, attempts = claimed
+        try:
+            result, error = self.classify(image), None
+        except ValueError as e:
+            # Undecodable input: retrying cannot help
+            result, error = None, str(e)
+        except Exception as e:
+            print(f"❌ Detection job {job_id}[{idx}] attempt {attempts} failed: {e}")
+            self._release(job_id, idx, attempts, str(e))
+            return True
+        self._finish(job_id, idx, result, error)
+        return True
+
+    def _claim(self) -> Optional[Tuple[str, int, bytes, int]]:
+        """Lease the next image: an expired lease first (its worker died), else the best queued one"""
+        now = time.time()
+        with self._pool.transaction() as conn:
+            exhausted = conn.execute(
+                "SELECT job_id, idx, attempts FROM detection_job_items WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts)
+            ).fetchall()
+            for item in exhausted:
+                self._complete_item(conn, item["job_id"], item["idx"], None, f"Gave up after {item['attempts']} attempts", now)
+                self._job_versions[item["job_id"]] = self.job_version(item["job_id"]) + 1
+            row = conn.execute(
+                "SELECT job_id, idx, attempts FROM detection_job_items WHERE status = 'running' AND lease_until < ? LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is not None:
+                self.retried += 1
+            else:
+                row = conn.execute(
+                    "SELECT job_id, idx, attempts FROM detection_job_items WHERE status = 'queued' "
+                    "ORDER BY priority DESC, created_at, idx LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+            conn.execute(
+                "UPDATE detection_job_items SET status = 'running', attempts = attempts + 1, lease_until = ? "
+                "WHERE job_id = ? AND idx = ?",
+                (now + self.lease_seconds, row["job_id"], row["idx"])
+            )
+            conn.execute(
+                "UPDATE detection_jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (now, row["job_id"])
+            )
+            image = conn.execute(
+                "SELECT image FROM detection_job_items WHERE job_id = ? AND idx = ?", (row["job_id"], row["idx"])
+            ).fetchone()[0]
+        return row["job_id"], row["idx"], image, row["attempts"] + 1
+
+    def _release(self, job_id: str, idx: int, attempts: int, error: str) -> None:
+        """Requeue an image after an unexpected error, or fail it once attempts run out"""
+        now = time.time()
+        with self._pool.transaction() as conn:
+            if attempts >= self.max_attempts:
+                self._complete_item(conn, job_id, idx, None, error, now)
+            else:
+                self.retried += 1
+                conn.execute(
+                    "UPDATE detection_job_items SET status = 'queued', lease_until = NULL, error = ? "
+                    "WHERE job_id = ? AND idx = ? AND status = 'running'",
+                    (error, job_id, idx)
+                )
+        self._job_versions[job_id] = self.job_version(job_id) + 1
+
+    def _finish(self, job_id: str, idx: int, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        with self._pool.transaction() as conn:
+            self._complete_item(conn, job_id, idx, result, error, time.time())
+        self._job_versions[job_id] = self.job_version(job_id) + 1
+
+    def _complete_item(self, conn, job_id: str, idx: int, result, error: Optional[str], now: float) -> None:
+        """Store an image's outcome and roll it up into the job (caller holds the transaction)"""
+        failed = result is None
+        updated = conn.execute(
+            "UPDATE detection_job_items SET status = ?, result = ?, error = ?, image = NULL, lease_until = NULL "
+            "WHERE job_id = ? AND idx = ? AND status = 'running'",
+            ("failed" if failed else "done", json.dumps(result) if result is not None else None, error, job_id, idx)
+        ).rowcount
+        if not updated:
+            return
+        if failed:
+            self.failed += 1
+        else:
+            self.processed += 1
+        remaining = conn.execute(
+            "SELECT COUNT(*) FROM detection_job_items WHERE job_id = ? AND status IN ('queued', 'running')", (job_id,)
+        ).fetchone()[0]
+        conn.execute(
+            "UPDATE detection_jobs SET done = done + ?, failed = failed + ?, updated_at = ?, "
+            "status = CASE WHEN ? = 0 AND status != 'cancelled' THEN 'completed' ELSE status END WHERE id = ?",
+            (0 if failed else 1, 1 if failed else 0, now, remaining, job_id)
+        )
+
+    def cleanup_expired(self) -> int:
+        """Delete expired jobs and their images and results; returns the number of jobs removed"""
+        now = time.time()
+        with self._pool.transaction() as conn:
+            expired = [row[0] for row in conn.execute("SELECT id FROM detection_jobs WHERE expires_at < ?", (now,))]
+            conn.executemany("DELETE FROM detection_job_items WHERE job_id = ?", [(job_id,) for job_id in expired])
+            conn.executemany("DELETE FROM detection_jobs WHERE id = ?", [(job_id,) for job_id in expired])
+        for job_id in expired:
+            self._job_versions.pop(job_id, None)
+        return len(expired)
+
+    def _run(self) -> None:
+        while not self._stopped:
+            try:
+                if time.monotonic() >= self._next_cleanup:
+                    self._next_cleanup = time.monotonic() + 60
+                    removed = self.cleanup_expired()
+                    if removed:
+                        print(f"🧹 Removed {removed} expired detection jobs")
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"❌ Detection worker error: {e}")
+            # Idle: wait for a submit, or poll for other workers' jobs and expired leases
+            with self._wakeup:
+                if not self._stopped:
+                    self._wakeup.wait(self.poll_interval_seconds)
+
+
+def create_detection_jobs_from_env(classify: Classifier) -> DetectionJobQueue:
+    """Build the job queue from DETECTION_JOB_* environment variables"""
+    return DetectionJobQueue(
+        classify,
+        db_path=os.getenv("DETECTION_JOBS_DB_PATH", "detection_jobs.db"),
+        workers=int(os.getenv("DETECTION_JOB_WORKERS", "1")),
+        lease_seconds=float(os.getenv("DETECTION_JOB_LEASE_SECONDS", "60")),
+        max_attempts=int(os.getenv("DETECTION_JOB_MAX_ATTEMPTS", "3")),
+        ttl_seconds=float(os.getenv("DETECTION_JOB_TTL_SECONDS", str(24 * 3600)))
+    )
@@ -0,0 +1,103 @@
+"""
+Treatment advice for disease-detection labels, joined from the knowledge base
+
+Classifier labels follow the PlantVillage "Crop___Disease" naming
+("Tomato___Early_blight", "Corn_(maize)___Common_rust_"). At startup every label
+is matched once against the knowledge base: the crop part against crop entries
+(by key or any word of the crop name) and the disease part against pest entries
+of the same crop (by the words of the pest key). Detection responses then look
+the advice up by label instead of asking the chatbot. The index is rebuilt
+when the knowledge base reloads.
+"""
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+import re
+import threading
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Fields of a pest entry returned as advice, in display order
+PEST_FIELDS = ("category", "severity", "summary", "immediate", "treatment", "prevention", "organic_alternatives")
+
+# Fields of a crop entry returned as advice
+CROP_FIELDS = ("name", "season", "practices", "pest_management", "fertilizer")
+
+
+def _words(text: str) -> FrozenSet[str]:
+    return frozenset(_WORD_RE.findall(text.lower()))
+
+
+def parse_label(name: str):
+    """(crop words, disease words, healthy) of a "Crop___Disease" label"""
+    crop, _, disease = name.partition("___")
+    if not disease:
+        crop, disease = "", crop
+    crop_words = _words(crop)
+    disease_words = _words(disease) - crop_words
+    return crop_words, disease_words, disease_words <= {"healthy"} and bool(disease_words)
+
+
+class DiseaseAdviceIndex:
+    """Precomputed label -> {crop, diseases} advice, kept in step with the knowledge base"""
+
+    def __init__(self, kb, labels: Iterable[str] = ()):
+        self.kb = kb
+        self.labels = list(dict.fromkeys(labels))
+        self._advice: Dict[str, Dict[str, Any]] = {}
+        self._kb_version = None
+        self._lock = threading.Lock()
+        self.rebuild()
+
+    def _match_crop(self, crop_words: FrozenSet[str]) -> Optional[str]:
+        for key, entry in self.kb.crop_database.items():
+            if key in crop_words or _words(entry.get("name", "")) & crop_words:
+                return key
+        return None
+
+    def _match_pests(self, crop_key: Optional[str], crop_words: FrozenSet[str], disease_words: FrozenSet[str]) -> List[str]:
+        matches = []
+        for key, entry in self.kb.pest_database.items():
+            pest_crop = _words(entry.get("crop", ""))
+            if not (pest_crop & crop_words or (crop_key and key.startswith(f"{crop_key}_"))):
+                continue
+            # "tomato_early_blight" -> {"early", "blight"}; either side may be the more specific name
+            pest_words = _words(key.replace("_", " ")) - pest_crop - ({crop_key} if crop_key else set())
+            if pest_words and (disease_words <= pest_words or pest_words <= disease_words):
+                matches.append(key)
+        return matches
+
+    def _build_one(self, name: str) -> Dict[str, Any]:
+        crop_words, disease_words, healthy = parse_label(name)
+        crop_key = self._match_crop(crop_words) if crop_words else None
+        pests = [] if healthy else self._match_pests(crop_key, crop_words, disease_words)
+        crop = self.kb.crop_database.get(crop_key) if crop_key else None
+        return {
+            "healthy": healthy,
+            "crop": {"key": crop_key, **{f: crop.get(f) for f in CROP_FIELDS}} if crop else None,
+            "diseases": [
+                {"key": key, **{f: self.kb.pest_database[key].get(f) for f in PEST_FIELDS}}
+                for key in pests
+            ],
+            "found": bool(crop or pests)
+        }
+
+    def rebuild(self) -> None:
+        """Recompute advice for every label from the current knowledge base"""
+        with self._lock:
+            version = self.kb.version
+            self._advice = {name: self._build_one(name) for name in self.labels}
+            self._kb_version = version
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Advice for a disease label; labels not known at startup are matched on the spot"""
+        if self.kb.version != self._kb_version:
+            self.rebuild()
+        advice = self._advice.get(name)
+        return advice if advice is not None else self._build_one(name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "labels": len(self._advice),
+            "with_advice": sum(1 for a in self._advice.values() if a["found"]),
+            "with_treatment": sum(1 for a in self._advice.values() if a["diseases"]),
+            "kb_version": self._kb_version
+        }
@@ -0,0 +1,126 @@
+"""
+Fast JSON responses for hot read paths
+
+FastAPI validates every returned dict against the route's response_model and then
+encodes it with the stdlib json module. The stores already hold schedules in the
+response shape (built and validated once when they are written), so read routes
+can skip that second pass: FastJSONResponse encodes the stored dicts directly with
+orjson when it is installed (falling back to json otherwise). BodyCache keeps the
+encoded bytes of unchanged list responses so a repeat request costs one lookup.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, time
+from typing import Any, Optional, Tuple
+import json
+import os
+import threading
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode to compact UTF-8 JSON; datetimes as ISO 8601 like pydantic"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with dumps(); bytes content is sent as already-encoded JSON
+
+    Returning a Response from a route bypasses response_model validation, so only
+    return data that already has the declared shape.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+class BodyCache:
+    """LRU of encoded response bodies for one store version
+
+    Keys should identify the request (path and query); the whole cache is dropped
+    as soon as a newer store version is seen, so a stale body is never served.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 128 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[bytes, dict]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _current(self, version: int) -> bool:
+        """Move the cache to a newer version (dropping every body); False for an older one"""
+        if self._version is not None and version < self._version:
+            # A slow request read the version before a write another request has already seen
+            return False
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+        return True
+
+    def get(self, version: int, key: str) -> Optional[Tuple[bytes, dict]]:
+        """(body, headers) cached for this version and key, or None"""
+        with self._lock:
+            entry = self._entries.get(key) if self._current(version) else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version: int, key: str, body: bytes, headers: dict) -> None:
+        if len(body) > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if not self._current(version):
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (body, headers)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "encoder": "orjson" if orjson is not None else "json"
+        }
+
+
+def create_body_cache_from_env(prefix: str) -> BodyCache:
+    """Build a BodyCache from <prefix>_BODY_CACHE_ENTRIES and <prefix>_BODY_CACHE_MB"""
+    return BodyCache(
+        max_entries=int(os.getenv(f"{prefix}_BODY_CACHE_ENTRIES", "64")),
+        max_bytes=int(float(os.getenv(f"{prefix}_BODY_CACHE_MB", "128")) * 1024 * 1024)
+    )
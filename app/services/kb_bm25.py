@@ -0,0 +1,204 @@
+"""
+BM25-ranked retrieval over knowledge-base passages
+
+Crop, pest and general-knowledge entries are chunked into passages. Term
+statistics are precomputed into flat NumPy arrays (CSR postings) with the
+query-independent part of the BM25 formula folded into each posting weight,
+so scoring a query is one scatter-add per query term plus argpartition top-k.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+import re
+
+import numpy as np
+
+from app.services.kb_snippets import KnowledgeBaseSnippets
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "my", "of", "on", "or", "should", "the", "to", "what",
+    "when", "which", "with", "you", "your", "we", "our", "this", "that", "there", "use"
+])
+
+
+def stem(token: str) -> str:
+    """Very light plural folding so "tomatoes" matches "tomato" and "leaves" matches "leaf" """
+    if len(token) <= 3:
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith("ves"):
+        return token[:-3] + "f"
+    if token.endswith("oes") or token.endswith("ses") or token.endswith("xes") or token.endswith("ches"):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    """Lowercase, tokenize, drop stopwords and fold plurals"""
+    return [stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+@dataclass(frozen=True)
+class Passage:
+    """One retrievable chunk of the knowledge base"""
+    id: str          # e.g. "crop:tomato:fertilizer", "pest:tomato_late_blight", "topic:irrigation:2"
+    kind: str        # "crop", "pest" or "topic"
+    key: str         # crop key, pest key or topic name
+    text: str        # text that is indexed
+    rendered: str    # text placed in the RAG context
+
+
+def entry_passages(kind: str, key: str, value: Any, snippets: KnowledgeBaseSnippets) -> List[Passage]:
+    """Passages of one crop, pest or general-knowledge topic; every rendering comes from the snippet table"""
+    context = snippets.context
+    if kind == "crop":
+        passages = [Passage(f"crop:{key}:overview", "crop", key, f"{key} {context[f'crop:{key}']}", context[f"crop:{key}"])]
+        for part in ("practices", "fertilizer"):
+            rendered = context.get(f"crop:{key}:{part}")
+            if rendered is not None:
+                passages.append(Passage(f"crop:{key}:{part}", "crop", key, f"{key} {rendered}", rendered))
+        return passages
+
+    if kind == "pest":
+        title = key.replace("_", " ").title()
+        indexed = " ".join(
+            [title, value["crop"], value["category"], value["summary"]]
+            + (value.get("immediate") or []) + (value.get("treatment") or [])
+            + (value.get("prevention") or []) + (value.get("organic_alternatives") or [])
+        )
+        return [Passage(f"pest:{key}", "pest", key, indexed, context[f"pest:{key}"])]
+
+    label = key.replace("_", " ").title()
+    return [
+        Passage(f"topic:{key}:{i}", "topic", key, f"{label} {fact}", context[f"topic:{key}:{i}"])
+        for i, fact in enumerate(value)
+    ]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed passage list with precomputed CSR postings"""
+
+    def __init__(self, passages: List[Passage], k1: float = 1.2, b: float = 0.75, token_cache: Dict[str, List[str]] = None):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+
+        # Analyzed tokens keyed by passage text, so an incremental rebuild only re-analyzes changed passages
+        token_cache = token_cache or {}
+        self.token_cache: Dict[str, List[str]] = {}
+        for p in passages:
+            tokens = token_cache.get(p.text)
+            self.token_cache[p.text] = tokens if tokens is not None else analyze(p.text)
+        docs = [self.token_cache[p.text] for p in passages]
+        n_docs = len(docs)
+        self.doc_lengths = np.array([len(d) for d in docs], dtype=np.float32)
+        avg_length = float(self.doc_lengths.mean()) if n_docs else 0.0
+
+        # term -> {doc: tf}
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, tokens in enumerate(docs):
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        self.vocabulary: Dict[str, int] = {}
+        offsets = [0]
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        for term_id, (term, counts) in enumerate(postings.items()):
+            self.vocabulary[term] = term_id
+            doc_ids.extend(counts.keys())
+            term_freqs.extend(counts.values())
+            offsets.append(len(doc_ids))
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.doc_ids = np.array(doc_ids, dtype=np.int32)
+        self.term_freqs = np.array(term_freqs, dtype=np.float32)
+
+        doc_freqs = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+        # Fold idf and length normalization into one weight per posting
+        term_of_posting = np.repeat(np.arange(len(self.vocabulary)), np.diff(self.offsets))
+        lengths = self.doc_lengths[self.doc_ids]
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / avg_length) if avg_length else self.k1
+        self.weights = (
+            self.idf[term_of_posting] * self.term_freqs * (self.k1 + 1.0) / (self.term_freqs + norm)
+        ).astype(np.float32)
+
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every passage for the query"""
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for token in analyze(query):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # Doc ids are unique within one posting list, so fancy-index add is safe
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[Tuple[Passage, float]]:
+        """Best k passages with a positive score, highest first"""
+        scores = self.score(query)
+        return top_k_from_scores(self.passages, scores, k)
+
+    def score_batch(self, queries: List[str]) -> np.ndarray:
+        """BM25 scores of many queries at once, shape (len(queries), passages)"""
+        n_docs = len(self.passages)
+        rows: List[int] = []
+        terms: List[int] = []
+        for row, query in enumerate(queries):
+            for token in analyze(query):
+                term_id = self.vocabulary.get(token)
+                if term_id is not None:
+                    rows.append(row)
+                    terms.append(term_id)
+        if not terms or not n_docs:
+            return np.zeros((len(queries), n_docs), dtype=np.float32)
+
+        rows_arr = np.array(rows, dtype=np.int64)
+        terms_arr = np.array(terms, dtype=np.int64)
+        starts = self.offsets[terms_arr]
+        lengths = self.offsets[terms_arr + 1] - starts
+        # Expand every (query, term) pair into that term's postings, then one bincount scatter-add
+        pair = np.repeat(np.arange(len(terms_arr)), lengths)
+        posting = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths) + starts[pair]
+        cells = rows_arr[pair] * n_docs + self.doc_ids[posting]
+        scores = np.bincount(cells, weights=self.weights[posting], minlength=len(queries) * n_docs)
+        return scores.astype(np.float32).reshape(len(queries), n_docs)
+
+    def top_k_batch(self, queries: List[str], k: int) -> List[List[Tuple[Passage, float]]]:
+        """top_k for many queries with a single vectorized scoring pass"""
+        return top_k_batch_from_scores(self.passages, self.score_batch(queries), k)
+
+
+def top_k_from_scores(passages: List[Passage], scores: np.ndarray, k: int) -> List[Tuple[Passage, float]]:
+    """argpartition top-k of a score vector, dropping non-positive scores"""
+    if k <= 0 or not len(scores):
+        return []
+    k = min(k, len(scores))
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(passages[i], float(scores[i])) for i in candidates if scores[i] > 0]
+
+
+def top_k_batch_from_scores(passages: List[Passage], scores: np.ndarray, k: int) -> List[List[Tuple[Passage, float]]]:
+    """Row-wise argpartition top-k of a (queries, passages) score matrix, dropping non-positive scores"""
+    if k <= 0 or not scores.shape[1]:
+        return [[] for _ in range(len(scores))]
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-top, axis=1, kind="stable")
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return [
+        [(passages[i], float(score)) for i, score in zip(row_ids, row_scores) if score > 0]
+        for row_ids, row_scores in zip(candidates.tolist(), top.tolist())
+    ]
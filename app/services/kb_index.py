@@ -0,0 +1,153 @@
+"""
+Keyword indexes for AgricultureKnowledgeBase retrieval
+
+A single Aho-Corasick automaton over every crop name, pest crop alias, disease
+trigger word and topic keyword finds all substring matches in one pass over the
+message; an inverted index maps message tokens to the pest entries containing them.
+"""
+from collections import deque
+from typing import Any, Dict, Hashable, List, Set
+import re
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words that make retrieval look at the pest/disease database at all
+PEST_TRIGGER_WORDS = ["disease", "pest", "infection", "blight", "rot"]
+
+# General knowledge topics and the keywords that select them
+TOPIC_KEYWORDS = {
+    "fertilizer": ["fertilizer", "npk", "urea", "nutrient", "fertilization"],
+    "irrigation": ["water", "irrigation", "drainage", "moisture", "watering"],
+    "soil_management": ["soil", "ph", "organic", "compost", "fym"],
+    "pest_management": ["pest", "insect", "spray", "pesticide", "ipm"],
+    "post_harvest": ["harvest", "after farming", "post harvest", "storage", "drying"]
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher; each pattern carries one or more payloads"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Hashable]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, payload: Hashable) -> None:
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(payload)
+        self._built = False
+
+    def build(self) -> None:
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = deque(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+        self._built = True
+
+    def search(self, text: str) -> Set[Hashable]:
+        """Return every payload whose pattern occurs in text"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[Hashable] = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class KnowledgeBaseIndex:
+    """Match tables built once from the knowledge base dicts"""
+
+    def __init__(self, crop_database: Dict[str, Any], pest_database: Dict[str, Any], general_knowledge: Dict[str, List[str]]):
+        self.crop_order = {key: i for i, key in enumerate(crop_database)}
+        self.pest_order = {key: i for i, key in enumerate(pest_database)}
+        self.topic_order = {topic: i for i, topic in enumerate(t for t in TOPIC_KEYWORDS if t in general_knowledge)}
+
+        self.automaton = AhoCorasick()
+        for key, crop in crop_database.items():
+            self.automaton.add(key, ("crop", key))
+            self.automaton.add(crop["name"].lower(), ("crop", key))
+        for word in PEST_TRIGGER_WORDS:
+            self.automaton.add(word, ("pest_trigger", None))
+        for topic, keywords in TOPIC_KEYWORDS.items():
+            if topic in self.topic_order:
+                for keyword in keywords:
+                    self.automaton.add(keyword, ("topic", topic))
+
+        # Pest aliases: the crop name (substring match) and each token of the pest key
+        self.pests_by_crop: Dict[str, List[str]] = {}
+        self.pests_by_token: Dict[str, List[str]] = {}
+        for key, pest in pest_database.items():
+            crop_alias = pest["crop"].lower()
+            if crop_alias not in self.pests_by_crop:
+                self.pests_by_crop[crop_alias] = []
+                self.automaton.add(crop_alias, ("pest_crop", crop_alias))
+            self.pests_by_crop[crop_alias].append(key)
+            for token in set(tokenize(key.replace("_", " "))):
+                self.pests_by_token.setdefault(token, []).append(key)
+
+        self.automaton.build()
+
+    def match(self, user_message: str) -> Dict[str, List[str]]:
+        """Crops, pests and topics mentioned in the message, each in knowledge-base order"""
+        user_lower = user_message.lower()
+        hits = self.automaton.search(user_lower)
+
+        crops: Set[str] = set()
+        topics: Set[str] = set()
+        pest_crops: List[str] = []
+        pest_triggered = False
+        for kind, value in hits:
+            if kind == "crop":
+                crops.add(value)
+            elif kind == "topic":
+                topics.add(value)
+            elif kind == "pest_crop":
+                pest_crops.append(value)
+            else:
+                pest_triggered = True
+
+        pests: Set[str] = set()
+        if pest_triggered:
+            for alias in pest_crops:
+                pests.update(self.pests_by_crop[alias])
+            for token in tokenize(user_lower):
+                pests.update(self.pests_by_token.get(token, ()))
+
+        return {
+            "crops": sorted(crops, key=self.crop_order.__getitem__),
+            "pests": sorted(pests, key=self.pest_order.__getitem__),
+            "topics": sorted(topics, key=self.topic_order.__getitem__)
+        }
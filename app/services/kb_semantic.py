@@ -0,0 +1,166 @@
+"""
+Semantic-ish retrieval over knowledge-base passages with hashed character n-grams
+
+Passages are vectorized with a hashing vectorizer over character n-grams of each
+word (so "rings"/"ring" or "brown spots"/"spot" still overlap), TF-IDF weighted
+and L2-normalized. The feature-major matrix is saved to disk once and
+memory-mapped, so every worker shares the same pages. A query is scored with one
+matrix-vector product over its non-zero features followed by argpartition top-k.
+Everything runs offline on CPU.
+"""
+from functools import lru_cache
+from typing import Dict, List, Tuple
+import hashlib
+import math
+import os
+import re
+import zlib
+
+import numpy as np
+
+from app.services.kb_bm25 import STOPWORDS, Passage, top_k_batch_from_scores, top_k_from_scores
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingCharVectorizer:
+    """Stateless char n-gram hashing vectorizer (word-boundary padded, like char_wb)"""
+
+    def __init__(self, n_features: int = 8192, ngram_min: int = 3, ngram_max: int = 5):
+        self.n_features = n_features
+        self.ngram_min = ngram_min
+        self.ngram_max = ngram_max
+        # Farmer queries reuse a small vocabulary, so each word is hashed once
+        self._word_features = lru_cache(maxsize=65536)(self._hash_word)
+
+    def _hash_word(self, word: str) -> Tuple[int, ...]:
+        padded = f" {word} "
+        return tuple(
+            zlib.crc32(padded[i:i + n].encode("utf-8")) % self.n_features
+            for n in range(self.ngram_min, self.ngram_max + 1)
+            for i in range(len(padded) - n + 1)
+        )
+
+    def features(self, text: str) -> Dict[int, float]:
+        """Sparse {feature index: sublinear term frequency}"""
+        counts: Dict[int, int] = {}
+        for word in _TOKEN_RE.findall(text.lower()):
+            if word in STOPWORDS:
+                continue
+            for index in self._word_features(word):
+                counts[index] = counts.get(index, 0) + 1
+        return {index: 1.0 + math.log(count) for index, count in counts.items()}
+
+
+class SemanticIndex:
+    """TF-IDF weighted hashed n-gram vectors for all passages, memory-mapped from disk"""
+
+    def __init__(self, passages: List[Passage], cache_dir: str = None, n_features: int = 8192):
+        self.passages = passages
+        self.vectorizer = HashingCharVectorizer(n_features=n_features)
+        cache_dir = cache_dir or os.getenv("KB_CACHE_DIR", ".kb_cache")
+
+        # Fingerprint the passages and settings so a stale matrix is never loaded
+        digest = hashlib.sha1(f"{n_features}|".encode("utf-8"))
+        for passage in passages:
+            digest.update(passage.id.encode("utf-8"))
+            digest.update(passage.text.encode("utf-8"))
+        fingerprint = digest.hexdigest()[:16]
+
+        matrix_path = os.path.join(cache_dir, f"semantic_{fingerprint}.npy")
+        idf_path = os.path.join(cache_dir, f"semantic_{fingerprint}_idf.npy")
+        if not (os.path.exists(matrix_path) and os.path.exists(idf_path)):
+            self._build(matrix_path, idf_path)
+            self._prune(cache_dir, fingerprint)
+
+        # (n_features, n_passages), feature-major so a query's rows are contiguous
+        try:
+            self.matrix = np.load(matrix_path, mmap_mode="r")
+            self.idf = np.load(idf_path, mmap_mode="r")
+        except FileNotFoundError:
+            # Pruned by a worker that already moved to a newer knowledge base
+            self._build(matrix_path, idf_path)
+            self.matrix = np.load(matrix_path, mmap_mode="r")
+            self.idf = np.load(idf_path, mmap_mode="r")
+        self.path = matrix_path
+
+    def _build(self, matrix_path: str, idf_path: str) -> None:
+        n_features = self.vectorizer.n_features
+        rows = [self.vectorizer.features(p.text) for p in self.passages]
+
+        doc_freq = np.zeros(n_features, dtype=np.float32)
+        for row in rows:
+            doc_freq[list(row)] += 1
+        idf = (np.log((1 + len(rows)) / (1 + doc_freq)) + 1.0).astype(np.float32)
+
+        matrix = np.zeros((n_features, len(rows)), dtype=np.float32)
+        for col, row in enumerate(rows):
+            if not row:
+                continue
+            indices = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            values = np.fromiter(row.values(), dtype=np.float32, count=len(row)) * idf[indices]
+            matrix[indices, col] = values / np.linalg.norm(values)
+
+        os.makedirs(os.path.dirname(matrix_path) or ".", exist_ok=True)
+        # Write to temp files first so concurrent workers never map a partial file
+        for path, array in ((matrix_path, matrix), (idf_path, idf)):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+
+    @staticmethod
+    def _prune(cache_dir: str, fingerprint: str) -> None:
+        """Delete matrices of earlier knowledge-base versions (mapped copies stay valid until unmapped)"""
+        for name in os.listdir(cache_dir):
+            if name.startswith("semantic_") and name.endswith(".npy") and not name.startswith(f"semantic_{fingerprint}"):
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except OSError:
+                    pass
+
+    def query_vector(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sparse normalized query vector as (feature indices, weights)"""
+        features = self.vectorizer.features(query)
+        if not features:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        indices = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        values = np.fromiter(features.values(), dtype=np.float32, count=len(features)) * self.idf[indices]
+        return indices, values / np.linalg.norm(values)
+
+    def score(self, query: str) -> np.ndarray:
+        """Cosine similarity of the query with every passage"""
+        indices, values = self.query_vector(query)
+        if not len(indices):
+            return np.zeros(len(self.passages), dtype=np.float32)
+        # Matrix-vector product restricted to the query's non-zero features
+        return values @ self.matrix[indices]
+
+    def top_k(self, query: str, k: int, min_score: float = 0.05) -> List[Tuple[Passage, float]]:
+        """Best k passages above a minimum cosine similarity"""
+        return [(p, s) for p, s in top_k_from_scores(self.passages, self.score(query), k) if s >= min_score]
+
+    def score_batch(self, queries: List[str]) -> np.ndarray:
+        """Cosine similarity of many queries with every passage, shape (len(queries), passages)"""
+        rows, features, weights = [], [], []
+        for row, query in enumerate(queries):
+            indices, values = self.query_vector(query)
+            rows.append(np.full(len(indices), row, dtype=np.int64))
+            features.append(indices)
+            weights.append(values)
+        features_arr = np.concatenate(features) if features else np.empty(0, dtype=np.int64)
+        if not len(features_arr):
+            return np.zeros((len(queries), len(self.passages)), dtype=np.float32)
+
+        # Read each distinct feature row of the memory-mapped matrix once for the whole batch
+        distinct, column = np.unique(features_arr, return_inverse=True)
+        query_matrix = np.zeros((len(queries), len(distinct)), dtype=np.float32)
+        query_matrix[np.concatenate(rows), column] = np.concatenate(weights)
+        return query_matrix @ np.asarray(self.matrix[distinct])
+
+    def top_k_batch(self, queries: List[str], k: int, min_score: float = 0.05) -> List[List[Tuple[Passage, float]]]:
+        """top_k for many queries with one matrix product"""
+        return [
+            [(p, s) for p, s in row if s >= min_score]
+            for row in top_k_batch_from_scores(self.passages, self.score_batch(queries), k)
+        ]
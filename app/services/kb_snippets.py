@@ -0,0 +1,144 @@
+"""
+Pre-rendered knowledge-base snippets
+
+The knowledge base is static between reloads, so every text rendering of an
+entry is compiled once into read-only tables addressed by entry id:
+
+    context["crop:tomato"]              RAG context block for a crop
+    context["crop:tomato:practices"]    every practice and pest-management step (retrieval chunk)
+    context["crop:tomato:fertilizer"]   full fertilizer schedule (retrieval chunk)
+    context["pest:<key>"]               RAG context block for a pest/disease
+    context["topic:<topic>:<i>"]        one general-knowledge fact
+    fallback["crop:tomato"]             user-facing answer when the model is unavailable
+    fallback["pest:<key>"]              user-facing answer for a pest/disease
+
+The retrieval and fallback paths then only select ids and join strings.
+"""
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+
+# Optional list fields may be missing, null or empty in a valid entry; render them only when non-empty
+
+def _crop_context(crop: Dict[str, Any]) -> str:
+    parts = [
+        f"Crop: {crop['name']}\n",
+        f"Season: {crop['season']}, Cycle: {crop['cycle_length']} days\n",
+        f"Yield: {crop['yield']}, Profitability: {crop['profitability']}\n",
+        f"Soil: pH {crop['soil']['ph_min']}-{crop['soil']['ph_max']}, {', '.join(crop['soil']['type'])}\n",
+        f"Water: {crop['water']['requirement']}, Irrigation: {crop['water']['irrigation_cycle']}\n",
+        f"Key Practices: {', '.join(crop['practices'][:3])}\n"
+    ]
+    if crop.get('fertilizer'):
+        fert_info = "; ".join(f"{f['stage']}: {f['type']} {f['quantity']}" for f in crop['fertilizer'][:2])
+        parts.append(f"Fertilizer: {fert_info}\n")
+    return "".join(parts)
+
+
+def _crop_chunks(key: str, crop: Dict[str, Any]) -> Dict[str, str]:
+    chunks = {}
+    practices = (crop.get('practices') or []) + (crop.get('pest_management') or [])
+    if practices:
+        chunks[f"crop:{key}:practices"] = f"{crop['name']} Key Practices: {', '.join(practices)}\n"
+    if crop.get('fertilizer'):
+        schedule = "; ".join(f"{f['stage']}: {f['type']} {f['quantity']}" for f in crop['fertilizer'])
+        chunks[f"crop:{key}:fertilizer"] = f"{crop['name']} Fertilizer: {schedule}\n"
+    return chunks
+
+
+def _crop_fallback(crop: Dict[str, Any]) -> str:
+    parts = [
+        f"Here's information about growing {crop['name']}:\n\n",
+        f"**Season:** {crop['season']} (Cycle: {crop['cycle_length']} days)\n",
+        f"**Soil:** pH {crop['soil']['ph_min']}-{crop['soil']['ph_max']}, {', '.join(crop['soil']['type'])}\n",
+        f"**Water:** {crop['water']['requirement']} - {crop['water']['irrigation_cycle']}\n",
+        f"**Expected Yield:** {crop['yield']}\n\n",
+        "**Key Practices:**\n"
+    ]
+    parts.extend(f"• {practice}\n" for practice in crop['practices'][:4])
+    if crop.get('fertilizer'):
+        parts.append("\n**Fertilizer Schedule:**\n")
+        parts.extend(f"• {fert['stage']}: {fert['type']} {fert['quantity']}\n" for fert in crop['fertilizer'][:3])
+    return "".join(parts)
+
+
+def _pest_context(pest_key: str, pest: Dict[str, Any]) -> str:
+    parts = [
+        f"Disease: {pest_key.replace('_', ' ').title()}\n",
+        f"Crop: {pest['crop']}, Severity: {pest['severity']}\n",
+        f"Summary: {pest['summary']}\n"
+    ]
+    if pest.get('treatment'):
+        parts.append(f"Treatment: {pest['treatment'][0]}\n")
+    if pest.get('prevention'):
+        parts.append(f"Prevention: {pest['prevention'][0]}\n")
+    return "".join(parts)
+
+
+def _pest_fallback(pest_key: str, pest: Dict[str, Any]) -> str:
+    parts = [
+        f"**{pest_key.replace('_', ' ').title()}** ({pest['crop']})\n\n",
+        f"{pest['summary']}\n\n"
+    ]
+    if pest.get('treatment'):
+        parts.append("**Treatment:**\n")
+        parts.extend(f"• {treatment}\n" for treatment in pest['treatment'][:2])
+    if pest.get('prevention'):
+        parts.append("\n**Prevention:**\n")
+        parts.extend(f"• {prevention}\n" for prevention in pest['prevention'][:2])
+    return "".join(parts)
+
+
+def render_entry(kind: str, key: str, value: Any) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Context and fallback snippets of one crop, pest or general-knowledge topic"""
+    if kind == "crop":
+        return {f"crop:{key}": _crop_context(value), **_crop_chunks(key, value)}, {f"crop:{key}": _crop_fallback(value)}
+    if kind == "pest":
+        return {f"pest:{key}": _pest_context(key, value)}, {f"pest:{key}": _pest_fallback(key, value)}
+    label = key.replace('_', ' ').title()
+    return {f"topic:{key}:{i}": f"{label}: {fact}" for i, fact in enumerate(value)}, {}
+
+
+class KnowledgeBaseSnippets:
+    """Immutable snippet tables compiled from the knowledge base dicts"""
+
+    def __init__(self, crop_database: Dict[str, Any], pest_database: Dict[str, Any], general_knowledge: Dict[str, List[str]]):
+        context: Dict[str, str] = {}
+        fallback: Dict[str, str] = {}
+        for kind, entries in (("crop", crop_database), ("pest", pest_database), ("topic", general_knowledge)):
+            for key, value in entries.items():
+                entry_context, entry_fallback = render_entry(kind, key, value)
+                context.update(entry_context)
+                fallback.update(entry_fallback)
+        self._freeze(context, fallback)
+
+    def _freeze(self, context: Dict[str, str], fallback: Dict[str, str]) -> None:
+        self.context: Mapping[str, str] = MappingProxyType(context)
+        self.fallback: Mapping[str, str] = MappingProxyType(fallback)
+
+    def updated(self, changes: Dict[Tuple[str, str], Optional[Any]]) -> "KnowledgeBaseSnippets":
+        """New tables with only the changed entries re-rendered ({(kind, key): new value or None if removed})"""
+        context = dict(self.context)
+        fallback = dict(self.fallback)
+        for (kind, key), value in changes.items():
+            # An entry's snippets are "<kind>:<key>" plus any "<kind>:<key>:<part>"
+            prefix = f"{kind}:{key}:"
+            for snippet_id in [i for i in context if i.startswith(prefix)]:
+                del context[snippet_id]
+            context.pop(f"{kind}:{key}", None)
+            fallback.pop(f"{kind}:{key}", None)
+            if value is not None:
+                entry_context, entry_fallback = render_entry(kind, key, value)
+                context.update(entry_context)
+                fallback.update(entry_fallback)
+
+        snippets = KnowledgeBaseSnippets.__new__(KnowledgeBaseSnippets)
+        snippets._freeze(context, fallback)
+        return snippets
+
+    # MappingProxyType cannot be pickled; snapshots store the plain dicts
+    def __getstate__(self) -> Dict[str, Dict[str, str]]:
+        return {"context": dict(self.context), "fallback": dict(self.fallback)}
+
+    def __setstate__(self, state: Dict[str, Dict[str, str]]) -> None:
+        self._freeze(state["context"], state["fallback"])
@@ -0,0 +1,354 @@
+"""
+Prometheus-compatible metrics without external dependencies
+
+Counters, gauges and histograms keep their samples in plain Python objects and are
+rendered in the Prometheus text exposition format by `GET /metrics`. Recording a
+sample is a dict lookup plus a locked increment, so it is cheap enough for every
+request. Values that already live elsewhere (cache stats, queue lengths, startup
+phases) are registered as callbacks and only read when /metrics is scraped.
+
+Settings come from environment variables:
+    AGRICONNECT_METRICS   "0" to disable the middleware and the /metrics endpoint (default on)
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+import math
+import os
+import threading
+import time
+
+from app.services.profiling import record_span
+
+# Latency buckets in seconds, from sub-millisecond CRUD to multi-second generation
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+# A callback yields (label values, value) pairs when /metrics is scraped
+Collector = Callable[[], Iterable[Tuple[LabelValues, float]]]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base for a metric family: one child per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Child for these label values (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        """The single child of a metric without labels"""
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: LabelValues, child) -> List[str]:
+        return [f"{self.name}{_labels_text(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # Per-bucket (non-cumulative) counts; the last slot is +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the wall time of the block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _render_child(self, values: LabelValues, child: _HistogramValue) -> List[str]:
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, values, le)} {cumulative}")
+        labels = _labels_text(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose samples are read from a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str, kind: str, collect: Collector, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            print(f"❌ Metrics callback {self.name} failed: {e}")
+            return lines
+        for values, value in samples:
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_labels_text(self.labelnames, values)} {_format_value(float(value))}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics in registration order; registering a name twice returns the existing metric"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, CallbackMetric):
+                return existing
+            # Callbacks are replaced so a re-created service reports its new state
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, collect: Collector, kind: str = "gauge", labelnames: Sequence[str] = ()) -> CallbackMetric:
+        """Register a counter or gauge computed by `collect` on every scrape"""
+        return self._register(CallbackMetric(name, documentation, kind, collect, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def metrics_enabled() -> bool:
+    return os.getenv("AGRICONNECT_METRICS", "1").lower() not in ("0", "false", "no")
+
+
+# Global registry shared by the app and the services it loads
+metrics = MetricsRegistry()
+
+# Time spent in the expensive steps of a request, by stage: image_decode, classifier_forward,
+# kb_retrieval, kb_retrieval_batch, tokenization, generation, openai_call, serialize
+stage_seconds = metrics.histogram(
+    "agriconnect_stage_duration_seconds",
+    "Time spent in hot-path stages of request handling",
+    ["stage"]
+)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Observe the block into agriconnect_stage_duration_seconds{stage}
+
+    Also records it as a span when the request is being profiled (see profiling.py).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        stage_seconds.labels(stage).observe(seconds)
+        record_span(stage, started, seconds)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, request counts and in-flight requests
+
+    Routes are labelled by their path template ("/api/fertilizer/schedules/{schedule_id}")
+    so ids never become label values; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.requests = metrics.counter(
+            "agriconnect_http_requests_total", "HTTP requests by route and status code", ["method", "route", "status"]
+        )
+        self.latency = metrics.histogram(
+            "agriconnect_http_request_duration_seconds", "HTTP request latency by route", ["method", "route"]
+        )
+        self.in_flight = metrics.gauge("agriconnect_http_requests_in_flight", "HTTP requests being handled")
+        self._in_flight = self.in_flight.labels()
+        self._route_paths: Dict[Any, str] = {}
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "<unmatched>"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            # Starlette records the matched endpoint, not the route; map it back once
+            routes = getattr(scope.get("app"), "routes", [])
+            path = next((route.path for route in routes if getattr(route, "endpoint", None) is endpoint), "<unmatched>")
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self._in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._in_flight.dec()
+            route = self._route_path(scope)
+            method = scope["method"]
+            self.latency.labels(method, route).observe(elapsed)
+            self.requests.labels(method, route, str(status)).inc()
+
+
+def startup_phase_samples() -> Iterator[Tuple[LabelValues, float]]:
+    """Startup phases (imports, model loads, warmups) as (phase, kind) samples"""
+    from app.services.startup import startup_report
+
+    for phase in startup_report.phases:
+        yield (phase["name"], phase["kind"]), phase["self_seconds"]
+
+
+metrics.callback(
+    "agriconnect_startup_phase_seconds",
+    "Startup time per import, model load and warmup phase (excluding nested phases)",
+    startup_phase_samples,
+    labelnames=["phase", "kind"]
+)
@@ -0,0 +1,231 @@
+"""
+Opt-in per-request profiling
+
+When enabled, ProfilingMiddleware profiles selected requests with cProfile and
+keeps the result (top functions, spans and the raw pstats data) for download
+from /profiles. A request is profiled when an admin asks for it, with the
+X-Profile header or a `profile` query parameter carrying PROFILING_TOKEN, or
+when it is picked at random at PROFILING_SAMPLE_RATE. In both cases no more than
+PROFILING_MAX_FRACTION of the eligible requests are profiled, and only one at a
+time. Spans come from the stage timers (metrics.stage_timer): decode, retrieval,
+tokenize, generate and serialize show up as named intervals of the request.
+
+cProfile records the thread it runs on. Async handlers share the event loop
+thread, so a profile can include other requests that ran while it was active.
+
+Settings come from environment variables:
+    AGRICONNECT_PROFILING    "1" to install the middleware (default off: no per-request cost)
+    PROFILING_TOKEN          Admin token for X-Profile / ?profile= and the /profiles endpoints
+    PROFILING_SAMPLE_RATE    Fraction of eligible requests profiled without asking (default 0)
+    PROFILING_MAX_FRACTION   Upper bound on profiled / eligible requests (default 0.01)
+    PROFILING_PATHS          Comma-separated path prefixes that may be profiled
+                             (default /api/disease-detection/upload,/api/chatbot/message)
+    PROFILING_MAX_STORED     Profiles kept in memory, oldest dropped first (default 50)
+"""
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+
+# Spans of the profile being recorded for the current request (None almost always)
+active_spans: ContextVar[Optional[List[Tuple[str, float, float]]]] = ContextVar("active_spans", default=None)
+
+DEFAULT_PATHS = "/api/disease-detection/upload,/api/chatbot/message"
+
+# Functions listed in a profile summary
+TOP_FUNCTIONS = 30
+
+
+def record_span(name: str, started: float, seconds: float) -> None:
+    """Add a span to the active profile, if any (started is a perf_counter value)"""
+    spans = active_spans.get()
+    if spans is not None:
+        spans.append((name, started, seconds))
+
+
+class RequestProfiler:
+    """Decides which requests to profile and stores the finished profiles"""
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        max_fraction: float = 0.01,
+        paths: Tuple[str, ...] = tuple(DEFAULT_PATHS.split(",")),
+        max_stored: int = 50
+    ):
+        self.token = token
+        self.sample_rate = sample_rate
+        self.max_fraction = max_fraction
+        self.paths = paths
+        self.max_stored = max_stored
+        self.profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._busy = False
+        self._rng = random.Random()
+
+        self.eligible = 0
+        self.profiled = 0
+        self.rejected = 0
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+
+    def eligible_path(self, path: str) -> bool:
+        return path.startswith(self.paths)
+
+    def acquire(self, requested: bool) -> Optional[str]:
+        """Reason to profile this eligible request ("requested" or "sampled"), or None"""
+        with self._lock:
+            self.eligible += 1
+            sampled = self.sample_rate > 0 and self._rng.random() < self.sample_rate
+            if not (requested or sampled):
+                return None
+            # One profile at a time, and never more than max_fraction of eligible traffic
+            if self._busy or self.profiled + 1 > self.max_fraction * self.eligible:
+                self.rejected += 1
+                return None
+            self._busy = True
+            self.profiled += 1
+            return "requested" if requested else "sampled"
+
+    def release(self) -> None:
+        with self._lock:
+            self._busy = False
+
+    def store(self, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            self.profiles[profile["id"]] = profile
+            while len(self.profiles) > self.max_stored:
+                self.profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return self.profiles.get(profile_id)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Stored profiles without their function tables, newest first"""
+        with self._lock:
+            profiles = list(self.profiles.values())
+        keys = ("id", "method", "path", "status", "reason", "started_at", "duration_ms")
+        return [{key: p[key] for key in keys} for p in reversed(profiles)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "eligible_requests": self.eligible,
+            "profiled_requests": self.profiled,
+            "rejected_requests": self.rejected,
+            "stored_profiles": len(self.profiles),
+            "sample_rate": self.sample_rate,
+            "max_fraction": self.max_fraction,
+            "paths": list(self.paths)
+        }
+
+
+def summarize_profile(profiler: cProfile.Profile) -> Tuple[List[Dict[str, Any]], bytes]:
+    """Top functions by cumulative time, and the raw pstats data (as written by dump_stats)"""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{function} ({os.path.basename(filename)}:{line})" if line else function,
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3)
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:TOP_FUNCTIONS], marshal.dumps(stats.stats)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles the requests RequestProfiler selects"""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    def _requested(self, scope) -> bool:
+        token = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                token = value.decode("latin-1")
+                break
+        if token is None and scope.get("query_string"):
+            token = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [None])[0]
+        return token is not None and self.profiler.authorized(token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.eligible_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        reason = self.profiler.acquire(self._requested(scope))
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:16]
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        spans: List[Tuple[str, float, float]] = []
+        token = active_spans.set(spans)
+        profiler = cProfile.Profile()
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            active_spans.reset(token)
+            self.profiler.release()
+            top, raw = summarize_profile(profiler)
+            self.profiler.store({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "reason": reason,
+                "started_at": started_at.isoformat(),
+                "duration_ms": round(elapsed * 1000, 3),
+                "spans": [
+                    {"name": name, "start_ms": round((span_start - started) * 1000, 3), "duration_ms": round(seconds * 1000, 3)}
+                    for name, span_start, seconds in spans
+                ],
+                "top_functions": top,
+                "pstats": raw
+            })
+
+
+def create_profiler_from_env() -> Optional[RequestProfiler]:
+    """Build the request profiler from PROFILING_* environment variables (None unless enabled)"""
+    if os.getenv("AGRICONNECT_PROFILING", "0").lower() not in ("1", "true", "yes"):
+        return None
+    token = os.getenv("PROFILING_TOKEN") or None
+    if token is None:
+        print("⚠️  AGRICONNECT_PROFILING is on without PROFILING_TOKEN: only sampled profiles, and /profiles is locked")
+    paths = tuple(p.strip() for p in os.getenv("PROFILING_PATHS", DEFAULT_PATHS).split(",") if p.strip())
+    return RequestProfiler(
+        token=token,
+        sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+        max_fraction=float(os.getenv("PROFILING_MAX_FRACTION", "0.01")),
+        paths=paths,
+        max_stored=int(os.getenv("PROFILING_MAX_STORED", "50"))
+    )
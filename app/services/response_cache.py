@@ -0,0 +1,136 @@
+"""
+Response cache for repeated chatbot questions
+"""
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+import hashlib
+import os
+import re
+import threading
+import time
+
+# Cache modes
+MODE_DETERMINISTIC = "deterministic"  # Only cache KB/fallback answers
+MODE_ALL = "all"                      # Also cache LLM-generated answers
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a user message so trivially different phrasings share a key"""
+    text = _PUNCTUATION_RE.sub(" ", message.lower())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+class ResponseCache:
+    """TTL + LRU cache of chatbot answers keyed on message and retrieved KB context"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, mode: str = MODE_DETERMINISTIC):
+        if mode not in (MODE_DETERMINISTIC, MODE_ALL):
+            raise ValueError(f"Invalid cache mode: {mode}. Must be one of: {MODE_DETERMINISTIC}, {MODE_ALL}")
+
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.mode = mode
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._kb_version = None
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.latency_saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(user_message: str, agri_context: str) -> str:
+        """Build a cache key from the normalized message and a hash of the KB context"""
+        context_hash = hashlib.sha1((agri_context or "").encode("utf-8")).hexdigest()
+        return f"{normalize_message(user_message)}|{context_hash}"
+
+    def accepts(self, is_ai_generated: bool) -> bool:
+        """Whether an answer of this kind may be stored under the current mode"""
+        return self.mode == MODE_ALL or not is_ai_generated
+
+    def check_kb_version(self, kb_version: int) -> None:
+        """Drop every entry if the knowledge base changed since the last check"""
+        with self._lock:
+            if self._kb_version is not None and kb_version != self._kb_version:
+                self._entries.clear()
+                self.invalidations += 1
+            self._kb_version = kb_version
+
+    def get(self, key: str, allow_ai_generated: bool = True) -> Optional[Dict[str, Any]]:
+        """Return a cached result dict, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry["is_ai_generated"] and not allow_ai_generated):
+                self.misses += 1
+                return None
+
+            if time.monotonic() - entry["stored_at"] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.latency_saved_seconds += entry["compute_seconds"]
+            return entry["result"]
+
+    def put(self, key: str, result: Dict[str, Any], is_ai_generated: bool, compute_seconds: float) -> bool:
+        """Store a result if the cache mode allows it. Returns True if stored."""
+        if not self.accepts(is_ai_generated):
+            return False
+
+        with self._lock:
+            self._entries[key] = {
+                "result": result,
+                "is_ai_generated": is_ai_generated,
+                "stored_at": time.monotonic(),
+                "compute_seconds": compute_seconds
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        """Remove all cached answers"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio, latency saved and occupancy"""
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": round(self.latency_saved_seconds, 4)
+        }
+
+
+def create_response_cache_from_env() -> Optional[ResponseCache]:
+    """Build the response cache from CHATBOT_CACHE_* environment variables"""
+    if os.getenv("CHATBOT_CACHE_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+
+    return ResponseCache(
+        max_entries=int(os.getenv("CHATBOT_CACHE_MAX_ENTRIES", "1024")),
+        ttl_seconds=float(os.getenv("CHATBOT_CACHE_TTL_SECONDS", "3600")),
+        mode=os.getenv("CHATBOT_CACHE_MODE", MODE_DETERMINISTIC).lower()
+    )
@@ -0,0 +1,175 @@
+"""
+Bulk import and export of fertilizer schedules as NDJSON or CSV
+
+Imports read the uploaded file line by line, validate rows in batches against
+FertilizerScheduleCreate and insert each valid batch in one store transaction.
+Invalid rows are reported with their row number and never abort the import.
+Exports page through the store with a cursor and yield one encoded page at a
+time, so neither direction holds the whole data set in memory.
+"""
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+import csv
+import io
+import json
+import time
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.models.fertilizer import FertilizerScheduleCreate
+from app.services.schedule_store import COLUMNS, new_schedule
+
+FORMATS = ("ndjson", "csv")
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Per-row errors returned in the import response; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+_batch_adapter = TypeAdapter(List[FertilizerScheduleCreate])
+
+RowResult = Tuple[int, Optional[Dict[str, Any]], Optional[str]]  # (row number, data, parse error)
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """ndjson or csv from the upload's file name or content type"""
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in (content_type or ""):
+        return "csv"
+    return None
+
+
+def iter_rows(stream: BinaryIO, fmt: str) -> Iterator[RowResult]:
+    """Parse an upload lazily into (row number, dict, None) or (row number, None, error)"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for record in reader:
+                # line_num is the line the record ends on (the header is line 1)
+                yield reader.line_num, {k: v for k, v in record.items() if k is not None}, None
+            return
+
+        for line_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(data, dict):
+                yield line_number, None, "Each line must be a JSON object"
+                continue
+            yield line_number, data, None
+    except UnicodeDecodeError as e:
+        yield -1, None, f"File is not valid UTF-8: {e}"
+    finally:
+        # Leave the underlying upload open for its owner to close
+        text.detach()
+
+
+def _validate_batch(rows: List[Tuple[int, Dict[str, Any]]]) -> Tuple[List[FertilizerScheduleCreate], List[Dict[str, Any]]]:
+    """Validate a batch in one pydantic call, falling back to the valid subset on errors"""
+    try:
+        return _batch_adapter.validate_python([data for _, data in rows]), []
+    except ValidationError as e:
+        failures: Dict[int, List[str]] = {}
+        for error in e.errors():
+            index, *field = error["loc"]
+            failures.setdefault(index, []).append(f"{'.'.join(str(f) for f in field) or 'row'}: {error['msg']}")
+
+    errors = [{"row": rows[i][0], "errors": messages} for i, messages in sorted(failures.items())]
+    valid_rows = [data for i, (_, data) in enumerate(rows) if i not in failures]
+    return _batch_adapter.validate_python(valid_rows), errors
+
+
+def import_schedules(
+    store,
+    stream: BinaryIO,
+    fmt: str,
+    batch_size: int = 1000,
+    on_created: Callable[[List[Dict[str, Any]]], None] = None
+) -> Dict[str, Any]:
+    """Validate and insert every row of an upload; returns counts and per-row errors
+
+    on_created is called with each inserted batch (e.g. to arm the due-schedule engine).
+    """
+    started = time.perf_counter()
+    total = imported = failed = 0
+    errors: List[Dict[str, Any]] = []
+
+    def record_errors(row_errors: List[Dict[str, Any]]) -> None:
+        nonlocal failed
+        failed += len(row_errors)
+        errors.extend(row_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    def flush(batch: List[Tuple[int, Dict[str, Any]]]) -> None:
+        nonlocal imported
+        valid, row_errors = _validate_batch(batch)
+        record_errors(row_errors)
+        if valid:
+            schedules = [new_schedule(s.fertilizer_type, s.amount, s.target_field, s.scheduled_date) for s in valid]
+            imported += store.create_many(schedules)
+            if on_created is not None:
+                on_created(schedules)
+
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    for row_number, data, parse_error in iter_rows(stream, fmt):
+        total += 1
+        if parse_error is not None:
+            record_errors([{"row": row_number, "errors": [parse_error]}])
+            continue
+        batch.append((row_number, data))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    # Parse errors are recorded as they occur, validation errors per batch
+    errors.sort(key=lambda error: error["row"])
+
+    return {
+        "format": fmt,
+        "total_rows": total,
+        "imported": imported,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def _cell(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_schedules(store, fmt: str, page_size: int = 1000, **filters) -> Iterator[str]:
+    """Yield the encoded export one page of rows at a time, paging through the store"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def encode(values: List[Any]) -> str:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(values)
+            return buffer.getvalue()
+
+        yield encode(list(COLUMNS))
+    else:
+        encode = None
+
+    cursor = None
+    while True:
+        page, cursor = store.list(cursor=cursor, limit=page_size, **filters)
+        if encode is not None:
+            chunk = [encode([_cell(schedule.get(column)) for column in COLUMNS]) for schedule in page]
+        else:
+            chunk = [json.dumps({column: _cell(schedule.get(column)) for column in COLUMNS}) + "\n" for schedule in page]
+        if chunk:
+            yield "".join(chunk)
+        if cursor is None:
+            return
@@ -0,0 +1,166 @@
+"""
+Structured dosage for fertilizer schedules and incrementally maintained aggregates
+
+`amount` ("50kg/acre", "2.5 L per ha") is parsed at write time into a quantity in
+a canonical unit (kg or l) and per-area basis (ha, or None for a flat amount), and
+`target_field` ("Field A - Wheat") into field and crop. Every schedule contributes
+to one aggregate cell per dimension (field, crop, fertilizer type, month), keyed
+by status and unit. Stores add and subtract a schedule's cells on every write, so
+a report walks the cells (O(groups)) instead of re-parsing every row.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import re
+
+# Derived fields stored on every schedule
+DOSAGE_FIELDS = ("quantity", "unit", "per_area", "field", "crop")
+
+AGGREGATE_DIMENSIONS = ("field", "crop", "fertilizer_type", "month")
+
+# Unit spelling -> (canonical unit, factor to it)
+_UNITS = {
+    "kg": ("kg", 1.0), "kgs": ("kg", 1.0), "kilogram": ("kg", 1.0), "kilograms": ("kg", 1.0),
+    "g": ("kg", 0.001), "gm": ("kg", 0.001), "gram": ("kg", 0.001), "grams": ("kg", 0.001),
+    "mg": ("kg", 1e-6),
+    "t": ("kg", 1000.0), "ton": ("kg", 1000.0), "tons": ("kg", 1000.0), "tonne": ("kg", 1000.0), "tonnes": ("kg", 1000.0),
+    "q": ("kg", 100.0), "qtl": ("kg", 100.0), "quintal": ("kg", 100.0), "quintals": ("kg", 100.0),
+    "lb": ("kg", 0.45359237), "lbs": ("kg", 0.45359237),
+    "l": ("l", 1.0), "lt": ("l", 1.0), "ltr": ("l", 1.0), "litre": ("l", 1.0), "liter": ("l", 1.0),
+    "litres": ("l", 1.0), "liters": ("l", 1.0),
+    "ml": ("l", 0.001),
+    "gal": ("l", 3.785411784), "gallon": ("l", 3.785411784), "gallons": ("l", 3.785411784),
+}
+
+# Area spelling -> hectares per unit; a rate per area is divided by it to get a rate per ha
+_AREAS = {
+    "ha": 1.0, "hectare": 1.0, "hectares": 1.0,
+    "acre": 0.40468564224, "acres": 0.40468564224, "ac": 0.40468564224,
+    "m2": 0.0001, "sqm": 0.0001,
+}
+
+_AMOUNT_PATTERN = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([a-z]+)\s*(?:(?:/|per\b)\s*([a-z0-9]+))?\s*$", re.IGNORECASE)
+
+# (dimension, group, status, unit key); unit key is "kg/ha", "l", ... or "" when unparsed
+CellKey = Tuple[str, str, str, str]
+
+
+def parse_amount(amount: str) -> Tuple[Optional[float], Optional[str], Optional[str]]:
+    """(quantity, unit, per_area) in kg or l and per ha; (None, None, None) if unrecognized"""
+    match = _AMOUNT_PATTERN.match(amount or "")
+    if match is None:
+        return None, None, None
+    number, unit, area = match.groups()
+    if unit.lower() not in _UNITS or (area is not None and area.lower() not in _AREAS):
+        return None, None, None
+    unit, factor = _UNITS[unit.lower()]
+    quantity = float(number.replace(",", ".")) * factor
+    if area is None:
+        return round(quantity, 6), unit, None
+    return round(quantity / _AREAS[area.lower()], 6), unit, "ha"
+
+
+def parse_target_field(target_field: str) -> Tuple[str, Optional[str]]:
+    """("Field A", "Wheat") from "Field A - Wheat"; the crop is None without a separator"""
+    field, separator, crop = (target_field or "").partition(" - ")
+    if not separator:
+        return field.strip(), None
+    return field.strip(), crop.strip() or None
+
+
+def apply_dosage(schedule: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill the DOSAGE_FIELDS of a schedule from its amount and target_field (in place)"""
+    schedule["quantity"], schedule["unit"], schedule["per_area"] = parse_amount(schedule["amount"])
+    schedule["field"], schedule["crop"] = parse_target_field(schedule["target_field"])
+    return schedule
+
+
+def unit_key(schedule: Dict[str, Any]) -> str:
+    if schedule.get("unit") is None:
+        return ""
+    return f"{schedule['unit']}/{schedule['per_area']}" if schedule.get("per_area") else schedule["unit"]
+
+
+def month_key(value: datetime) -> str:
+    """YYYY-MM in server local time, matching schedule_store.date_key"""
+    if value.tzinfo is not None:
+        value = value.astimezone()
+    return value.strftime("%Y-%m")
+
+
+def aggregate_cells(schedule: Dict[str, Any]) -> List[CellKey]:
+    """The aggregate cells a schedule counts towards (expects apply_dosage to have run)"""
+    groups = {
+        "field": schedule.get("field"),
+        "crop": schedule.get("crop"),
+        "fertilizer_type": schedule["fertilizer_type"],
+        "month": month_key(schedule["scheduled_date"]),
+    }
+    unit = unit_key(schedule)
+    return [
+        (dimension, group, schedule["status"], unit)
+        for dimension, group in groups.items() if group is not None
+    ]
+
+
+def aggregate_deltas(removed: Iterable[Dict[str, Any]] = (), added: Iterable[Dict[str, Any]] = ()) -> Dict[CellKey, List[float]]:
+    """Net [count, total] change per cell for replacing `removed` schedules with `added` ones"""
+    deltas: Dict[CellKey, List[float]] = {}
+    for sign, schedules in ((-1, removed), (1, added)):
+        for schedule in schedules:
+            quantity = schedule.get("quantity") or 0.0
+            for cell in aggregate_cells(schedule):
+                delta = deltas.setdefault(cell, [0, 0.0])
+                delta[0] += sign
+                delta[1] += sign * quantity
+    # An update that keeps a schedule in the same cells only moves the totals
+    return {cell: delta for cell, delta in deltas.items() if delta[0] or delta[1]}
+
+
+class ScheduleAggregates:
+    """[count, total] per cell, kept in step with an in-memory store"""
+
+    def __init__(self):
+        self._cells: Dict[CellKey, List[float]] = {}
+
+    def apply(self, deltas: Dict[CellKey, List[float]]) -> None:
+        cells = self._cells
+        for cell, (count, total) in deltas.items():
+            current = cells.setdefault(cell, [0, 0.0])
+            current[0] += count
+            current[1] += total
+            if current[0] <= 0:
+                del cells[cell]
+
+    def items(self) -> List[Tuple[CellKey, List[float]]]:
+        return list(self._cells.items())
+
+
+def summarize(
+    cells: Iterable[Tuple[CellKey, Tuple[float, float]]],
+    dimensions: Iterable[str] = AGGREGATE_DIMENSIONS,
+    statuses: Optional[Iterable[str]] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Group cells into {dimension: [{group, count, unparsed, totals: {unit: total}}]} sorted by group"""
+    dimensions = set(dimensions)
+    statuses = set(statuses) if statuses else None
+    groups: Dict[str, Dict[str, Dict[str, Any]]] = {dimension: {} for dimension in dimensions}
+    for (dimension, group, status, unit), (count, total) in cells:
+        if dimension not in dimensions or (statuses is not None and status not in statuses):
+            continue
+        entry = groups[dimension].setdefault(group, {"group": group, "count": 0, "unparsed": 0, "totals": {}})
+        entry["count"] += count
+        if unit:
+            entry["totals"][unit] = entry["totals"].get(unit, 0.0) + total
+        else:
+            entry["unparsed"] += count
+
+    report = {}
+    for dimension in AGGREGATE_DIMENSIONS:
+        if dimension not in dimensions:
+            continue
+        entries = sorted(groups[dimension].values(), key=lambda entry: entry["group"])
+        for entry in entries:
+            # Incremental add/subtract leaves float noise; totals are reported to 1e-6
+            entry["totals"] = {unit: round(total, 6) for unit, total in sorted(entry["totals"].items())}
+        report[dimension] = entries
+    return report
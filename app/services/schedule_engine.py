@@ -0,0 +1,254 @@
+"""
+Background engine that moves fertilizer schedules to PENDING when they fall due
+
+Upcoming SCHEDULED entries sit in a min-heap keyed by scheduled_date. Creating,
+rescheduling or deleting a schedule is an O(log n) push (superseded entries are
+skipped lazily when popped), and the worker thread sleeps until the earliest due
+date instead of scanning the store. Before each transition the schedule is
+re-read and updated with a compare-and-set, so stale heap entries and edits made
+by other workers never cause a wrong transition.
+
+Dates without a timezone are server local time, like the datetime.now() stamps
+the API writes; the engine compares them with the local clock (see
+schedule_store.date_key).
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import heapq
+import itertools
+import os
+import threading
+
+from app.services.schedule_store import date_key
+
+HeapEntry = Tuple[datetime, int, str]  # (normalized scheduled_date, tie-breaker, schedule id)
+
+DueListener = Callable[[Dict[str, Any]], None]
+
+
+def local_now() -> datetime:
+    """Current time in the same naive local frame as schedule_store.date_key"""
+    return datetime.now()
+
+
+class DueScheduleEngine:
+    """Min-heap of upcoming schedules plus a thread that transitions the due ones"""
+
+    def __init__(
+        self,
+        store,
+        watch_status: str = "SCHEDULED",
+        due_status: str = "PENDING",
+        clock: Callable[[], datetime] = local_now,
+        max_events: int = 1000,
+        max_sleep_seconds: float = 60.0,
+        batch_size: int = 500
+    ):
+        self.store = store
+        self.watch_status = watch_status
+        self.due_status = due_status
+        self.clock = clock
+        self.max_sleep_seconds = max_sleep_seconds
+        self.batch_size = batch_size
+
+        self._heap: List[HeapEntry] = []
+        # Live entry per schedule; heap entries not in here are superseded
+        self._entries: Dict[str, HeapEntry] = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._listeners: List[DueListener] = []
+
+        # Recent due events for polling clients, each with an increasing sequence number
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self._event_seq = 0
+
+        self.transitioned = 0
+        self.skipped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def load(self) -> int:
+        """Track every schedule currently in the watched status (walks the status index only)"""
+        entries = []
+        cursor = None
+        while True:
+            page, cursor = self.store.list(status=self.watch_status, cursor=cursor, limit=1000)
+            entries.extend((date_key(s["scheduled_date"]), s["id"]) for s in page)
+            if cursor is None:
+                break
+        with self._cond:
+            for key, schedule_id in entries:
+                entry = (key, next(self._counter), schedule_id)
+                self._entries[schedule_id] = entry
+                self._heap.append(entry)
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        return len(entries)
+
+    def track(self, schedule: Dict[str, Any]) -> None:
+        """Called after a schedule is created or changed; (re)arms or disarms it"""
+        if schedule["status"] != self.watch_status:
+            self.untrack(schedule["id"])
+            return
+        key = date_key(schedule["scheduled_date"])
+        with self._cond:
+            current = self._entries.get(schedule["id"])
+            if current is not None and current[0] == key:
+                return
+            entry = (key, next(self._counter), schedule["id"])
+            self._entries[schedule["id"]] = entry
+            heapq.heappush(self._heap, entry)
+            self._compact()
+            # Wake the worker if this is now the earliest due date
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def track_many(self, schedules: List[Dict[str, Any]]) -> None:
+        for schedule in schedules:
+            self.track(schedule)
+
+    def untrack(self, schedule_id: str) -> None:
+        """Called after a schedule is deleted or leaves the watched status"""
+        with self._cond:
+            self._entries.pop(schedule_id, None)
+
+    def subscribe(self, listener: DueListener) -> None:
+        """Call listener(event) for every transition (from the engine thread)"""
+        self._listeners.append(listener)
+
+    def next_due(self) -> Optional[datetime]:
+        with self._cond:
+            self._drop_superseded()
+            return self._heap[0][0] if self._heap else None
+
+    def run_due(self) -> int:
+        """Transition every schedule due by now; returns the number transitioned"""
+        count = 0
+        while True:
+            now = self.clock()
+            batch: List[str] = []
+            with self._cond:
+                while self._heap and len(batch) < self.batch_size:
+                    self._drop_superseded()
+                    if not self._heap or self._heap[0][0] > now:
+                        break
+                    _, _, schedule_id = heapq.heappop(self._heap)
+                    del self._entries[schedule_id]
+                    batch.append(schedule_id)
+            if not batch:
+                return count
+            for schedule_id in batch:
+                count += self._transition(schedule_id, now)
+
+    def _transition(self, schedule_id: str, now: datetime) -> int:
+        schedule = self.store.get(schedule_id)
+        if schedule is None or schedule["status"] != self.watch_status:
+            self.skipped += 1
+            return 0
+        if date_key(schedule["scheduled_date"]) > now:
+            # Rescheduled later (possibly by another worker) since it was armed
+            self.track(schedule)
+            self.skipped += 1
+            return 0
+
+        updated = self.store.update(
+            schedule_id,
+            {"status": self.due_status, "updated_at": datetime.now()},
+            expected={"status": self.watch_status, "scheduled_date": schedule["scheduled_date"]}
+        )
+        if updated is None:
+            self.skipped += 1
+            return 0
+
+        self.transitioned += 1
+        with self._cond:
+            self._event_seq += 1
+            event = {
+                "seq": self._event_seq,
+                "type": "schedule_due",
+                "schedule_id": schedule_id,
+                "status": self.due_status,
+                "scheduled_date": schedule["scheduled_date"].isoformat(),
+                "target_field": schedule["target_field"],
+                "fertilizer_type": schedule["fertilizer_type"],
+                "due_at": now.astimezone().isoformat()
+            }
+            self.events.append(event)
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"❌ Due event listener error: {e}")
+        return 1
+
+    def events_after(self, seq: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Buffered events with a sequence number above seq, oldest first"""
+        with self._cond:
+            return [event for event in self.events if event["seq"] > seq][:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        next_due = self.next_due()
+        with self._cond:
+            return {
+                "tracked": len(self._entries),
+                "heap_size": len(self._heap),
+                "next_due": next_due.astimezone().isoformat() if next_due else None,
+                "transitioned": self.transitioned,
+                "skipped": self.skipped,
+                "last_event_seq": self._event_seq,
+                "running": self._thread is not None and self._thread.is_alive()
+            }
+
+    def start(self) -> None:
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="fertilizer-due-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_due()
+            except Exception as e:
+                print(f"❌ Due engine error: {e}")
+            with self._cond:
+                if self._stopped:
+                    return
+                self._drop_superseded()
+                timeout = self.max_sleep_seconds
+                if self._heap:
+                    timeout = min(timeout, max(0.0, (self._heap[0][0] - self.clock()).total_seconds()))
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+
+    def _drop_superseded(self) -> None:
+        """Pop heap entries replaced by a later track() or removed by untrack() (caller holds the lock)"""
+        heap, entries = self._heap, self._entries
+        while heap and entries.get(heap[0][2]) is not heap[0]:
+            heapq.heappop(heap)
+
+    def _compact(self) -> None:
+        """Rebuild the heap when superseded entries dominate it (caller holds the lock)"""
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+
+def create_due_engine_from_env(store) -> Optional[DueScheduleEngine]:
+    """Build the due-schedule engine from FERTILIZER_DUE_* environment variables (None if disabled)"""
+    if os.getenv("FERTILIZER_DUE_ENGINE", "true").lower() != "true":
+        return None
+    return DueScheduleEngine(
+        store,
+        due_status=os.getenv("FERTILIZER_DUE_STATUS", "PENDING").upper(),
+        max_events=int(os.getenv("FERTILIZER_DUE_MAX_EVENTS", "1000"))
+    )
@@ -0,0 +1,702 @@
+"""
+Fertilizer schedule stores: indexed in-memory (also the test double) and SQLite
+
+In memory, schedules are kept in a dict by id plus sorted (scheduled_date, id) indexes: one
+over all schedules and one per status and per target field. Create, update and
+delete adjust the indexes with bisect, so listing a date range, a status or a
+field is a binary search plus a short walk instead of a full copy and sort. The
+SQLite store keeps the same data in one WAL database shared by all workers, with
+matching SQL indexes, and exposes the same methods.
+
+Every write bumps a store-wide version and stamps the schedule with it; deletions
+leave a tombstone. changes(since) returns what was created, updated or deleted
+after a version, so clients can sync incrementally. Old tombstones are compacted,
+and a `since` older than the compaction floor raises ChangesExpired.
+
+Writes also normalize the dosage (schedule_dosage.apply_dosage) and adjust the
+per-field, crop, type and month aggregates in the same lock or transaction.
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import atexit
+import base64
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+from app.services.sqlite_pool import SQLiteConnectionPool
+from app.services.schedule_dosage import (
+    AGGREGATE_DIMENSIONS,
+    DOSAGE_FIELDS,
+    ScheduleAggregates,
+    aggregate_deltas,
+    apply_dosage,
+    summarize
+)
+
+VALID_STATUSES = ["PENDING", "SCHEDULED", "COMPLETED", "CANCELLED"]
+
+# Indexed fields; a change to any of them moves the schedule between indexes
+INDEXED_FIELDS = ("scheduled_date", "status", "target_field")
+
+IndexKey = Tuple[datetime, str]  # (normalized scheduled_date, id)
+
+# Sorts after every real id, so (date, _MAX_ID) bounds all schedules at that instant
+_MAX_ID = "\U0010ffff"
+
+
+class ChangesExpired(ValueError):
+    """The requested version predates compacted tombstones (or this store); the client must resync"""
+
+
+def new_schedule(fertilizer_type: str, amount: str, target_field: str, scheduled_date: datetime) -> Dict[str, Any]:
+    """Record for a newly created schedule: fresh id, SCHEDULED status, timestamps"""
+    now = datetime.now()
+    return {
+        "id": str(uuid.uuid4()),
+        "fertilizer_type": fertilizer_type,
+        "amount": amount,
+        "target_field": target_field,
+        "scheduled_date": scheduled_date,
+        "status": "SCHEDULED",
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+def date_key(value: datetime) -> datetime:
+    """
+    Naive local datetime so timezone-aware and naive dates sort together
+
+    Naive dates are server local time (the API stamps records with datetime.now()),
+    so they are kept as-is and aware ones are converted to the local zone.
+    """
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def encode_cursor(key: IndexKey) -> str:
+    """Opaque pagination cursor for the last returned schedule"""
+    raw = json.dumps([key[0].isoformat(), key[1]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> IndexKey:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        date_text, schedule_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(date_text), str(schedule_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class SortedIndex:
+    """Sorted unique keys split into bounded chunks, so an insert or delete only shifts one chunk"""
+
+    _LOAD = 512
+
+    def __init__(self):
+        self._chunks: List[List[IndexKey]] = []
+        self._maxes: List[IndexKey] = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, key: IndexKey) -> None:
+        if not self._chunks:
+            self._chunks.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            return
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+            chunk = self._chunks[i]
+            chunk.append(key)
+            self._maxes[i] = key
+        else:
+            chunk = self._chunks[i]
+            insort(chunk, key)
+        self._len += 1
+        if len(chunk) > 2 * self._LOAD:
+            self._chunks[i:i + 1] = [chunk[:self._LOAD], chunk[self._LOAD:]]
+            self._maxes[i:i + 1] = [chunk[self._LOAD - 1], chunk[-1]]
+
+    def remove(self, key: IndexKey) -> bool:
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        chunk = self._chunks[i]
+        j = bisect_left(chunk, key)
+        if chunk[j] != key:
+            return False
+        del chunk[j]
+        self._len -= 1
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i]
+            del self._maxes[i]
+        return True
+
+    def irange(self, minimum: IndexKey = None, maximum: IndexKey = None, inclusive_min: bool = True) -> Iterator[IndexKey]:
+        """Keys from minimum (inclusive or not) up to maximum (inclusive), in order"""
+        find = bisect_left if inclusive_min else bisect_right
+        i = find(self._maxes, minimum) if minimum is not None else 0
+        j = find(self._chunks[i], minimum) if minimum is not None and i < len(self._chunks) else 0
+        for chunk in self._chunks[i:]:
+            for key in chunk[j:]:
+                if maximum is not None and key > maximum:
+                    return
+                yield key
+            j = 0
+
+
+class InMemoryScheduleStore:
+    """Schedules by id with sorted date, status and target-field indexes and a change log"""
+
+    def __init__(self, max_tombstones: int = 10000):
+        self._schedules: Dict[str, Dict[str, Any]] = {}
+        self._by_date = SortedIndex()
+        self._by_status: Dict[str, SortedIndex] = {}
+        self._by_field: Dict[str, SortedIndex] = {}
+        self._lock = threading.RLock()
+        self._aggregates = ScheduleAggregates()
+
+        # Store-wide version, bumped on every write
+        self.version = 0
+        self.max_tombstones = max_tombstones
+        self._item_versions: Dict[str, int] = {}
+        # Deleted id -> version of the delete, oldest first
+        self._tombstones: Dict[str, int] = {}
+        # Append-only (version, id) log; entries superseded by a later write are skipped
+        self._log: List[Tuple[int, str]] = []
+        # changes(since) is only complete for since >= changes_floor
+        self.changes_floor = 0
+
+    def __contains__(self, schedule_id: str) -> bool:
+        return schedule_id in self._schedules
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    def get(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        return self._schedules.get(schedule_id)
+
+    def create(self, schedule: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a new schedule (must carry its id) and index it"""
+        apply_dosage(schedule)
+        with self._lock:
+            self._schedules[schedule["id"]] = schedule
+            self._index(schedule)
+            self._aggregates.apply(aggregate_deltas(added=[schedule]))
+            self._record(schedule["id"])
+        return schedule
+
+    def create_many(self, schedules: List[Dict[str, Any]]) -> int:
+        """Store and index a batch of new schedules under one lock acquisition"""
+        for schedule in schedules:
+            apply_dosage(schedule)
+        deltas = aggregate_deltas(added=schedules)
+        with self._lock:
+            for schedule in schedules:
+                self._schedules[schedule["id"]] = schedule
+                self._index(schedule)
+                self._record(schedule["id"])
+            self._aggregates.apply(deltas)
+        return len(schedules)
+
+    def update(self, schedule_id: str, changes: Dict[str, Any], expected: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """Apply field changes; re-indexes only when an indexed field changes
+
+        With `expected`, the update only happens if those fields still hold those
+        values (compare-and-set). Returns None if the schedule is missing or the
+        expectation fails.
+        """
+        with self._lock:
+            schedule = self._schedules.get(schedule_id)
+            if schedule is None:
+                return None
+            if expected and any(schedule.get(field) != value for field, value in expected.items()):
+                return None
+            reindex = any(field in changes and changes[field] != schedule[field] for field in INDEXED_FIELDS)
+            if reindex:
+                self._unindex(schedule)
+            before = dict(schedule)
+            schedule.update(changes)
+            apply_dosage(schedule)
+            if reindex:
+                self._index(schedule)
+            self._aggregates.apply(aggregate_deltas(removed=[before], added=[schedule]))
+            self._record(schedule_id)
+            return schedule
+
+    def delete(self, schedule_id: str) -> bool:
+        with self._lock:
+            schedule = self._schedules.pop(schedule_id, None)
+            if schedule is None:
+                return False
+            self._unindex(schedule)
+            self._aggregates.apply(aggregate_deltas(removed=[schedule]))
+            self._record(schedule_id, deleted=True)
+            return True
+
+    def item_version(self, schedule_id: str) -> Optional[int]:
+        """Version of the last write to a schedule (None if missing)"""
+        return self._item_versions.get(schedule_id)
+
+    def changes(self, since: int, limit: int = 1000) -> Tuple[List[Dict[str, Any]], bool]:
+        """Writes after version `since`, oldest first: ([{op, id, version, schedule?}], has_more)
+
+        op is "upsert" (with the current schedule) or "delete". Raises ChangesExpired
+        if since is older than the compaction floor or newer than this store.
+        """
+        with self._lock:
+            if since < self.changes_floor or since > self.version:
+                raise ChangesExpired(f"Version {since} is no longer available; resync from the full list")
+            changes: List[Dict[str, Any]] = []
+            for position in range(bisect_right(self._log, (since, _MAX_ID)), len(self._log)):
+                version, schedule_id = self._log[position]
+                if self._item_versions.get(schedule_id) == version:
+                    change = {"op": "upsert", "id": schedule_id, "version": version, "schedule": dict(self._schedules[schedule_id])}
+                elif self._tombstones.get(schedule_id) == version:
+                    change = {"op": "delete", "id": schedule_id, "version": version}
+                else:
+                    continue
+                if len(changes) == limit:
+                    return changes, True
+                changes.append(change)
+            return changes, False
+
+    def _record(self, schedule_id: str, deleted: bool = False) -> None:
+        """Bump the version for a write to one schedule (caller holds the lock)"""
+        self.version += 1
+        self._log.append((self.version, schedule_id))
+        if deleted:
+            self._item_versions.pop(schedule_id, None)
+            self._tombstones[schedule_id] = self.version
+            if len(self._tombstones) > self.max_tombstones:
+                # Forget the oldest delete; clients behind it can no longer sync incrementally
+                oldest_id = next(iter(self._tombstones))
+                self.changes_floor = self._tombstones.pop(oldest_id)
+        else:
+            self._item_versions[schedule_id] = self.version
+            self._tombstones.pop(schedule_id, None)
+
+        # Drop superseded log entries once they dominate the log
+        if len(self._log) > 2 * (len(self._item_versions) + len(self._tombstones)) + 1024:
+            live = [(v, i) for i, v in self._item_versions.items()] + [(v, i) for i, v in self._tombstones.items()]
+            self._log = sorted(live)
+
+    def list(
+        self,
+        status: Optional[str] = None,
+        target_field: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Schedules ordered by scheduled_date (then id), filtered, one page at a time
+
+        date_from/date_to are inclusive. Returns (schedules, next_cursor); next_cursor
+        is None on the last page. Raises ValueError for a malformed cursor.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            # Walk the most selective index; the other filter (if any) is checked per item
+            candidates = [self._by_date]
+            if status is not None:
+                candidates.append(self._by_status.get(status, SortedIndex()))
+            if target_field is not None:
+                candidates.append(self._by_field.get(target_field, SortedIndex()))
+            index = min(candidates, key=len)
+
+            if after is not None and (not date_from or after >= (date_key(date_from), "")):
+                keys = index.irange(after, inclusive_min=False)
+            else:
+                keys = index.irange((date_key(date_from), "") if date_from else None)
+            maximum = (date_key(date_to), _MAX_ID) if date_to else None
+
+            page: List[Dict[str, Any]] = []
+            last_key: Optional[IndexKey] = None
+            for key in keys:
+                if maximum is not None and key > maximum:
+                    break
+                schedule = self._schedules[key[1]]
+                if status is not None and schedule["status"] != status:
+                    continue
+                if target_field is not None and schedule["target_field"] != target_field:
+                    continue
+                if limit is not None and len(page) == limit:
+                    return page, encode_cursor(last_key)
+                page.append(schedule)
+                last_key = key
+            return page, None
+
+    def counts_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            return {status: len(index) for status, index in self._by_status.items() if index}
+
+    def aggregates(self, dimensions=AGGREGATE_DIMENSIONS, statuses: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Count and totals per unit for every group of each dimension (see schedule_dosage.summarize)"""
+        with self._lock:
+            cells = self._aggregates.items()
+        return summarize(cells, dimensions, statuses)
+
+    def _index(self, schedule: Dict[str, Any]) -> None:
+        key = (date_key(schedule["scheduled_date"]), schedule["id"])
+        self._by_date.add(key)
+        self._by_status.setdefault(schedule["status"], SortedIndex()).add(key)
+        self._by_field.setdefault(schedule["target_field"], SortedIndex()).add(key)
+
+    def _unindex(self, schedule: Dict[str, Any]) -> None:
+        key = (date_key(schedule["scheduled_date"]), schedule["id"])
+        self._by_date.remove(key)
+        self._by_status[schedule["status"]].remove(key)
+        field_index = self._by_field[schedule["target_field"]]
+        field_index.remove(key)
+        # Do not let one-off fields accumulate empty indexes
+        if not field_index:
+            del self._by_field[schedule["target_field"]]
+
+
+# Column order of the schedules table
+COLUMNS = ("id", "fertilizer_type", "amount", "target_field", "scheduled_date", "status", "created_at", "updated_at") + DOSAGE_FIELDS
+
+# Fixed-width so text order is chronological order
+_KEY_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def _to_text(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _from_text(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _row_to_schedule(row: sqlite3.Row) -> Dict[str, Any]:
+    schedule = {column: row[column] for column in COLUMNS}
+    for column in ("scheduled_date", "created_at", "updated_at"):
+        schedule[column] = _from_text(schedule[column])
+    return schedule
+
+
+def _schedule_params(schedule: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Insert/update parameters: every column plus the sortable date key"""
+    return (
+        schedule["id"], schedule["fertilizer_type"], schedule["amount"], schedule["target_field"],
+        _to_text(schedule["scheduled_date"]), schedule["status"],
+        _to_text(schedule.get("created_at")), _to_text(schedule.get("updated_at")),
+        *(schedule.get(field) for field in DOSAGE_FIELDS),
+        date_key(schedule["scheduled_date"]).strftime(_KEY_FORMAT)
+    )
+
+
+class SQLiteScheduleStore:
+    """Fertilizer schedules in SQLite (WAL), shared by every worker process"""
+
+    _SELECT = f"SELECT {', '.join(COLUMNS)} FROM fertilizer_schedules"
+    _UPSERT = (
+        f"INSERT OR REPLACE INTO fertilizer_schedules ({', '.join(COLUMNS)}, scheduled_key, version) "
+        f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))})"
+    )
+
+    def __init__(
+        self,
+        db_path: str = "fertilizer.db",
+        pool_size: int = 4,
+        max_tombstones: int = 10000,
+        pool_timeout_seconds: float = 30.0
+    ):
+        self.db_path = db_path
+        self.max_tombstones = max_tombstones
+        self._deletes_since_prune = 0
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._pool = SQLiteConnectionPool(db_path, size=pool_size, acquire_timeout_seconds=pool_timeout_seconds)
+        with self._pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fertilizer_schedules (
+                    id TEXT PRIMARY KEY,
+                    fertilizer_type TEXT NOT NULL,
+                    amount TEXT NOT NULL,
+                    target_field TEXT NOT NULL,
+                    scheduled_date TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    quantity REAL,
+                    unit TEXT,
+                    per_area TEXT,
+                    field TEXT,
+                    crop TEXT,
+                    scheduled_key TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # Same access paths as the in-memory indexes; id makes every key unique for cursors
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fertilizer_schedules_date ON fertilizer_schedules (scheduled_key, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fertilizer_schedules_status ON fertilizer_schedules (status, scheduled_key, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fertilizer_schedules_field ON fertilizer_schedules (target_field, scheduled_key, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fertilizer_schedules_version ON fertilizer_schedules (version)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fertilizer_schedule_tombstones (
+                    id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fertilizer_schedule_tombstones_version ON fertilizer_schedule_tombstones (version)")
+            # Store-wide version counter and compaction floor, shared by all workers
+            conn.execute("CREATE TABLE IF NOT EXISTS fertilizer_store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO fertilizer_store_meta (key, value) VALUES ('version', 0), ('changes_floor', 0)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fertilizer_schedule_aggregates (
+                    dimension TEXT NOT NULL,
+                    grp TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    unit TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    PRIMARY KEY (dimension, grp, status, unit)
+                )
+            """)
+        atexit.register(self.close)
+
+    @staticmethod
+    def _apply_aggregates(conn: sqlite3.Connection, deltas) -> None:
+        """Add aggregate deltas inside the caller's write transaction"""
+        if not deltas:
+            return
+        params = [(*cell, int(count), total) for cell, (count, total) in deltas.items()]
+        conn.executemany(
+            "INSERT INTO fertilizer_schedule_aggregates (dimension, grp, status, unit, count, total) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (dimension, grp, status, unit) DO UPDATE SET count = count + excluded.count, total = total + excluded.total",
+            params
+        )
+        conn.executemany(
+            "DELETE FROM fertilizer_schedule_aggregates WHERE dimension = ? AND grp = ? AND status = ? AND unit = ? AND count <= 0",
+            [param[:4] for param in params if param[4] < 0]
+        )
+
+    @staticmethod
+    def _next_versions(conn: sqlite3.Connection, count: int = 1) -> int:
+        """Reserve `count` versions inside the caller's write transaction; returns the last one"""
+        conn.execute("UPDATE fertilizer_store_meta SET value = value + ? WHERE key = 'version'", (count,))
+        return conn.execute("SELECT value FROM fertilizer_store_meta WHERE key = 'version'").fetchone()[0]
+
+    def _meta(self, key: str) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT value FROM fertilizer_store_meta WHERE key = ?", (key,)).fetchone()[0]
+
+    @property
+    def version(self) -> int:
+        return self._meta("version")
+
+    @property
+    def changes_floor(self) -> int:
+        return self._meta("changes_floor")
+
+    def __contains__(self, schedule_id: str) -> bool:
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT 1 FROM fertilizer_schedules WHERE id = ?", (schedule_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM fertilizer_schedules").fetchone()[0]
+
+    def get(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        with self._pool.connection() as conn:
+            row = conn.execute(f"{self._SELECT} WHERE id = ?", (schedule_id,)).fetchone()
+        return _row_to_schedule(row) if row else None
+
+    def create(self, schedule: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a new schedule (must carry its id)"""
+        apply_dosage(schedule)
+        with self._pool.transaction() as conn:
+            version = self._next_versions(conn)
+            conn.execute(self._UPSERT, _schedule_params(schedule) + (version,))
+            conn.execute("DELETE FROM fertilizer_schedule_tombstones WHERE id = ?", (schedule["id"],))
+            self._apply_aggregates(conn, aggregate_deltas(added=[schedule]))
+        return schedule
+
+    def create_many(self, schedules: List[Dict[str, Any]]) -> int:
+        """Store a batch of new schedules in one transaction"""
+        for schedule in schedules:
+            apply_dosage(schedule)
+        deltas = aggregate_deltas(added=schedules)
+        with self._pool.transaction() as conn:
+            first = self._next_versions(conn, len(schedules)) - len(schedules) + 1
+            conn.executemany(self._UPSERT, [
+                _schedule_params(schedule) + (first + i,) for i, schedule in enumerate(schedules)
+            ])
+            conn.executemany("DELETE FROM fertilizer_schedule_tombstones WHERE id = ?", [(s["id"],) for s in schedules])
+            self._apply_aggregates(conn, deltas)
+        return len(schedules)
+
+    def update(self, schedule_id: str, changes: Dict[str, Any], expected: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """Apply field changes in one transaction; same contract as InMemoryScheduleStore.update"""
+        with self._pool.transaction() as conn:
+            row = conn.execute(f"{self._SELECT} WHERE id = ?", (schedule_id,)).fetchone()
+            if row is None:
+                return None
+            schedule = _row_to_schedule(row)
+            if expected and any(schedule.get(field) != value for field, value in expected.items()):
+                return None
+            before = dict(schedule)
+            schedule.update(changes)
+            apply_dosage(schedule)
+            conn.execute(self._UPSERT, _schedule_params(schedule) + (self._next_versions(conn),))
+            self._apply_aggregates(conn, aggregate_deltas(removed=[before], added=[schedule]))
+        return schedule
+
+    def delete(self, schedule_id: str) -> bool:
+        with self._pool.transaction() as conn:
+            row = conn.execute(f"{self._SELECT} WHERE id = ?", (schedule_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM fertilizer_schedules WHERE id = ?", (schedule_id,))
+            self._apply_aggregates(conn, aggregate_deltas(removed=[_row_to_schedule(row)]))
+            conn.execute(
+                "INSERT OR REPLACE INTO fertilizer_schedule_tombstones (id, version) VALUES (?, ?)",
+                (schedule_id, self._next_versions(conn))
+            )
+            self._deletes_since_prune += 1
+            if self._deletes_since_prune >= 100:
+                self._deletes_since_prune = 0
+                self._prune_tombstones(conn)
+        return True
+
+    def _prune_tombstones(self, conn: sqlite3.Connection) -> None:
+        """Keep the newest max_tombstones deletes and raise the changes floor past the rest"""
+        row = conn.execute(
+            "SELECT version FROM fertilizer_schedule_tombstones ORDER BY version DESC LIMIT 1 OFFSET ?",
+            (self.max_tombstones,)
+        ).fetchone()
+        if row is None:
+            return
+        conn.execute("DELETE FROM fertilizer_schedule_tombstones WHERE version <= ?", (row[0],))
+        conn.execute("UPDATE fertilizer_store_meta SET value = MAX(value, ?) WHERE key = 'changes_floor'", (row[0],))
+
+    def item_version(self, schedule_id: str) -> Optional[int]:
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT version FROM fertilizer_schedules WHERE id = ?", (schedule_id,)).fetchone()
+        return row[0] if row else None
+
+    def changes(self, since: int, limit: int = 1000) -> Tuple[List[Dict[str, Any]], bool]:
+        """Same contract as InMemoryScheduleStore.changes"""
+        with self._pool.connection() as conn:
+            # One read transaction so the version, rows and tombstones are a consistent snapshot
+            conn.execute("BEGIN")
+            try:
+                version, floor = (
+                    row[0] for row in conn.execute(
+                        "SELECT value FROM fertilizer_store_meta WHERE key IN ('version', 'changes_floor') ORDER BY key DESC"
+                    )
+                )
+                if since < floor or since > version:
+                    raise ChangesExpired(f"Version {since} is no longer available; resync from the full list")
+                rows = conn.execute(
+                    f"{self._SELECT.replace(' FROM', ', version FROM')} WHERE version > ? ORDER BY version LIMIT ?",
+                    (since, limit + 1)
+                ).fetchall()
+                tombstones = conn.execute(
+                    "SELECT id, version FROM fertilizer_schedule_tombstones WHERE version > ? ORDER BY version LIMIT ?",
+                    (since, limit + 1)
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+
+        changes = [
+            {"op": "upsert", "id": row["id"], "version": row["version"], "schedule": _row_to_schedule(row)}
+            for row in rows
+        ] + [{"op": "delete", "id": row["id"], "version": row["version"]} for row in tombstones]
+        changes.sort(key=lambda change: change["version"])
+        return changes[:limit], len(changes) > limit
+
+    def list(
+        self,
+        status: Optional[str] = None,
+        target_field: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Same contract as InMemoryScheduleStore.list"""
+        after = decode_cursor(cursor) if cursor else None
+        clauses: List[str] = []
+        params: List[Any] = []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if target_field is not None:
+            clauses.append("target_field = ?")
+            params.append(target_field)
+        if date_from is not None:
+            clauses.append("scheduled_key >= ?")
+            params.append(date_key(date_from).strftime(_KEY_FORMAT))
+        if date_to is not None:
+            clauses.append("scheduled_key <= ?")
+            params.append(date_key(date_to).strftime(_KEY_FORMAT))
+        if after is not None:
+            clauses.append("(scheduled_key > ? OR (scheduled_key = ? AND id > ?))")
+            after_key = after[0].strftime(_KEY_FORMAT)
+            params.extend([after_key, after_key, after[1]])
+
+        sql = self._SELECT
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY scheduled_key, id"
+        if limit is not None:
+            # One extra row tells whether another page exists
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        with self._pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = _row_to_schedule(rows[-1])
+            next_cursor = encode_cursor((date_key(last["scheduled_date"]), last["id"]))
+        return [_row_to_schedule(row) for row in rows], next_cursor
+
+    def counts_by_status(self) -> Dict[str, int]:
+        with self._pool.connection() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM fertilizer_schedules GROUP BY status").fetchall())
+
+    def aggregates(self, dimensions=AGGREGATE_DIMENSIONS, statuses: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Same contract as InMemoryScheduleStore.aggregates; reads the aggregate table only"""
+        with self._pool.connection() as conn:
+            rows = conn.execute("SELECT dimension, grp, status, unit, count, total FROM fertilizer_schedule_aggregates").fetchall()
+        return summarize((((row[0], row[1], row[2], row[3]), (row[4], row[5])) for row in rows), dimensions, statuses)
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+def create_schedule_store_from_env():
+    """Build the schedule store from FERTILIZER_STORE_* environment variables"""
+    backend = os.getenv("FERTILIZER_STORE_BACKEND", "memory").lower()
+    max_tombstones = int(os.getenv("FERTILIZER_MAX_TOMBSTONES", "10000"))
+    if backend == "sqlite":
+        return SQLiteScheduleStore(
+            db_path=os.getenv("FERTILIZER_DB_PATH", "fertilizer.db"),
+            pool_size=int(os.getenv("FERTILIZER_DB_POOL_SIZE", "4")),
+            max_tombstones=max_tombstones,
+            pool_timeout_seconds=float(os.getenv("FERTILIZER_DB_POOL_TIMEOUT_SECONDS", "30"))
+        )
+    if backend != "memory":
+        raise ValueError(f"Invalid FERTILIZER_STORE_BACKEND: {backend}. Must be one of: memory, sqlite")
+
+    return InMemoryScheduleStore(max_tombstones=max_tombstones)
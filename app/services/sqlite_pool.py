@@ -0,0 +1,68 @@
+"""
+Pooled SQLite connections shared by the SQLite-backed stores
+"""
+from contextlib import contextmanager
+from typing import Iterator, List
+import queue
+import sqlite3
+
+
+class PoolExhausted(RuntimeError):
+    """No pooled connection was returned within the acquire timeout"""
+
+
+class SQLiteConnectionPool:
+    """Fixed set of SQLite connections handed out one thread at a time
+
+    Connections are opened with check_same_thread=False so any threadpool worker can
+    borrow one; borrowing blocks, so never do it on the event loop. Each connection
+    keeps its own prepared statement cache, so the stores' constant SQL strings are
+    compiled once per connection.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, busy_timeout_ms: int = 5000, acquire_timeout_seconds: float = 30.0):
+        self.db_path = db_path
+        self.size = size
+        self.acquire_timeout_seconds = acquire_timeout_seconds
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+        self._all: List[sqlite3.Connection] = []
+        for _ in range(size):
+            conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL only syncs at checkpoints instead of on every commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._all.append(conn)
+            self._pool.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._pool.get(timeout=self.acquire_timeout_seconds)
+        except queue.Empty:
+            raise PoolExhausted(
+                f"All {self.size} connections to {self.db_path} stayed busy for {self.acquire_timeout_seconds}s"
+            ) from None
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection and run the block in one write transaction"""
+        with self.connection() as conn:
+            # IMMEDIATE takes the write lock up front, so read-modify-write cannot be interleaved
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self) -> None:
+        for conn in self._all:
+            conn.close()
+        self._all = []
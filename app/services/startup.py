@@ -0,0 +1,53 @@
+"""
+Startup timing report: how long each import and model load took
+"""
+from contextlib import contextmanager
+from typing import List, Dict, Any
+import time
+
+
+class StartupReport:
+    """Collects nested startup phases; `self_seconds` excludes time spent in nested phases"""
+
+    def __init__(self):
+        self.phases: List[Dict[str, Any]] = []
+        self._stack: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def phase(self, name: str, kind: str = "import"):
+        """Time a block of startup work (kind is "import", "model_load" or "warmup")"""
+        entry = {"name": name, "kind": kind, "depth": len(self._stack), "seconds": 0.0, "self_seconds": 0.0}
+        self.phases.append(entry)
+        self._stack.append(entry)
+        nested_before = sum(p["seconds"] for p in self.phases if p["depth"] == entry["depth"] + 1)
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stack.pop()
+            nested = sum(p["seconds"] for p in self.phases if p["depth"] == entry["depth"] + 1) - nested_before
+            entry["seconds"] = round(elapsed, 4)
+            entry["self_seconds"] = round(max(elapsed - nested, 0.0), 4)
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals per kind plus every phase in the order it started"""
+        by_kind: Dict[str, float] = {}
+        for p in self.phases:
+            by_kind[p["kind"]] = round(by_kind.get(p["kind"], 0.0) + p["self_seconds"], 4)
+        return {
+            "total_seconds": round(sum(p["seconds"] for p in self.phases if p["depth"] == 0), 4),
+            "by_kind": by_kind,
+            "phases": list(self.phases)
+        }
+
+    def print_report(self) -> None:
+        summary = self.summary()
+        print(f"⏱️  Startup took {summary['total_seconds']:.3f}s")
+        for p in summary["phases"]:
+            indent = "    " * (p["depth"] + 1)
+            print(f"{indent}{p['name']} [{p['kind']}]: {p['seconds']:.3f}s (self {p['self_seconds']:.3f}s)")
+
+
+# Global instance shared by the app and the services it loads
+startup_report = StartupReport()
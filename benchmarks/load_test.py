@@ -0,0 +1,367 @@
+"""
+End-to-end load test of the full app with stub models, compared against a baseline
+
+Boots `app.main:app` under uvicorn with tiny locally generated models
+(benchmarks/stub_models.py) and, for --chat-backend openai, a fake OpenAI server
+(benchmarks/fake_openai.py), so nothing is downloaded. Workers then send a
+weighted mix of image uploads, chat turns and fertilizer CRUD for a fixed
+duration. The harness reports throughput, p50/p95/p99 latency and error rate per
+route, plus the server's own stage timings from /metrics.
+
+With --baseline, each route is checked against the committed numbers and the
+tolerances stored in the baseline file: p95 may grow by `p95`, throughput may fall
+by `throughput` (both fractions), and the error rate may rise by `error_rate`.
+The exit status is 1 on any regression. --write-baseline records the current run.
+
+Usage:
+    python benchmarks/load_test.py [--concurrency 8] [--duration 30] [--warmup 5]
+        [--mix upload=1,chat=1,fertilizer=8] [--chat-backend local|openai]
+        [--baseline benchmarks/load_baseline.json] [--write-baseline] [--json results.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai import FakeOpenAIServer
+from stub_models import build_stub_models
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_baseline.json")
+
+DEFAULT_TOLERANCES = {"p95": 0.5, "throughput": 0.3, "error_rate": 0.01}
+
+CHAT_QUESTIONS = [
+    "How do I control early blight on tomato?",
+    "What fertilizer should I use for wheat?",
+    "When should I irrigate rice?",
+    "My apple leaves have black spots, what is it?",
+    "How much urea per acre for maize?",
+    "Is drip irrigation better than flood irrigation?",
+]
+
+# Relative weights of the fertilizer operations inside the "fertilizer" share of the mix
+FERTILIZER_OPERATIONS = {"create": 2, "get": 3, "list": 3, "status": 1, "delete": 1}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("upload", "chat", "fertilizer"):
+            raise ValueError(f"Unknown traffic kind: {name}. Must be one of: upload, chat, fertilizer")
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def sample_image(seed: int = 0, size: int = 224) -> bytes:
+    """A noisy PNG leaf-sized image, the same for every run"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    image = Image.frombytes("RGB", (size, size), bytes(rng.getrandbits(8) for _ in range(size * size * 3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def start_server(args, models: dict, openai_url: str, log_path: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DISEASE_MODEL_PATH=models["disease"],
+        CHATBOT_MODEL_NAME=models["chat"],
+        HF_HUB_OFFLINE="1",
+        TRANSFORMERS_OFFLINE="1",
+        FERTILIZER_STORE_BACKEND="memory",
+        CHATBOT_HISTORY_BACKEND="memory",
+        KB_CACHE_DIR=os.path.join(args.workdir, "kb_cache"),
+        DETECTION_JOBS_DB_PATH=os.path.join(args.workdir, "detection_jobs.db"),
+        KB_WATCH_INTERVAL_SECONDS="0",
+        PYTHONUNBUFFERED="1"
+    )
+    env.pop("OPENAI_API_KEY", None)
+    if openai_url:
+        env.update(OPENAI_API_KEY="load-test", OPENAI_BASE_URL=openai_url)
+
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float, log_path: str) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            with open(log_path) as f:
+                sys.exit(f"❌ Server exited during startup:\n{f.read()[-4000:]}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"❌ Server not ready after {timeout:.0f}s (log: {log_path})")
+
+
+class Worker:
+    """One simulated client: its own chat user and the schedules it created"""
+
+    def __init__(self, worker_id: int, client: httpx.AsyncClient, mix: dict, image: bytes, seed: int):
+        self.client = client
+        self.user_id = f"load-user-{worker_id}"
+        self.rng = random.Random(seed * 1000 + worker_id)
+        self.kinds, self.weights = zip(*mix.items())
+        self.image = image
+        self.schedule_ids = []
+
+    async def step(self):
+        """Send one request; returns (route, seconds, status) where status is None on transport errors"""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == "upload":
+            return await self._request(
+                "POST", "/api/disease-detection/upload", "POST /api/disease-detection/upload",
+                files={"file": ("leaf.png", self.image, "image/png")}
+            )
+        if kind == "chat":
+            return await self._request(
+                "POST", "/api/chatbot/message", "POST /api/chatbot/message",
+                json={"message": self.rng.choice(CHAT_QUESTIONS), "user_id": self.user_id}
+            )
+        return await self._fertilizer_step()
+
+    async def _fertilizer_step(self):
+        operation = self.rng.choices(list(FERTILIZER_OPERATIONS), list(FERTILIZER_OPERATIONS.values()))[0]
+        if operation != "list" and (operation == "create" or not self.schedule_ids):
+            day = self.rng.randint(1, 28)
+            route, seconds, status, body = await self._request(
+                "POST", "/api/fertilizer/schedules", "POST /api/fertilizer/schedules", with_body=True,
+                json={
+                    "fertilizer_type": self.rng.choice(["Urea", "NPK 10:26:26", "DAP"]),
+                    "amount": f"{self.rng.randint(10, 100)}kg/acre",
+                    "target_field": f"Field {self.rng.choice('ABCDEF')} - {self.rng.choice(['Wheat', 'Rice', 'Tomatoes'])}",
+                    "scheduled_date": f"2030-{self.rng.randint(1, 12):02d}-{day:02d}T06:00:00"
+                }
+            )
+            if status == 200:
+                self.schedule_ids.append(body["id"])
+            return route, seconds, status
+        if operation == "list":
+            return await self._request(
+                "GET", "/api/fertilizer/schedules", "GET /api/fertilizer/schedules",
+                params={"limit": 50, "status": "SCHEDULED"}
+            )
+        schedule_id = self.rng.choice(self.schedule_ids)
+        if operation == "get":
+            return await self._request("GET", f"/api/fertilizer/schedules/{schedule_id}", "GET /api/fertilizer/schedules/{id}")
+        if operation == "status":
+            return await self._request(
+                "PATCH", f"/api/fertilizer/schedules/{schedule_id}/status", "PATCH /api/fertilizer/schedules/{id}/status",
+                params={"status": self.rng.choice(["SCHEDULED", "COMPLETED"])}
+            )
+        self.schedule_ids.remove(schedule_id)
+        return await self._request("DELETE", f"/api/fertilizer/schedules/{schedule_id}", "DELETE /api/fertilizer/schedules/{id}")
+
+    async def _request(self, method, path, route, with_body=False, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status, body = response.status_code, (response.json() if with_body and response.status_code == 200 else None)
+        except httpx.HTTPError:
+            status, body = None, None
+        seconds = time.perf_counter() - started
+        return (route, seconds, status, body) if with_body else (route, seconds, status)
+
+
+async def run_load(base_url: str, args, mix: dict, image: bytes, duration: float) -> list:
+    samples = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        workers = [Worker(i, client, mix, image, args.seed) for i in range(args.concurrency)]
+        deadline = time.perf_counter() + duration
+
+        async def loop(worker: Worker):
+            while time.perf_counter() < deadline:
+                samples.append(await worker.step())
+
+        await asyncio.gather(*(loop(worker) for worker in workers))
+    return samples
+
+
+def summarize(samples: list, duration: float) -> dict:
+    by_route = {}
+    for route, seconds, status in samples:
+        by_route.setdefault(route, []).append((seconds, status))
+    by_route["ALL"] = [(seconds, status) for _, seconds, status in samples]
+
+    routes = {}
+    for route, entries in sorted(by_route.items()):
+        latencies = sorted(seconds for seconds, _ in entries)
+        errors = sum(1 for _, status in entries if status is None or status >= 400)
+        routes[route] = {
+            "requests": len(entries),
+            "rps": round(len(entries) / duration, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "error_rate": round(errors / len(entries), 4)
+        }
+    return routes
+
+
+def scrape_stages(base_url: str) -> dict:
+    """Mean server-side time per hot-path stage from /metrics"""
+    try:
+        text = httpx.get(f"{base_url}/metrics", timeout=5).text
+    except httpx.HTTPError:
+        return {}
+    sums, counts = {}, {}
+    for line in text.splitlines():
+        for suffix, target in (("_sum", sums), ("_count", counts)):
+            prefix = f"agriconnect_stage_duration_seconds{suffix}{{stage=\""
+            if line.startswith(prefix):
+                stage, _, value = line[len(prefix):].partition("\"} ")
+                target[stage] = float(value)
+    return {
+        stage: {"count": int(counts[stage]), "mean_ms": round(sums[stage] / counts[stage] * 1000, 2)}
+        for stage in sorted(counts) if counts[stage]
+    }
+
+
+def compare(routes: dict, baseline: dict) -> list:
+    """Regression messages for routes that are slower, slower-moving or more error-prone than the baseline"""
+    tolerances = {**DEFAULT_TOLERANCES, **baseline.get("tolerances", {})}
+    regressions = []
+    for route, expected in baseline.get("routes", {}).items():
+        actual = routes.get(route)
+        if actual is None:
+            print(f"⚠️  {route} is in the baseline but received no traffic")
+            continue
+        if actual["p95_ms"] > expected["p95_ms"] * (1 + tolerances["p95"]):
+            regressions.append(f"{route}: p95 {actual['p95_ms']}ms > {expected['p95_ms']}ms +{tolerances['p95']:.0%}")
+        if actual["rps"] < expected["rps"] * (1 - tolerances["throughput"]):
+            regressions.append(f"{route}: {actual['rps']} req/s < {expected['rps']} req/s -{tolerances['throughput']:.0%}")
+        if actual["error_rate"] > expected["error_rate"] + tolerances["error_rate"]:
+            regressions.append(f"{route}: error rate {actual['error_rate']:.2%} > {expected['error_rate']:.2%} +{tolerances['error_rate']:.2%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--mix", default="upload=1,chat=1,fertilizer=8", help="Relative weights of upload, chat and fertilizer traffic")
+    parser.add_argument("--chat-backend", choices=["local", "openai"], default="local")
+    parser.add_argument("--openai-latency-ms", type=float, default=50.0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=0, help="Server port (default: a free one)")
+    parser.add_argument("--workdir", default=os.path.join(ROOT, ".loadtest"), help="Stub models, caches and the server log")
+    parser.add_argument("--baseline", help=f"Compare against this baseline (e.g. {os.path.relpath(DEFAULT_BASELINE, ROOT)})")
+    parser.add_argument("--write-baseline", action="store_true", help="Save this run as the baseline (--baseline or the default path)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    args.port = args.port or free_port()
+    os.makedirs(args.workdir, exist_ok=True)
+
+    print("🔄 Building stub models...")
+    models = build_stub_models(os.path.join(args.workdir, "models"))
+    fake_openai = FakeOpenAIServer(latency_seconds=args.openai_latency_ms / 1000).start() if args.chat_backend == "openai" else None
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    log_path = os.path.join(args.workdir, "server.log")
+    server = start_server(args, models, fake_openai.base_url if fake_openai else None, log_path)
+    try:
+        startup_seconds = wait_until_ready(base_url, server, 300, log_path)
+        print(f"✅ Server ready in {startup_seconds:.1f}s (log: {log_path})")
+
+        image = sample_image(args.seed)
+        if args.warmup > 0:
+            asyncio.run(run_load(base_url, args, mix, image, args.warmup))
+        print(f"📊 {args.concurrency} workers, {args.duration:.0f}s, mix {args.mix}, chat backend {args.chat_backend}\n")
+        samples = asyncio.run(run_load(base_url, args, mix, image, args.duration))
+        stages = scrape_stages(base_url)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        if fake_openai is not None:
+            fake_openai.stop()
+
+    routes = summarize(samples, args.duration)
+    print(f"{'route':<48}{'requests':>10}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for route, r in routes.items():
+        print(
+            f"{route:<48}{r['requests']:>10}{r['rps']:>9.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+            f"{r['p99_ms']:>10.1f}{r['error_rate']:>9.2%}"
+        )
+    if stages:
+        print("\nServer stages (mean):")
+        for stage, s in stages.items():
+            print(f"    {stage:<24}{s['mean_ms']:>10.2f} ms  x{s['count']}")
+
+    config = {
+        "concurrency": args.concurrency, "duration": args.duration, "mix": args.mix,
+        "chat_backend": args.chat_backend, "seed": args.seed
+    }
+    results = {"config": config, "startup_seconds": round(startup_seconds, 2), "routes": routes, "stages": stages}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.write_baseline:
+        tolerances = DEFAULT_TOLERANCES
+        if os.path.exists(baseline_path):
+            with open(baseline_path, encoding="utf-8") as f:
+                tolerances = json.load(f).get("tolerances", DEFAULT_TOLERANCES)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "tolerances": tolerances, "routes": routes}, f, indent=2)
+            f.write("\n")
+        print(f"💾 Baseline written to {baseline_path}")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"⚠️  Baseline was recorded with {baseline.get('config')}; comparing anyway")
+        regressions = compare(routes, baseline)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.baseline}:")
+            for message in regressions:
+                print(f"    {message}")
+            sys.exit(1)
+        print(f"\n✅ Within tolerances of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
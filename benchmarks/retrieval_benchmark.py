@@ -0,0 +1,146 @@
+"""
+Replay a query file against the knowledge base and compare retrieval strategies
+
+Each line of the query file is either JSON, {"query": ..., "expected": [entry ids]},
+or plain text (one query per line). Entry ids look like "crop:tomato",
+"pest:tomato_early_blight" or "topic:irrigation". Queries without "expected"
+(e.g. logged farmer questions) count towards latency and throughput only.
+
+For every mode the harness reports recall@k and MRR on the labeled queries, the
+per-query latency distribution of single retrieval, and the throughput of
+batch retrieval.
+
+Usage:
+    python benchmarks/retrieval_benchmark.py [--queries benchmarks/kb_queries.jsonl] [--k 3]
+        [--repeat 200] [--batch-size 1024] [--modes bm25,semantic] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.agriculture_kb import AgricultureKnowledgeBase, RETRIEVAL_MODES
+
+
+def load_queries(path):
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                queries.append({"query": record["query"], "expected": record.get("expected")})
+            else:
+                queries.append({"query": line, "expected": None})
+    return queries
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def evaluate(kb, queries, mode, k, repeat, batch_size):
+    texts = [q["query"] for q in queries]
+    labeled = [q for q in queries if q["expected"]]
+
+    # Quality, from one batch call
+    recall_hits = 0
+    reciprocal_ranks = 0.0
+    for q, result in zip(queries, kb.retrieve_batch(texts, k, mode)):
+        if not q["expected"]:
+            continue
+        ranked_ids = [entry_id for entry_id, _, _ in result.entries]
+        expected = set(q["expected"])
+        if expected & set(ranked_ids):
+            recall_hits += 1
+        for position, entry_id in enumerate(ranked_ids, 1):
+            if entry_id in expected:
+                reciprocal_ranks += 1.0 / position
+                break
+
+    # Single-query latency distribution
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            kb.retrieve(text, k, mode)
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    # Batch throughput (each repetition is a separate call so nothing is deduplicated across them)
+    batch_queries = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            kb.retrieve_batch(batch, k, mode)
+            batch_queries += len(batch)
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "labeled": len(labeled),
+        f"recall@{k}": recall_hits / len(labeled) if labeled else None,
+        "mrr": reciprocal_ranks / len(labeled) if labeled else None,
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p90_us": percentile(latencies, 0.90) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+        "max_us": latencies[-1] * 1e6,
+        "qps": len(latencies) / sum(latencies),
+        "batch_qps": batch_queries / batch_seconds
+    }
+
+
+def format_metric(value, spec):
+    return format(value, spec) if value is not None else format("-", spec.split(".")[0].rstrip("f"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb_queries.jsonl"))
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--modes", default=",".join(RETRIEVAL_MODES), help="Comma-separated retrieval modes to compare")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in RETRIEVAL_MODES]
+    if unknown:
+        parser.error(f"Unknown mode(s): {', '.join(unknown)}. Must be one of: {', '.join(RETRIEVAL_MODES)}")
+
+    kb = AgricultureKnowledgeBase(watch_interval_seconds=0)
+    queries = load_queries(args.queries)
+    if not queries:
+        parser.error(f"No queries in {args.queries}")
+    labeled = sum(1 for q in queries if q["expected"])
+    print(f"📊 {len(queries)} queries ({labeled} labeled), {len(kb.passages)} passages, k={args.k}\n")
+    print(
+        f"{'mode':<10}{'recall@k':>10}{'MRR':>8}{'p50 µs':>10}{'p90 µs':>10}{'p99 µs':>10}{'max µs':>10}"
+        f"{'q/s':>10}{'batch q/s':>12}"
+    )
+    results = []
+    for mode in modes:
+        r = evaluate(kb, queries, mode, args.k, args.repeat, args.batch_size)
+        results.append(r)
+        print(
+            f"{mode:<10}{format_metric(r[f'recall@{args.k}'], '>10.2f')}{format_metric(r['mrr'], '>8.2f')}"
+            f"{r['p50_us']:>10.1f}{r['p90_us']:>10.1f}{r['p99_us']:>10.1f}{r['max_us']:>10.1f}"
+            f"{r['qps']:>10.0f}{r['batch_qps']:>12.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"queries": args.queries, "k": args.k, "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
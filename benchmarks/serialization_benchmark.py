@@ -0,0 +1,132 @@
+"""
+Compare response serialization paths on a large fertilizer schedule list
+
+Fills an in-memory schedule store with --rows schedules and times producing the
+GET /api/fertilizer/schedules body three ways:
+
+    fastapi     what FastAPI does with response_model=List[FertilizerSchedule]:
+                validate every row, serialize the models, encode with json
+    fast        FastJSONResponse: encode the stored rows directly (orjson if installed)
+    cached      BodyCache hit for an unchanged store version
+
+Every path is checked to produce the same JSON document before it is timed.
+
+Usage:
+    python benchmarks/serialization_benchmark.py [--rows 100000] [--repeat 5] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models.fertilizer import FertilizerSchedule
+from app.services.fast_json import BodyCache, FastJSONResponse, orjson
+from app.services.schedule_store import InMemoryScheduleStore, new_schedule
+
+FERTILIZERS = ["NPK 10:26:26", "Urea", "DAP", "Organic Compost", "Potash", "Ammonium Sulphate"]
+AMOUNTS = ["50kg/acre", "30 kg per hectare", "2.5 l/ha", "100kg", "1 quintal/acre", "20 bags"]
+CROPS = ["Wheat", "Tomatoes", "Rice", "Maize", "Cotton"]
+
+
+def build_rows(count, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 6, 0)
+    store = InMemoryScheduleStore()
+    store.create_many([
+        new_schedule(
+            rng.choice(FERTILIZERS),
+            rng.choice(AMOUNTS),
+            f"Field {rng.randint(1, 500)} - {rng.choice(CROPS)}",
+            start + timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))
+        )
+        for _ in range(count)
+    ])
+    rows, _ = store.list()
+    return rows
+
+
+def fastapi_body(field, rows):
+    content = asyncio.run(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+
+def fast_body(rows):
+    return FastJSONResponse(rows).body
+
+
+def time_path(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = function()
+        timings.append(time.perf_counter() - started)
+    return body, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    print(f"🌱 Building {args.rows} schedules...")
+    rows = build_rows(args.rows)
+    field = create_response_field(name="Response_get_all_schedules", type_=List[FertilizerSchedule], mode="serialization")
+    cache = BodyCache(max_entries=1, max_bytes=1 << 40)
+
+    def cached_body():
+        hit = cache.get(1, "all")
+        return hit[0] if hit is not None else None
+
+    expected = json.loads(fastapi_body(field, rows))
+    if json.loads(fast_body(rows)) != expected:
+        sys.exit("❌ Fast path output differs from the response_model path")
+    cache.put(1, "all", fast_body(rows), {})
+
+    paths = [
+        ("fastapi", lambda: fastapi_body(field, rows)),
+        ("fast", lambda: fast_body(rows)),
+        ("cached", cached_body)
+    ]
+    print(f"📦 {args.rows} rows, encoder: {'orjson' if orjson is not None else 'json'}, {args.repeat} runs each\n")
+    print(f"{'path':<10}{'median ms':>12}{'min ms':>10}{'MB':>8}{'speedup':>12}")
+    results = []
+    baseline = None
+    for name, function in paths:
+        body, timings = time_path(function, args.repeat)
+        median = statistics.median(timings)
+        baseline = baseline or median
+        result = {
+            "path": name,
+            "median_ms": round(median * 1000, 3),
+            "min_ms": round(min(timings) * 1000, 3),
+            "body_mb": round(len(body) / 1e6, 2),
+            "speedup": round(baseline / median, 1) if median else None
+        }
+        results.append(result)
+        print(
+            f"{name:<10}{result['median_ms']:>12.3f}{result['min_ms']:>10.3f}{result['body_mb']:>8.1f}"
+            f"{result['speedup'] or 0:>11,.1f}x"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": args.rows, "encoder": "orjson" if orjson is not None else "json", "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Tiny locally generated stand-ins for the disease classifier and the chat model
+
+The load test boots the real app against these instead of ./disease-detection-model
+and DialoGPT, so it runs offline in seconds. Both have the same interfaces as the
+real models (a transformers image-classification checkpoint with LABEL_0..LABEL_7,
+and a GPT-2 causal LM with a byte-level tokenizer) but only a few thousand weights,
+so the timings exercise the serving path rather than model quality.
+
+Usage:
+    python benchmarks/stub_models.py [--out .loadtest/models]
+"""
+import argparse
+import json
+import os
+
+DISEASE_LABELS = 8
+
+
+def build_disease_model(path: str, seed: int = 0) -> str:
+    """Save a tiny ViT image classifier with the real model's labels to `path`"""
+    import torch
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor
+
+    torch.manual_seed(seed)
+    config = ViTConfig(
+        image_size=32, patch_size=8, num_channels=3,
+        hidden_size=32, num_hidden_layers=1, num_attention_heads=2, intermediate_size=64,
+        num_labels=DISEASE_LABELS,
+        id2label={i: f"LABEL_{i}" for i in range(DISEASE_LABELS)},
+        label2id={f"LABEL_{i}": i for i in range(DISEASE_LABELS)}
+    )
+    ViTForImageClassification(config).save_pretrained(path)
+    ViTImageProcessor(size={"height": 32, "width": 32}).save_pretrained(path)
+    return path
+
+
+def build_chat_model(path: str, seed: int = 0) -> str:
+    """Save a tiny GPT-2 with a byte-level tokenizer (no merges) to `path`"""
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2TokenizerFast
+
+    byte_level = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    vocab = {symbol: i for i, symbol in enumerate(sorted(pre_tokenizers.ByteLevel.alphabet()))}
+    vocab["<|endoftext|>"] = len(vocab)
+    tokenizer = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    tokenizer.pre_tokenizer = byte_level
+    tokenizer.decoder = decoders.ByteLevel()
+    GPT2TokenizerFast(tokenizer_object=tokenizer, eos_token="<|endoftext|>").save_pretrained(path)
+
+    torch.manual_seed(seed)
+    # n_positions covers the app's 512-token prompt plus 100 generated tokens
+    config = GPT2Config(
+        vocab_size=len(vocab), n_positions=640, n_embd=32, n_layer=2, n_head=2,
+        bos_token_id=vocab["<|endoftext|>"], eos_token_id=vocab["<|endoftext|>"]
+    )
+    GPT2LMHeadModel(config).save_pretrained(path)
+    return path
+
+
+def build_stub_models(out_dir: str) -> dict:
+    """Build both stubs under out_dir (skipped if already built); returns their paths"""
+    paths = {
+        "disease": os.path.join(out_dir, "disease-detection-model"),
+        "chat": os.path.join(out_dir, "chat-model")
+    }
+    if not os.path.exists(os.path.join(paths["disease"], "config.json")):
+        build_disease_model(paths["disease"])
+    if not os.path.exists(os.path.join(paths["chat"], "config.json")):
+        build_chat_model(paths["chat"])
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=".loadtest/models")
+    args = parser.parse_args()
+    print(json.dumps(build_stub_models(args.out), indent=2))
@@ -0,0 +1,201 @@
+"""
+Find near-duplicate images in the training dataset and write a cluster manifest
+
+The augmented PlantVillage dataset holds many flipped, rotated and re-encoded
+copies of the same leaf. Every image gets 64-bit difference hashes (dHash) of
+its 8 orientations (rotations by 90° and flips), computed in a process pool.
+Two images of the same class are near-duplicates when the upright hash of one is
+within --threshold bits of any orientation hash of the other, and near-duplicates
+are merged into clusters. Candidate pairs come from splitting the hashes into
+threshold + 1 bands: two hashes that close must share at least one band
+exactly, so only images in the same band bucket are compared.
+
+disease-detection_train.py reads the manifest to split train/validation by
+cluster (no copy of a validation leaf is trained on) and to sample a few images
+per cluster each epoch instead of every augmented copy.
+
+Usage:
+    python dataset_dedup.py [--dataset "./datasets/New Plant Diseases Dataset(Augmented)"]
+        [--out ./datasets/dedup_manifest.json] [--threshold 6] [--workers N]
+"""
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import random
+import time
+
+from PIL import Image
+
+DEFAULT_DATASET = "./datasets/New Plant Diseases Dataset(Augmented)"
+DEFAULT_MANIFEST = "./datasets/dedup_manifest.json"
+
+# Same extensions torchvision's ImageFolder loads
+IMG_EXTENSIONS = (".jpg", ".jpeg", ".png", ".ppm", ".bmp", ".pgm", ".tif", ".tiff", ".webp")
+
+# The 8 orientations of a square: identity, 3 rotations, and the 4 flips/transposes
+ORIENTATIONS = (
+    None,
+    Image.Transpose.ROTATE_90,
+    Image.Transpose.ROTATE_180,
+    Image.Transpose.ROTATE_270,
+    Image.Transpose.FLIP_LEFT_RIGHT,
+    Image.Transpose.FLIP_TOP_BOTTOM,
+    Image.Transpose.TRANSPOSE,
+    Image.Transpose.TRANSVERSE
+)
+
+HASH_BITS = 64
+
+
+def list_images(dataset_path: str) -> List[Tuple[str, str]]:
+    """(relative path, class) of every image, in ImageFolder's order"""
+    images = []
+    for class_name in sorted(entry.name for entry in os.scandir(dataset_path) if entry.is_dir()):
+        class_dir = os.path.join(dataset_path, class_name)
+        for root, _, files in sorted(os.walk(class_dir, followlinks=True)):
+            for name in sorted(files):
+                if name.lower().endswith(IMG_EXTENSIONS):
+                    images.append((os.path.relpath(os.path.join(root, name), dataset_path), class_name))
+    return images
+
+
+def dhash(image: Image.Image) -> Tuple[int, ...]:
+    """64-bit difference hash of each orientation of the image (upright first)"""
+    small = image.convert("L").resize((9, 9), Image.Resampling.LANCZOS)
+    hashes = []
+    for orientation in ORIENTATIONS:
+        pixels = (small if orientation is None else small.transpose(orientation)).tobytes()
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+        hashes.append(value)
+    return tuple(hashes)
+
+
+def _hash_file(path: str) -> Optional[Tuple[int, ...]]:
+    try:
+        with Image.open(path) as image:
+            return dhash(image)
+    except Exception as e:
+        print(f"⚠️  Skipping unreadable image {path}: {e}")
+        return None
+
+
+def hash_images(dataset_path: str, paths: List[str], workers: int) -> List[Optional[Tuple[int, ...]]]:
+    full_paths = [os.path.join(dataset_path, path) for path in paths]
+    if workers <= 1:
+        return [_hash_file(path) for path in full_paths]
+    with Pool(workers) as pool:
+        return list(pool.imap(_hash_file, full_paths, chunksize=256))
+
+
+def _bands(threshold: int) -> List[Tuple[int, int]]:
+    """(shift, mask) of threshold + 1 bands covering the hash bits"""
+    count = min(threshold + 1, HASH_BITS)
+    bounds = [round(i * HASH_BITS / count) for i in range(count + 1)]
+    return [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+
+
+def cluster_hashes(hashes: List[Optional[Tuple[int, ...]]], classes: List[str], threshold: int) -> List[int]:
+    """Cluster id per image: union of same-class near-duplicate pairs (-1 for unhashed)"""
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for shift, mask in _bands(threshold):
+        # Bucket upright hashes, then look every orientation of every image up in them
+        buckets: Dict[Tuple[str, int], List[int]] = defaultdict(list)
+        for i, variants in enumerate(hashes):
+            if variants is not None:
+                buckets[(classes[i], (variants[0] >> shift) & mask)].append(i)
+        for i, variants in enumerate(hashes):
+            if variants is None:
+                continue
+            for value in variants:
+                for j in buckets.get((classes[i], (value >> shift) & mask), ()):
+                    if j != i and bin(value ^ hashes[j][0]).count("1") <= threshold:
+                        root_i, root_j = find(i), find(j)
+                        if root_i != root_j:
+                            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    # Renumber roots 0..n-1 in image order
+    ids: Dict[int, int] = {}
+    return [-1 if value is None else ids.setdefault(find(i), len(ids)) for i, value in enumerate(hashes)]
+
+
+def build_manifest(dataset_path: str, threshold: int = 6, workers: int = None) -> Dict:
+    workers = workers or os.cpu_count() or 1
+    images = list_images(dataset_path)
+    paths = [path for path, _ in images]
+    classes = [class_name for _, class_name in images]
+    print(f"🔄 Hashing {len(images)} images with {workers} workers...")
+    started = time.perf_counter()
+    hashes = hash_images(dataset_path, paths, workers)
+    print(f"✅ Hashed in {time.perf_counter() - started:.1f}s")
+    clusters = cluster_hashes(hashes, classes, threshold)
+    return {
+        "dataset": os.path.abspath(dataset_path),
+        "hash": "dhash64",
+        "threshold": threshold,
+        "clusters": max(clusters, default=-1) + 1,
+        "images": [
+            {"path": path, "class": class_name, "hash": f"{variants[0]:016x}" if variants is not None else None, "cluster": cluster}
+            for path, class_name, variants, cluster in zip(paths, classes, hashes, clusters)
+        ]
+    }
+
+
+def load_manifest(path: str) -> Dict[str, Tuple[int, str]]:
+    """Relative image path -> (cluster, class) for every hashed image in a manifest"""
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    return {image["path"]: (image["cluster"], image["class"]) for image in manifest["images"] if image["cluster"] >= 0}
+
+
+def cluster_split(clusters: Dict[int, List[int]], cluster_classes: Dict[int, str], val_fraction: float = 0.2, seed: int = 42) -> Tuple[List[int], List[int]]:
+    """Split cluster ids into (train, val), per class, so every class is in both when it can be"""
+    rng = random.Random(seed)
+    by_class: Dict[str, List[int]] = defaultdict(list)
+    for cluster in sorted(clusters):
+        by_class[cluster_classes[cluster]].append(cluster)
+    train, val = [], []
+    for class_clusters in by_class.values():
+        rng.shuffle(class_clusters)
+        val_count = round(len(class_clusters) * val_fraction) if len(class_clusters) > 1 else 0
+        val.extend(class_clusters[:val_count])
+        train.extend(class_clusters[val_count:])
+    return sorted(train), sorted(val)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--out", default=DEFAULT_MANIFEST)
+    parser.add_argument("--threshold", type=int, default=6, help="Max differing hash bits for near-duplicates")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dataset):
+        parser.error(f"Dataset not found at {args.dataset}")
+    manifest = build_manifest(args.dataset, args.threshold, args.workers)
+    images = len(manifest["images"])
+    print(f"📊 {images} images in {manifest['clusters']} clusters ({images / max(manifest['clusters'], 1):.1f} images per cluster)")
+
+    directory = os.path.dirname(args.out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    print(f"💾 Manifest written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
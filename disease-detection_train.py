@@ -1,10 +1,12 @@
 import os
+import random
 import torch
 from torchvision import datasets, transforms
-from torch.utils.data import DataLoader, random_split
+from torch.utils.data import DataLoader, Sampler, Subset, random_split
 from transformers import AutoImageProcessor, AutoModelForImageClassification
 from torch import optim
 from tqdm import tqdm
+from dataset_dedup import DEFAULT_MANIFEST, cluster_split, load_manifest
 
 # Dataset path
 DATASET_PATH = "./datasets/New Plant Diseases Dataset(Augmented)"
@@ -14,6 +16,30 @@ EPOCHS = 5
 BATCH_SIZE = 32
 LEARNING_RATE = 1e-4
 
+# Near-duplicate clusters written by dataset_dedup.py; without it the split is random per image
+MANIFEST_PATH = DEFAULT_MANIFEST
+# Training images drawn from each cluster per epoch (a fresh draw every epoch)
+SAMPLES_PER_CLUSTER = 1
+SEED = 42
+
+class ClusterSampler(Sampler):
+    """Each epoch, yields up to `per_cluster` random images of every cluster, shuffled"""
+    
+    def __init__(self, clusters, per_cluster=1, seed=SEED):
+        self.clusters = clusters
+        self.per_cluster = per_cluster
+        self.rng = random.Random(seed)
+    
+    def __iter__(self):
+        indices = []
+        for members in self.clusters:
+            indices.extend(self.rng.sample(members, min(self.per_cluster, len(members))))
+        self.rng.shuffle(indices)
+        return iter(indices)
+    
+    def __len__(self):
+        return sum(min(self.per_cluster, len(members)) for members in self.clusters)
+
 # Check if dataset exists
 if not os.path.exists(DATASET_PATH):
     print(f"❌ Dataset not found at {DATASET_PATH}")
@@ -41,16 +67,41 @@ else:
     print(f"✅ Loaded {len(dataset)} images")
     print(f"✅ Found {len(dataset.classes)} classes")
     
-    # Split dataset (80% train, 20% val)
-    train_size = int(0.8 * len(dataset))
-    val_size = len(dataset) - train_size
-    train_dataset, val_dataset = random_split(dataset, [train_size, val_size])
-    
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE)
-    
-    print(f"\n📊 Training samples: {len(train_dataset)}")
-    print(f"📊 Validation samples: {len(val_dataset)}")
+    if os.path.exists(MANIFEST_PATH):
+        # Split by cluster (80% train, 20% val) so no augmented copy of a validation image is trained on
+        manifest = load_manifest(MANIFEST_PATH)
+        clusters = {}
+        cluster_classes = {}
+        for index, (path, _) in enumerate(dataset.samples):
+            entry = manifest.get(os.path.relpath(path, DATASET_PATH))
+            if entry is None:
+                continue
+            clusters.setdefault(entry[0], []).append(index)
+            cluster_classes[entry[0]] = entry[1]
+        print(f"✅ Loaded {len(clusters)} near-duplicate clusters from {MANIFEST_PATH}")
+        
+        train_clusters, val_clusters = cluster_split(clusters, cluster_classes, val_fraction=0.2, seed=SEED)
+        train_sampler = ClusterSampler([clusters[c] for c in train_clusters], SAMPLES_PER_CLUSTER)
+        val_dataset = Subset(dataset, [i for c in val_clusters for i in clusters[c]])
+        
+        train_loader = DataLoader(dataset, batch_size=BATCH_SIZE, sampler=train_sampler)
+        val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE)
+        
+        print(f"\n📊 Training samples per epoch: {len(train_sampler)} (from {len(train_clusters)} clusters)")
+        print(f"📊 Validation samples: {len(val_dataset)} (from {len(val_clusters)} clusters)")
+    else:
+        print(f"⚠️  No dedup manifest at {MANIFEST_PATH}: near-duplicates can leak into validation (run dataset_dedup.py)")
+        
+        # Split dataset (80% train, 20% val)
+        train_size = int(0.8 * len(dataset))
+        val_size = len(dataset) - train_size
+        train_dataset, val_dataset = random_split(dataset, [train_size, val_size])
+        
+        train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
+        val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE)
+        
+        print(f"\n📊 Training samples: {len(train_dataset)}")
+        print(f"📊 Validation samples: {len(val_dataset)}")
     
     # Load model
     print("\n🔄 Loading model...")
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# No background watcher or engine threads in tests; reloads are triggered explicitly
+os.environ.setdefault("KB_WATCH_INTERVAL_SECONDS", "0")
+os.environ.setdefault("FERTILIZER_DUE_ENGINE", "false")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    """Each schedule store backend, empty (SQLite in a temporary database)"""
+    from app.services.schedule_store import InMemoryScheduleStore, SQLiteScheduleStore
+    if request.param == "memory":
+        yield InMemoryScheduleStore()
+        return
+    store = SQLiteScheduleStore(str(tmp_path / "fertilizer.db"), pool_size=2)
+    yield store
+    store.close()
@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from app.services import agriculture_kb as kb_module
+from app.services.agriculture_kb import DEFAULT_DATA_DIR, AgricultureKnowledgeBase
+
+PEST_FILE = os.path.join("pests", "tomato_early_blight.json")
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / "knowledge_base"
+    shutil.copytree(DEFAULT_DATA_DIR, path)
+    return str(path)
+
+
+def write_pest(data_dir, **fields):
+    path = os.path.join(data_dir, PEST_FILE)
+    with open(path, encoding="utf-8") as f:
+        entry = json.load(f)
+    entry.update(fields)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    # Make sure the watcher sees a new mtime even on coarse filesystem clocks
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.mark.parametrize("treatment", [[], None])
+def test_reload_accepts_empty_or_null_treatment(data_dir, treatment):
+    kb = AgricultureKnowledgeBase(data_dir=data_dir, watch_interval_seconds=0)
+    assert "Treatment:" in kb.snippets.context["pest:tomato_early_blight"]
+
+    write_pest(data_dir, treatment=treatment)
+    assert kb.reload() == ["pest:tomato_early_blight"]
+    assert kb.version == 2
+    assert kb.pest_database["tomato_early_blight"]["treatment"] == treatment
+    assert "Treatment:" not in kb.snippets.context["pest:tomato_early_blight"]
+    assert "Treatment:" not in kb.snippets.fallback["pest:tomato_early_blight"]
+    assert "tomato_early_blight" in kb.retrieve("tomato early blight").pests
+
+    # The same file must also load on a cold start
+    cold = AgricultureKnowledgeBase(data_dir=data_dir, watch_interval_seconds=0)
+    assert cold.pest_database["tomato_early_blight"]["treatment"] == treatment
+
+
+def test_failed_index_build_is_retried(data_dir, monkeypatch):
+    kb = AgricultureKnowledgeBase(data_dir=data_dir, watch_interval_seconds=0)
+    write_pest(data_dir, treatment=["Spray copper oxychloride"])
+
+    original = kb_module.KnowledgeState
+
+    def failing_state(*args, **kwargs):
+        raise RuntimeError("index build failed")
+
+    monkeypatch.setattr(kb_module, "KnowledgeState", failing_state)
+    assert kb.reload() == []
+    assert kb.version == 1
+    assert PEST_FILE.replace(os.sep, "/") in kb._invalid_files
+
+    # The edit was not recorded as seen, so the next poll applies it
+    monkeypatch.setattr(kb_module, "KnowledgeState", original)
+    assert kb.reload() == ["pest:tomato_early_blight"]
+    assert kb.version == 2
+    assert kb.pest_database["tomato_early_blight"]["treatment"] == ["Spray copper oxychloride"]
+    assert not kb._invalid_files
+
+
+def test_passages_render_from_the_snippet_table(data_dir):
+    kb = AgricultureKnowledgeBase(data_dir=data_dir, watch_interval_seconds=0)
+    for passage in kb.passages:
+        snippet_id = passage.id.removesuffix(":overview")
+        assert kb.snippets.context[snippet_id] == passage.rendered
+
+    # Crop chunks follow a reload of their crop
+    path = os.path.join(data_dir, "crops", "tomato.json")
+    with open(path, encoding="utf-8") as f:
+        crop = json.load(f)
+    crop["practices"] = crop["practices"] + ["Stake plants at transplanting"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(crop, f)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert kb.reload() == ["crop:tomato"]
+    assert "Stake plants at transplanting" in kb.snippets.context["crop:tomato:practices"]
+    assert any(p.rendered == kb.snippets.context["crop:tomato:practices"] for p in kb.passages)
+
+
+def test_reload_keeps_one_snapshot_per_data_dir(data_dir, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("KB_SNAPSHOT", "true")
+    monkeypatch.setenv("KB_CACHE_DIR", str(cache_dir))
+    cache_dir.mkdir()
+    unrelated = cache_dir / "kb_snapshot_ffffffff_0000000000000000.pkl"
+    unrelated.write_bytes(b"")
+
+    kb = AgricultureKnowledgeBase(data_dir=data_dir, watch_interval_seconds=0)
+    first = set(os.listdir(cache_dir)) - {unrelated.name}
+    assert len(first) == 1
+
+    write_pest(data_dir, treatment=["Spray copper oxychloride"])
+    assert kb.reload() == ["pest:tomato_early_blight"]
+    second = set(os.listdir(cache_dir)) - {unrelated.name}
+    assert len(second) == 1 and second != first
+    assert unrelated.exists()
+
+    # The remaining snapshot is the current one
+    cold = AgricultureKnowledgeBase(data_dir=data_dir, watch_interval_seconds=0)
+    assert cold.pest_database["tomato_early_blight"]["treatment"] == ["Spray copper oxychloride"]
@@ -0,0 +1,49 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from app.services.chat_model import ChatModelConfig, benchmark_generation, model_size_bytes, optimize_for_cpu
+
+TINY = dict(vocab_size=256, n_positions=64, n_embd=64, n_layer=2, n_head=2, bos_token_id=255, eos_token_id=255)
+
+
+@pytest.fixture(scope="module")
+def reference():
+    """A tiny randomly initialized GPT-2, its fp32 logits on a fixed prompt, and the prompt"""
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(**TINY)
+    model = transformers.GPT2LMHeadModel(config).eval()
+    input_ids = torch.randint(0, config.vocab_size, (1, 8))
+    with torch.no_grad():
+        logits = model(input_ids).logits
+    return config, model, input_ids, logits
+
+
+@pytest.mark.parametrize("quantize, dtype, tolerance", [
+    ("none", "fp32", 1e-5),
+    ("int8", "fp32", 0.05),
+    ("none", "bf16", 0.02),
+])
+def test_optimized_model_matches_fp32(reference, quantize, dtype, tolerance):
+    config, fp32_model, input_ids, fp32_logits = reference
+    model = transformers.GPT2LMHeadModel(config)
+    model.load_state_dict(fp32_model.state_dict())
+    model = optimize_for_cpu(model, ChatModelConfig(model_name="tiny-gpt2", quantize=quantize, dtype=dtype))
+
+    with torch.no_grad():
+        logits = model(input_ids).logits.float()
+    assert (logits - fp32_logits).abs().max().item() < tolerance
+    if quantize == "int8":
+        assert model_size_bytes(model) < model_size_bytes(fp32_model)
+
+    result = benchmark_generation(model, input_ids, new_tokens=16, eos_token_id=config.eos_token_id)
+    assert result["tokens"] == 16
+
+
+def test_invalid_settings_are_rejected(reference):
+    config, _, _, _ = reference
+    with pytest.raises(ValueError):
+        optimize_for_cpu(transformers.GPT2LMHeadModel(config), ChatModelConfig(quantize="int4"))
+    with pytest.raises(ValueError):
+        optimize_for_cpu(transformers.GPT2LMHeadModel(config), ChatModelConfig(quantize="none", dtype="fp8"))
@@ -0,0 +1,45 @@
+import threading
+
+from app.services.conversation_store import SQLiteConversationStore
+
+
+class AppendDuringRead:
+    """Connection proxy that appends a turn from another thread while the tail is read"""
+
+    def __init__(self, conn, store, user_id, turn):
+        self._conn = conn
+        self._append = lambda: store.append(user_id, turn)
+        self.fired = False
+
+    def execute(self, sql, *args):
+        if not self.fired and "ORDER BY id DESC" in sql:
+            self.fired = True
+            thread = threading.Thread(target=self._append)
+            thread.start()
+            thread.join(timeout=5)
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def turn(n):
+    return {"user_message": f"q{n}", "bot_response": f"a{n}", "timestamp": None}
+
+
+def test_cache_fill_keeps_turn_appended_during_read(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"), flush_interval_seconds=60, cache_ttl_seconds=60)
+    try:
+        store.append("farmer", turn(1))
+        store.flush()
+        conn = store._conn
+        store._conn = AppendDuringRead(conn, store, "farmer", turn(2))
+        store.get("farmer", limit=5)
+        store._conn = conn
+
+        # Served from the hot cache filled by the read above
+        hits = store.cache_hits
+        assert [t["user_message"] for t in store.get("farmer", limit=5)] == ["q1", "q2"]
+        assert store.cache_hits == hits + 1
+    finally:
+        store.close()
@@ -0,0 +1,142 @@
+import time
+
+import pytest
+
+from app.services.detection_jobs import DetectionJobQueue
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "time", fake)
+    return fake
+
+
+def make_queue(tmp_path, classify, **kwargs):
+    return DetectionJobQueue(classify, db_path=str(tmp_path / "jobs.db"), **kwargs)
+
+
+def label(image: bytes):
+    return {"predicted_disease": image.decode(), "confidence": 1.0}
+
+
+def test_failing_classifier_is_retried_then_given_up(tmp_path, clock):
+    calls = []
+
+    def flaky(image):
+        calls.append(image)
+        raise RuntimeError("model crashed")
+
+    queue = make_queue(tmp_path, flaky, max_attempts=2)
+    job = queue.submit([("a.png", b"a")])
+
+    assert queue.run_once()
+    item = queue.get(job["job_id"])["results"][0]
+    assert (item["status"], item["attempts"], item["error"]) == ("queued", 1, "model crashed")
+    assert queue.retried == 1
+
+    assert queue.run_once()
+    job = queue.get(job["job_id"])
+    assert (job["status"], job["done"], job["failed"]) == ("completed", 0, 1)
+    assert (job["results"][0]["status"], job["results"][0]["attempts"]) == ("failed", 2)
+    assert not queue.run_once()
+    assert len(calls) == 2 and queue.failed == 1
+
+
+def test_undecodable_image_fails_without_retry(tmp_path, clock):
+    def reject(image):
+        raise ValueError("not an image")
+
+    queue = make_queue(tmp_path, reject, max_attempts=3)
+    job = queue.submit([("a.png", b"a")])
+    assert queue.run_once()
+    item = queue.get(job["job_id"])["results"][0]
+    assert (item["status"], item["attempts"], item["error"]) == ("failed", 1, "not an image")
+    assert queue.retried == 0
+
+
+def test_expired_lease_is_reclaimed(tmp_path, clock):
+    queue = make_queue(tmp_path, label, lease_seconds=30, max_attempts=3)
+    job = queue.submit([("a.png", b"a")])
+
+    # A worker leases the image and dies
+    assert queue._claim() is not None
+    assert not queue.run_once()
+    clock.advance(29)
+    assert not queue.run_once()
+
+    clock.advance(2)
+    assert queue.run_once()
+    job = queue.get(job["job_id"])
+    assert job["status"] == "completed"
+    assert (job["results"][0]["status"], job["results"][0]["attempts"]) == ("done", 2)
+    assert job["results"][0]["result"] == {"predicted_disease": "a", "confidence": 1.0}
+    assert queue.retried == 1
+
+
+def test_expired_lease_on_last_attempt_gives_up(tmp_path, clock):
+    queue = make_queue(tmp_path, label, lease_seconds=30, max_attempts=1)
+    job = queue.submit([("a.png", b"a")])
+    assert queue._claim() is not None
+    clock.advance(31)
+
+    assert not queue.run_once()
+    item = queue.get(job["job_id"])["results"][0]
+    assert (item["status"], item["error"]) == ("failed", "Gave up after 1 attempts")
+    assert queue.get(job["job_id"])["status"] == "completed"
+
+
+def test_claims_follow_priority_then_submission_order(tmp_path, clock):
+    seen = []
+
+    def record(image):
+        seen.append(image.decode())
+        return label(image)
+
+    queue = make_queue(tmp_path, record)
+    queue.submit([("1", b"low-0"), ("2", b"low-1")], priority=0)
+    clock.advance(1)
+    queue.submit([("3", b"high")], priority=5)
+    clock.advance(1)
+    queue.submit([("4", b"low-later")], priority=0)
+    clock.advance(1)
+    queue.submit([("5", b"urgent")], priority=10)
+
+    while queue.run_once():
+        pass
+    assert seen == ["urgent", "high", "low-0", "low-1", "low-later"]
+    assert queue.stats()["images"] == {"done": 5}
+
+
+def test_cleanup_removes_expired_jobs_only(tmp_path, clock):
+    queue = make_queue(tmp_path, label, ttl_seconds=60)
+    old = queue.submit([("a.png", b"a")])
+    assert queue.run_once()
+    clock.advance(30)
+    recent = queue.submit([("b.png", b"b")])
+
+    clock.advance(31)
+    assert queue.cleanup_expired() == 1
+    assert queue.get(old["job_id"]) is None
+    assert queue.get(recent["job_id"])["status"] == "queued"
+    assert queue.stats()["images"] == {"queued": 1}
+
+
+def test_database_is_opened_on_first_use(tmp_path):
+    queue = make_queue(tmp_path, label)
+    assert queue.queue_depth() == 0
+    assert not (tmp_path / "jobs.db").exists()
+    queue.submit([("a.png", b"a")])
+    assert (tmp_path / "jobs.db").exists()
+    assert queue.queue_depth() == 1
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECK = """
+import sys
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+assert client.get("/api/disease-detection/health").status_code == 200
+assert "app.services.agriculture_kb" not in sys.modules, "knowledge base loaded at import"
+
+advice = client.get("/api/disease-detection/advice/Tomato___Early_blight").json()
+assert "app.services.agriculture_kb" in sys.modules
+assert [d["key"] for d in advice["diseases"]] == ["tomato_early_blight"], advice
+"""
+
+
+def test_disease_only_deployment_loads_the_knowledge_base_on_first_advice(tmp_path):
+    env = dict(
+        os.environ,
+        AGRICONNECT_SERVICES="disease_detection",
+        DISEASE_MODEL_PATH=str(tmp_path / "no-model"),
+        DETECTION_JOBS_DB_PATH=str(tmp_path / "jobs.db"),
+        KB_CACHE_DIR=str(tmp_path / "kb_cache"),
+        HF_HUB_OFFLINE="1",
+        PYTHONPATH=ROOT
+    )
+    result = subprocess.run([sys.executable, "-c", CHECK], cwd=str(tmp_path), env=env, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,29 @@
+import os
+
+from app.services.kb_bm25 import Passage
+from app.services.kb_semantic import SemanticIndex
+
+
+def passages(*texts):
+    return [Passage(f"topic:test:{i}", "topic", "test", text, text) for i, text in enumerate(texts)]
+
+
+def test_new_build_prunes_stale_matrices(tmp_path):
+    cache_dir = str(tmp_path)
+    other = tmp_path / "kb_snapshot_0123.pkl"
+    other.write_bytes(b"")
+
+    first = SemanticIndex(passages("early blight rings on tomato leaves", "drip irrigation for rice"), cache_dir=cache_dir)
+    first_files = {name for name in os.listdir(cache_dir) if name.startswith("semantic_")}
+    assert len(first_files) == 2
+
+    second = SemanticIndex(passages("late blight on potato", "drip irrigation for rice"), cache_dir=cache_dir)
+    second_files = {name for name in os.listdir(cache_dir) if name.startswith("semantic_")}
+    assert len(second_files) == 2 and not first_files & second_files
+    assert other.exists()
+
+    # The first index keeps working from its mapping, and a rebuild of it is recreated on demand
+    assert first.top_k("tomato leaf rings", 1)[0][0].id == "topic:test:0"
+    again = SemanticIndex(first.passages, cache_dir=cache_dir)
+    assert again.top_k("tomato leaf rings", 1)[0][0].id == "topic:test:0"
+    assert second.top_k("potato blight", 1)[0][0].id == "topic:test:0"
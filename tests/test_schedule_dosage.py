@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.schedule_dosage import AGGREGATE_DIMENSIONS, aggregate_deltas, parse_amount, parse_target_field, summarize
+from app.services.schedule_store import new_schedule
+
+
+@pytest.mark.parametrize("amount, expected", [
+    ("50kg/acre", (123.552691, "kg", "ha")),
+    ("30 kg per hectare", (30.0, "kg", "ha")),
+    ("2.5 l/ha", (2.5, "l", "ha")),
+    ("2,5 L per ha", (2.5, "l", "ha")),
+    ("100kg", (100.0, "kg", None)),
+    ("1 quintal/acre", (247.105381, "kg", "ha")),
+    ("500 ml", (0.5, "l", None)),
+])
+def test_parse_amount(amount, expected):
+    assert parse_amount(amount) == expected
+
+
+@pytest.mark.parametrize("amount", ["20 bags", "a handful", "", None, "50kg/plot", "kg 50"])
+def test_unparseable_amounts(amount):
+    assert parse_amount(amount) == (None, None, None)
+
+
+@pytest.mark.parametrize("target_field, expected", [
+    ("Field A - Wheat", ("Field A", "Wheat")),
+    ("  North plot  -  Rice ", ("North plot", "Rice")),
+    ("Field B", ("Field B", None)),
+    ("Field C - ", ("Field C", None)),
+])
+def test_parse_target_field(target_field, expected):
+    assert parse_target_field(target_field) == expected
+
+
+def test_created_schedule_carries_parsed_dosage(store):
+    created = store.create(new_schedule("Urea", "50kg/acre", "Field A - Wheat", datetime(2025, 6, 1)))
+    assert (created["quantity"], created["unit"], created["per_area"]) == (123.552691, "kg", "ha")
+    assert (created["field"], created["crop"]) == ("Field A", "Wheat")
+    unparsed = store.create(new_schedule("Compost", "20 bags", "Field B", datetime(2025, 6, 1)))
+    assert (unparsed["quantity"], unparsed["unit"], unparsed["crop"]) == (None, None, None)
+
+
+def recomputed(store):
+    """Aggregates rebuilt from every stored schedule"""
+    schedules, _ = store.list()
+    cells = ((cell, tuple(delta)) for cell, delta in aggregate_deltas(added=schedules).items())
+    return summarize(cells, AGGREGATE_DIMENSIONS)
+
+
+def test_aggregates_match_full_recompute(store):
+    a = store.create(new_schedule("Urea", "50kg/acre", "Field A - Wheat", datetime(2025, 6, 1)))
+    b = store.create(new_schedule("Urea", "30 kg per hectare", "Field A - Wheat", datetime(2025, 6, 20)))
+    c = store.create(new_schedule("DAP", "2.5 l/ha", "Field B - Rice", datetime(2025, 7, 2)))
+    d = store.create(new_schedule("Compost", "20 bags", "Field C", datetime(2025, 7, 3)))
+    assert store.aggregates() == recomputed(store)
+    wheat = next(entry for entry in store.aggregates()["crop"] if entry["group"] == "Wheat")
+    assert wheat["count"] == 2 and wheat["totals"] == {"kg/ha": 153.552691}
+
+    # Changing the amount, crop, month and status moves the schedule between cells
+    store.update(a["id"], {"amount": "100kg", "target_field": "Field B - Rice", "scheduled_date": datetime(2025, 8, 1), "status": "PENDING"})
+    store.update(d["id"], {"amount": "1 quintal/acre"})
+    assert store.aggregates() == recomputed(store)
+    assert store.aggregates(["month"], ["PENDING"]) == {"month": [{"group": "2025-08", "count": 1, "unparsed": 0, "totals": {"kg": 100.0}}]}
+
+    store.delete(b["id"])
+    store.delete(c["id"])
+    assert store.aggregates() == recomputed(store)
+    assert not any(entry["group"] == "Wheat" for entry in store.aggregates()["crop"])
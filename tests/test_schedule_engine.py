@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.schedule_engine import DueScheduleEngine
+from app.services.schedule_store import InMemoryScheduleStore, SQLiteScheduleStore, date_key, new_schedule
+
+# Server local time for these tests: UTC+05:30, no daylight saving
+LOCAL_ZONE = "IST-05:30"
+LOCAL_OFFSET = timedelta(hours=5, minutes=30)
+
+
+@pytest.fixture
+def local_zone(monkeypatch):
+    monkeypatch.setenv("TZ", LOCAL_ZONE)
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+class FixedClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+def add(store, scheduled_date):
+    return store.create(new_schedule("Urea", "50kg/acre", "Field 1", scheduled_date))
+
+
+def test_naive_dates_fall_due_by_the_local_clock(local_zone):
+    store = InMemoryScheduleStore()
+    clock = FixedClock(datetime(2025, 6, 1, 10, 0))
+    engine = DueScheduleEngine(store, clock=clock)
+
+    # 09:59 and 10:01 local, and 04:29 UTC / 04:31 UTC (= 09:59 / 10:01 local)
+    past_local = add(store, datetime(2025, 6, 1, 9, 59))
+    future_local = add(store, datetime(2025, 6, 1, 10, 1))
+    past_aware = add(store, datetime(2025, 6, 1, 4, 29, tzinfo=timezone.utc))
+    future_aware = add(store, datetime(2025, 6, 1, 4, 31, tzinfo=timezone.utc))
+    assert engine.load() == 4
+
+    assert engine.run_due() == 2
+    assert store.get(past_local["id"])["status"] == "PENDING"
+    assert store.get(past_aware["id"])["status"] == "PENDING"
+    assert store.get(future_local["id"])["status"] == "SCHEDULED"
+    assert store.get(future_aware["id"])["status"] == "SCHEDULED"
+    assert engine.next_due() == datetime(2025, 6, 1, 10, 1)
+
+    # Under the old UTC frame the naive 10:01 schedule would only fall due 5h30 later
+    clock.now += timedelta(minutes=2)
+    assert engine.run_due() == 2
+    assert engine.events_after(0)[-1]["due_at"].endswith("+05:30")
+
+
+def test_sqlite_keys_use_the_local_frame(local_zone, tmp_path):
+    store = SQLiteScheduleStore(str(tmp_path / "fertilizer.db"))
+    aware = add(store, datetime(2025, 6, 1, 4, 31, tzinfo=timezone.utc))
+    naive = add(store, datetime(2025, 6, 1, 10, 0))
+    try:
+        rows, _ = store.list()
+        assert [row["id"] for row in rows] == [naive["id"], aware["id"]]
+        assert date_key(aware["scheduled_date"]) == datetime(2025, 6, 1, 4, 31) + LOCAL_OFFSET
+    finally:
+        store.close()
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import fertilizer as fertilizer_api
+from app.services.fast_json import BodyCache
+from app.services.schedule_store import ChangesExpired, new_schedule
+from app.services.sqlite_pool import PoolExhausted, SQLiteConnectionPool
+
+START = datetime(2025, 6, 1, 6, 0)
+
+
+def add(store, target_field="Field A - Wheat", days=0, fertilizer_type="Urea", amount="50kg/acre"):
+    return store.create(new_schedule(fertilizer_type, amount, target_field, START + timedelta(days=days)))
+
+
+def ids(schedules):
+    return [schedule["id"] for schedule in schedules]
+
+
+def test_create_get_update_delete(store):
+    created = add(store)
+    assert created["status"] == "SCHEDULED"
+    assert len(store) == 1 and created["id"] in store
+    assert store.get(created["id"])["target_field"] == "Field A - Wheat"
+
+    updated = store.update(created["id"], {"status": "PENDING", "amount": "30kg/acre"})
+    assert updated["status"] == "PENDING" and updated["amount"] == "30kg/acre"
+    assert store.get(created["id"])["status"] == "PENDING"
+    assert store.update("missing", {"status": "PENDING"}) is None
+
+    assert store.delete(created["id"])
+    assert not store.delete(created["id"])
+    assert store.get(created["id"]) is None and len(store) == 0
+
+
+def test_update_with_expected_is_compare_and_set(store):
+    created = add(store)
+    assert store.update(created["id"], {"status": "PENDING"}, expected={"status": "COMPLETED"}) is None
+    assert store.update(created["id"], {"status": "PENDING"}, expected={"status": "SCHEDULED"})["status"] == "PENDING"
+
+
+def test_list_sorted_and_filtered(store):
+    later = add(store, "Field B - Rice", days=3)
+    first = add(store, "Field A - Wheat", days=1)
+    middle = add(store, "Field A - Wheat", days=2)
+    store.update(middle["id"], {"status": "PENDING"})
+
+    assert ids(store.list()[0]) == [first["id"], middle["id"], later["id"]]
+    assert ids(store.list(status="PENDING")[0]) == [middle["id"]]
+    assert ids(store.list(target_field="Field A - Wheat")[0]) == [first["id"], middle["id"]]
+    assert ids(store.list(status="SCHEDULED", target_field="Field A - Wheat")[0]) == [first["id"]]
+    # Both bounds are inclusive
+    assert ids(store.list(date_from=START + timedelta(days=2), date_to=START + timedelta(days=3))[0]) == [middle["id"], later["id"]]
+    assert store.counts_by_status() == {"SCHEDULED": 2, "PENDING": 1}
+
+    # Moving a schedule re-sorts it
+    store.update(later["id"], {"scheduled_date": START})
+    assert ids(store.list()[0]) == [later["id"], first["id"], middle["id"]]
+
+
+def test_cursor_pages_cover_every_schedule_once(store):
+    # Several schedules share each date, so the cursor must break ties by id
+    created = [add(store, days=i // 3) for i in range(10)]
+    expected = ids(store.list()[0])
+    assert sorted(expected) == sorted(ids(created))
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.list(cursor=cursor, limit=4)
+        seen.extend(ids(page))
+        if cursor is None:
+            break
+    assert seen == expected
+
+    page, cursor = store.list(date_from=START + timedelta(days=1), limit=2)
+    assert ids(page) == expected[3:5] and cursor is not None
+    assert ids(store.list(date_from=START + timedelta(days=1), cursor=cursor)[0]) == expected[5:]
+
+    with pytest.raises(ValueError):
+        store.list(cursor="not-a-cursor")
+
+
+def test_changes_since_version(store):
+    first = add(store)
+    version = store.version
+    second = add(store)
+    store.delete(first["id"])
+
+    changes, has_more = store.changes(version)
+    assert not has_more
+    assert [(change["op"], change["id"]) for change in changes] == [("upsert", second["id"]), ("delete", first["id"])]
+    assert store.item_version(second["id"]) > version
+    with pytest.raises(ChangesExpired):
+        store.changes(store.version + 1)
+
+
+def test_exhausted_pool_raises_instead_of_blocking(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.db"), size=1, acquire_timeout_seconds=0.05)
+    try:
+        with pool.connection():
+            with pytest.raises(PoolExhausted):
+                with pool.connection():
+                    pass
+        with pool.connection() as conn:
+            assert conn.execute("SELECT 1").fetchone()[0] == 1
+    finally:
+        pool.close()
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    """The fertilizer routes served from `store`"""
+    monkeypatch.setattr(fertilizer_api, "fertilizer_db", store)
+    monkeypatch.setattr(fertilizer_api, "list_body_cache", BodyCache())
+    monkeypatch.setattr(fertilizer_api, "due_engine", None)
+    app = FastAPI()
+    app.include_router(fertilizer_api.router)
+    return TestClient(app)
+
+
+def test_api_contract(client):
+    body = {"fertilizer_type": "Urea", "amount": "50kg/acre", "target_field": "Field A - Wheat", "scheduled_date": "2025-06-02T06:00:00"}
+    created = client.post("/api/fertilizer/schedules", json=body).json()
+    assert set(created) == set(fertilizer_api.FertilizerSchedule.model_fields)
+    assert created["scheduled_date"] == "2025-06-02T06:00:00" and created["status"] == "SCHEDULED"
+    assert created["field"] == "Field A" and created["crop"] == "Wheat"
+    client.post("/api/fertilizer/schedules", json={**body, "scheduled_date": "2025-06-01T06:00:00"})
+
+    listed = client.get("/api/fertilizer/schedules")
+    assert listed.status_code == 200
+    assert [s["scheduled_date"] for s in listed.json()] == ["2025-06-01T06:00:00", "2025-06-02T06:00:00"]
+    assert client.get("/api/fertilizer/schedules", headers={"If-None-Match": listed.headers["ETag"]}).status_code == 304
+
+    page = client.get("/api/fertilizer/schedules", params={"limit": 1})
+    assert len(page.json()) == 1 and "X-Next-Cursor" in page.headers
+    rest = client.get("/api/fertilizer/schedules", params={"limit": 1, "cursor": page.headers["X-Next-Cursor"]})
+    assert [s["id"] for s in rest.json()] == [created["id"]]
+    assert client.get("/api/fertilizer/schedules", params={"cursor": "bad"}).status_code == 400
+
+    assert client.get(f"/api/fertilizer/schedules/{created['id']}").json() == created
+    updated = client.put(f"/api/fertilizer/schedules/{created['id']}", json={"amount": "2.5 l/ha"}).json()
+    assert updated["amount"] == "2.5 l/ha" and updated["unit"] == "l" and updated["per_area"] == "ha"
+    assert client.patch(f"/api/fertilizer/schedules/{created['id']}/status", params={"status": "pending"}).json()["status"] == "PENDING"
+    assert client.patch(f"/api/fertilizer/schedules/{created['id']}/status", params={"status": "bogus"}).status_code == 400
+    assert client.post(f"/api/fertilizer/schedules/{created['id']}/apply").json()["schedule"]["status"] == "COMPLETED"
+
+    assert client.delete(f"/api/fertilizer/schedules/{created['id']}").status_code == 200
+    assert client.get(f"/api/fertilizer/schedules/{created['id']}").status_code == 404
+    assert client.delete(f"/api/fertilizer/schedules/{created['id']}").status_code == 404